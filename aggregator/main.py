@@ -1,14 +1,17 @@
 # Refence: https://syftbox-documentation.openmined.org/cpu-tracker-2
 
 import os
-import joblib
 from pathlib import Path
 from utils.checks import should_run
 from utils.vocab import create_tvseries_vocab
-from utils.syftbox import network_participants, create_shared_folder, participants_datasets
-from pets.fedavg_mlp import get_users_mlp_parameters, mlp_fedavg
+from common.vocabulary import find_vocabulary
+from utils.contribution_cache import ContributionCache
+from utils.syftbox import network_participants, create_shared_folder, participants_datasets, DiscoveryIndex
+from utils.stages import Stage, run_stages, print_stage_report
+from pets.fedavg_mlp import get_users_mlp_parameters, mlp_fedavg_cached
+from common.mlp_params import save_mlp_params, load_mlp_params, FEDAVG_PARAMS_FILE
 from pets.dp_top5 import dp_top5_series
-from pets.phe import generate_keys
+from pets.phe import generate_keys, phe_top5_series
 from syftbox.lib import Client
 
 API_NAME = os.getenv("API_NAME")
@@ -23,8 +26,12 @@ if __name__ == "__main__":
 
     datasites_path = Path(client.datasite_path.parent)   # automatically retrieve datasites path
 
-    peers = network_participants(datasites_path, API_NAME)         # check participant of netflix trend
-    peers_w_netflix_data = participants_datasets(datasites_path, dataset_name = "Netflix Data", dataset_format = "CSV")  # check for "Netflix Data" from datasites/<user>/public/datasets.yaml
+    # Incremental discovery: only datasites that changed since the last run are re-read
+    discovery = DiscoveryIndex(datasites_path, client.datasite_path / "private" / API_NAME / "discovery_index.json")
+    discovery.refresh()
+
+    peers = network_participants(datasites_path, API_NAME, index=discovery)         # check participant of netflix trend
+    peers_w_netflix_data = participants_datasets(datasites_path, dataset_name = "Netflix Data", dataset_format = "CSV", index=discovery)  # check for "Netflix Data" from datasites/<user>/public/datasets.yaml
 
     print(f"[!] Participants with the App Installed: {peers}")
     print(f"[!] Participants with Netflix Data but not with the App Installed: {[peer for peer in peers_w_netflix_data if peer not in peers]}")
@@ -32,24 +39,43 @@ if __name__ == "__main__":
     # Here we do not use public folder for aggregator, but an api_folder accesible to participants only
     shared_folder_path = create_shared_folder(Path(client.datasite_path), API_NAME, client, peers)
 
-    # Paillier Homomorphic Encryption Setup
     private_path = client.datasite_path / "private" / API_NAME
-    generate_keys(public_path=shared_folder_path, private_path=private_path)
-    
-    # Create a Vocabulary of TV Series
-    create_tvseries_vocab(shared_folder_path)
-    
-    # MLP use case -> FedAvg
-    weights, biases = get_users_mlp_parameters(datasites_path, API_NAME, peers)    # MLP: retrieve the path to weights and bias
-    try:
-        fedavg_weights, fedavg_biases = mlp_fedavg(weights, biases)
-        joblib.dump(fedavg_weights, shared_folder_path / "netflix_mlp_fedavg_weights.joblib")
-        joblib.dump(fedavg_biases, shared_folder_path / "netflix_mlp_fedavg_biases.joblib")
-    except Exception as e:
-        print(f"> Error to perform FedAvg: {e}")
+
+    def mlp_fedavg_stage(tv_vocab):
+        artifacts = get_users_mlp_parameters(datasites_path, API_NAME, peers)    # MLP: retrieve the parameters of each participant
+        previous, version = None, 0   # sparse output-layer updates are merged into the previous global model
+        if (shared_folder_path / FEDAVG_PARAMS_FILE).is_file():
+            previous_params = load_mlp_params(shared_folder_path / FEDAVG_PARAMS_FILE, mmap=False)
+            previous, version = (previous_params["coefs"], previous_params["intercepts"]), previous_params["version"]
+        mlp_cache = ContributionCache(private_path / "contributions" / "mlp")   # only changed uploads are reloaded
+        fedavg = mlp_fedavg_cached(mlp_cache, artifacts, previous=previous, num_classes=len(tv_vocab), only_if_changed=previous is not None)
+        if fedavg is None:   # no upload changed: participants keep the published version
+            print(f"> FedAvg: global model unchanged at version {version}.")
+            return
+        save_mlp_params(shared_folder_path / FEDAVG_PARAMS_FILE, *fedavg, version=version + 1)
 
     # Differential Privacy use case -> Top-5 Most Seen TV Series
     MIN_PARTICIPANTS = 3
-    if len(peers) > MIN_PARTICIPANTS:  # check the top-5 if at least MIN_PARTICIPANTS available
-        dp_top5_series(datasites_path, peers, min_participants=MIN_PARTICIPANTS)
-        # TODO: update assets -> static index
\ No newline at end of file
+    def dp_top5_stage():
+        if len(peers) > MIN_PARTICIPANTS:  # check the top-5 if at least MIN_PARTICIPANTS available
+            dp_cache = ContributionCache(private_path / "contributions" / "dp_top5", growable=["series_totals"])
+            dp_top5_series(datasites_path, peers, min_participants=MIN_PARTICIPANTS, cache=dp_cache)
+            # TODO: update assets -> static index
+
+    # Paillier Homomorphic Encryption use case -> Top-5 from the sum of the encrypted view counts
+    def phe_top5_stage(_keys, _tv_vocab):
+        vocab_path = find_vocabulary(shared_folder_path)
+        if vocab_path is None:
+            print(f"{API_NAME} | Aggregator | No TV series vocabulary published, skipping the PHE top-5.")
+            return
+        phe_top5_series(datasites_path, peers, shared_folder_path, private_path, vocab=vocab_path, min_participants=MIN_PARTICIPANTS)
+
+    # The PETs only share the read-only discovery results: independent stages run concurrently
+    report = run_stages([
+        Stage("phe_keys", lambda: generate_keys(public_path=shared_folder_path, private_path=private_path)),  # Paillier Homomorphic Encryption Setup
+        Stage("tv_vocabulary", lambda: create_tvseries_vocab(shared_folder_path, private_path)),   # Create a Vocabulary of TV Series
+        Stage("mlp_fedavg", mlp_fedavg_stage, requires=("tv_vocabulary",)),          # MLP use case -> FedAvg
+        Stage("dp_top5", dp_top5_stage),
+        Stage("phe_top5", phe_top5_stage, requires=("phe_keys", "tv_vocabulary")),
+    ])
+    print_stage_report(report, prefix=f"[{API_NAME}] ")
@@ -2,59 +2,76 @@ import json
 import os
 import numpy as np
 from pathlib import Path
+from common.peer_io import peer_artifact_paths, prefetch_peer_artifacts
+from common.vocabulary import load_vocabulary
 
 API_NAME = os.getenv("API_NAME")
 AGGREGATOR_DATASITE = os.getenv("AGGREGATOR_DATASITE")
 
-def calculate_top5(files: list[Path], destination_folder: Path, vocab: Path):
+def calculate_top5(files: list[Path], destination_folder: Path, vocab: Path, prefetch: int = 4):
     """
     Calculates the top-5 most seen (number of episodes) series.
+
+    The vectors are summed one at a time while the next `prefetch` ones are being read
+    (see `common.peer_io.prefetch_peer_artifacts`).
     """
-    data = []
+    series_totals = None
+    for vector, data, error in prefetch_peer_artifacts([f for f in files if f.is_file()], np.load, prefetch):
+        if error is not None:
+            print(f"{API_NAME} | Aggregator | Skipped {vector}: {error}")
+            continue
+        data = np.atleast_2d(data).sum(axis=0)
+        series_totals = data if series_totals is None else series_totals + data
 
-    for vector in files:
-        if vector.is_file(): data.append(np.load(vector))
+    write_top5(series_totals, destination_folder, vocab)
 
-    result = np.vstack(data)
-    series_totals = result.sum(axis=0)
+def dp_vector_contribution(path) -> dict:
+    """
+    A participant's contribution to the series totals (see `ContributionCache`).
+    """
+    return {"series_totals": np.atleast_2d(np.load(path)).sum(axis=0)}
 
-    # Load the series mapping (index to name) from the JSON file
-    try:
-        with open(vocab, 'r') as f:
-            series_mapping = json.load(f)
+def write_top5(series_totals: np.ndarray, destination_folder: Path, vocab: Path, filename: str = "top5_series.json"):
+    """
+    Write the names and counts of the 5 series with the largest totals.
+    """
 
-        # Reverse the mapping to go from index to name
-        index_to_name = {v: k for k, v in series_mapping.items()}
-    except:
+    # Load the series mapping; it holds the index to name lookup
+    try:
+        vocabulary = load_vocabulary(vocab)
+    except Exception:
         print(f"> Error: {API_NAME} | Aggregator: {AGGREGATOR_DATASITE} | Unable to open vocab -> {str(vocab)}")
+        raise
 
-    destination_folder.mkdir(parents=True, exist_ok=True)
+    Path(destination_folder).mkdir(parents=True, exist_ok=True)
     # Get the indices of the top-5 most-watched series
     top5_indices = np.argsort(series_totals)[-5:][::-1]
-    top5_names = [index_to_name[idx] for idx in top5_indices]
+    top5_names = [vocabulary.title(idx) for idx in top5_indices]
     top5_values = series_totals[top5_indices]
 
-    with open(destination_folder / "top5_series.json", 'w') as f:
+    with open(Path(destination_folder) / filename, 'w') as f:
         json.dump({"names": top5_names, "counts": top5_values.tolist()}, f, indent=4)
 
-def dp_top5_series(datasites_path: Path, peers: list[str], min_participants: int):
+def dp_top5_series(datasites_path: Path, peers: list[str], min_participants: int, cache=None, prefetch: int = 4):
     """
     Retrieves the path of all available participants with DP vectors of TV series seens episodes.
+
+    With a `ContributionCache` (growable on "series_totals"), the totals are updated incrementally:
+    only vectors that changed since the last run are loaded.
     """
-    available_dp_vectors = []
     dp_file = "top5_series_dp.npy"
-
-    for peer in peers:
-        dir: Path = datasites_path / peer / "api_data" / API_NAME
-        file: Path = dir / dp_file
-        
-        if file.exists():
-            available_dp_vectors.append(file)
+    available_dp_vectors = [file for _, file in peer_artifact_paths(datasites_path, peers, API_NAME, dp_file)]
 
     if len(available_dp_vectors) < min_participants:
         print(f"{API_NAME} | Aggregator | There are no sufficient partcipants \
               (Available: {len(available_dp_vectors)}| Required: {min_participants})")
     else:
         destination_folder: Path = ( datasites_path / AGGREGATOR_DATASITE / "private" / API_NAME )
-        vocab: Path = datasites_path / peer / "api_data" / API_NAME / "tv-series_vocabulary.json"
-        calculate_top5(available_dp_vectors, destination_folder, vocab)
+        vocab: Path = datasites_path / peers[-1] / "api_data" / API_NAME / "tv-series_vocabulary.json"
+        if cache is None:
+            calculate_top5(available_dp_vectors, destination_folder, vocab, prefetch=prefetch)
+        else:
+            report = cache.update({str(file): str(file) for file in available_dp_vectors}, decode=dp_vector_contribution, prefetch=prefetch)
+            for file, reason in report["failed"]:
+                print(f"{API_NAME} | Aggregator | Skipped {file}: {reason}")
+            write_top5(cache.sums["series_totals"], destination_folder, vocab)
@@ -1,61 +1,331 @@
 import re
 import joblib
+import zipfile
 import numpy as np
 import os
 from pathlib import Path
+from common.mlp_params import load_mlp_params, MLP_PARAMS_FILE
+from common.peer_io import prefetch_peer_artifacts
 
 def get_users_mlp_parameters(
         datasites_path: Path, api_name:str, peers: list[str]
-) -> tuple[list, list]:
+) -> list:
     """
-    This method retrieve the parameters from the local trained MLP. Those files have the names:
+    This method retrieve the parameters from the local trained MLP. Participants upload a single
+    `netflix_mlp_params.npz` (see `common.mlp_params`), found without a directory listing.
+    Older participants upload:
     - netflix_mlp_weights_<NUM_SAMPLES>.joblib
     - netflix_mlp_bias_<NUM_SAMPLES>.joblib
 
-    Returns a tuple of (weights, biases) from all participants
+    Returns a list with one artifact per participant: the path of its `.npz` file, or a
+    (weights, biases) tuple of paths for a legacy upload.
     """
     
-    weights = []
-    biases = []
+    artifacts = []
 
     for peer in peers:
         dir = datasites_path / peer / "api_data" / api_name
 
+        params_file = dir / MLP_PARAMS_FILE
+        if params_file.is_file():
+            artifacts.append(params_file)
+            continue
+
         weight = [f for f in os.listdir(dir) if os.path.isfile(os.path.join(dir, f)) and "mlp_weights" in f]
         bias = [f for f in os.listdir(dir) if os.path.isfile(os.path.join(dir, f)) and "mlp_bias" in f]
         weight = max(weight, key=extract_number, default=None)  # get the greater 
         bias = max(bias, key=extract_number, default=None)      # get the greater
 
-        try:
-            weights.append(dir / weight)
-            biases.append(dir / bias)
-        except:
+        if weight is None or bias is None:
             print("There are no participants weights and biases available.")
+            continue
+        artifacts.append((dir / weight, dir / bias))
 
-    return weights, biases
+    return artifacts
 
 def extract_number(file_name):
     match = re.search(r'_(\d+)\.joblib$', file_name)
     return int(match.group(1)) if match else -1
 
-def weighted_average(parameters, samples):
-    total_samples = sum(samples)
-    weighted_params = [
-        np.multiply(param, n / total_samples) for param, n in zip(parameters, samples)
-    ]
-    return np.sum(weighted_params, axis=0)
+def artifact_path(artifact):
+    """
+    Path identifying an artifact of `get_users_mlp_parameters` (the weights file of a legacy upload).
+    """
+    return artifact[0] if isinstance(artifact, tuple) else artifact
 
-def mlp_fedavg(weights: list, biases: list) -> tuple[list, list]:
+def load_peer_parameters(artifact, mmap: bool = True) -> dict:
     """
-    FedAvg computes the weighted average of parameters (weights and biases) from multiple users.
-    The weights for averaging are proportional to the number of samples each user has.
+    Load one participant's parameters, from a `.npz` artifact (memory-mapped unless `mmap` is
+    False) or a legacy (weights, biases) pair of joblib files.
+
+    Returns:
+        dict: "coefs", "intercepts", "num_samples" and "classes" (see `common.mlp_params.load_mlp_params`).
     """
-    samples = [extract_number(str(n)) for n in weights]
-    
-    weight_matrices = [joblib.load(weight_path) for weight_path in weights]
-    bias_vectors = [joblib.load(bias_path) for bias_path in biases]
+    if not isinstance(artifact, tuple):
+        return load_mlp_params(artifact, mmap=mmap)
+    weight_path, bias_path = artifact
+    num_samples = extract_number(str(weight_path))
+    return {
+        "coefs": joblib.load(weight_path),
+        "intercepts": joblib.load(bias_path),
+        "num_samples": num_samples if num_samples >= 0 else 1,  # no count in the file name: equal weights
+        "classes": None,  # legacy uploads are dense
+    }
+
+def has_output_classes(artifact) -> bool:
+    """
+    Whether an artifact is vocabulary-aligned, i.e. records the `classes` of its output units.
+    Only the archive's directory is read; legacy uploads and unreadable files count as dense.
+    """
+    if isinstance(artifact, tuple):
+        return False
+    try:
+        with zipfile.ZipFile(str(artifact)) as archive:
+            return "classes.npy" in archive.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+## Streaming FedAvg: one running float64 accumulator per layer, one peer loaded at a time
+
+def scaled_add(accumulator: np.ndarray, array, n, scratch: np.ndarray):
+    """
+    accumulator += n * array, in place, using `scratch` (a float64 buffer at least as large as
+    `array`) instead of allocating a scaled copy.
+    """
+    buffer = scratch[:np.size(array)].reshape(np.shape(array))
+    np.multiply(array, n, out=buffer)
+    accumulator += buffer
+
+def accumulate_output_layer(accumulator, W, b, classes, n) -> dict:
+    """
+    Add one participant's output units to the output-layer accumulator (created if None).
+    Uploads without classes are dense and cover units 0..m-1 (only valid when every upload of
+    the round is dense, see `mlp_fedavg`). The accumulator grows by doubling
+    when a unit beyond its width shows up.
+    """
+    W = np.asarray(W)
+    classes = np.arange(W.shape[1]) if classes is None else np.asarray(classes, dtype=np.int64)
+    needed = int(classes.max()) + 1 if len(classes) else 0
+    if accumulator is None:
+        accumulator = {"weights": np.zeros((W.shape[0], needed)), "biases": np.zeros(needed), "totals": np.zeros(needed), "width": 0}
+    if needed > accumulator["totals"].shape[0]:
+        grown = max(needed, 2 * accumulator["totals"].shape[0])
+        extra = grown - accumulator["totals"].shape[0]
+        accumulator["weights"] = np.pad(accumulator["weights"], ((0, 0), (0, extra)))
+        accumulator["biases"] = np.pad(accumulator["biases"], (0, extra))
+        accumulator["totals"] = np.pad(accumulator["totals"], (0, extra))
+
+    accumulator["weights"][:, classes] += n * W.astype(np.float64)
+    accumulator["biases"][classes] += n * np.asarray(b, dtype=np.float64)
+    accumulator["totals"][classes] += n
+    accumulator["width"] = max(accumulator["width"], needed)
+    return accumulator
+
+def finalize_output_layer(accumulator: dict, previous=None, num_classes: int = None) -> tuple:
+    """
+    Average the accumulated output units. Units nobody uploaded keep their previous global
+    value (zero if there is none).
+
+    Returns:
+        tuple: (output weights (hidden, width), output biases (width,))
+    """
+    hidden = accumulator["weights"].shape[0]
+    usable_previous = previous is not None and np.shape(previous[0])[0] == hidden
+    width = max(accumulator["width"], num_classes or 0, np.shape(previous[0])[1] if usable_previous else 0)
+
+    merged_weights = np.zeros((hidden, width))
+    merged_biases = np.zeros(width)
+    if usable_previous:
+        merged_weights[:, :np.shape(previous[0])[1]] = previous[0]
+        merged_biases[:len(previous[1])] = previous[1]
+
+    totals = accumulator["totals"][:width]
+    touched = np.flatnonzero(totals)
+    merged_weights[:, touched] = accumulator["weights"][:, touched] / totals[touched]
+    merged_biases[touched] = accumulator["biases"][touched] / totals[touched]
+    return merged_weights, merged_biases
+
+def merge_output_layer(output_weights: list, output_biases: list, classes: list, samples: list, previous=None, num_classes: int = None) -> tuple:
+    """
+    Merge sparse output-layer updates into the global output layer.
+
+    Every output unit is averaged over the participants that uploaded it, weighted by their
+    number of samples. Units nobody uploaded keep their previous global value (zero if there is
+    none). Uploads without classes are dense and cover units 0..n-1.
+
+    Args:
+        output_weights (list[np.ndarray]): Output weights (hidden, m_p) of each participant.
+        output_biases (list[np.ndarray]): Output biases (m_p,) of each participant.
+        classes (list): Output unit IDs (m_p,) of each participant, or None.
+        samples (list[int]): Number of samples of each participant.
+        previous (tuple, optional): Previous global (output weights, output biases).
+        num_classes (int, optional): Size of the global output layer (e.g. the vocabulary size).
+
+    Returns:
+        tuple: (output weights (hidden, num_classes), output biases (num_classes,))
+    """
+    accumulator = None
+    for W, b, c, n in zip(output_weights, output_biases, classes, samples):
+        accumulator = accumulate_output_layer(accumulator, W, b, c, n)
+    return finalize_output_layer(accumulator, previous, num_classes)
+
+def mlp_fedavg(artifacts: list, previous=None, num_classes: int = None, prefetch: int = 2) -> tuple[list, list]:
+    """
+    FedAvg computes the weighted average of parameters (weights and biases) from multiple users
+    (`artifacts`, as returned by `get_users_mlp_parameters`). The weights for averaging are
+    proportional to the number of samples each user has.
+
+    Participants are streamed: each one's parameters are memory-mapped (`.npz` artifacts),
+    scaled and added in place into one float64 accumulator per layer, and released before the
+    next one, with a single division at the end, so memory stays at about two model copies
+    whatever the number of participants. The next `prefetch` participants are opened on
+    background threads meanwhile (see `common.peer_io.prefetch_peer_artifacts`). A participant
+    whose layer shapes do not match the first one, or that reports no samples, is skipped and
+    reported instead of failing the round.
+
+    When participants upload only part of the output layer (vocabulary-aligned models, whose
+    artifacts carry the `classes` of their output units), the output units are merged into the previous global model
+    (`previous`, a (weights, biases) tuple) as in `merge_output_layer`. Dense uploads index their
+    output units by a local label encoding, so as soon as one upload of the round is
+    vocabulary-aligned, the dense ones are skipped and reported.
+    """
+    hidden_weights = hidden_biases = scratch = None
+    reference_shapes = dense_width = output = None
+    total_samples, skipped = 0, []
+    sparse = any(has_output_classes(artifact) for artifact in artifacts)
+
+    load = lambda artifact: load_peer_parameters(artifact, mmap=True)
+    for artifact, peer, error in prefetch_peer_artifacts(artifacts, load, prefetch):
+        weight_path = artifact_path(artifact)
+        if error is not None:
+            skipped.append((weight_path, f"unreadable parameters ({error})"))
+            continue
+        coefs, intercepts, n, classes = peer["coefs"], peer["intercepts"], peer["num_samples"], peer["classes"]
+        if not n > 0:
+            skipped.append((weight_path, f"{n} samples"))
+            continue
+        if sparse and classes is None:
+            skipped.append((weight_path, "dense output layer (local label encoding) in a vocabulary-aligned round"))
+            continue
+
+        # Hidden layers must match exactly; the output layer must match on its input side
+        shapes = [np.shape(W) for W in coefs[:-1]] + [np.shape(b) for b in intercepts[:-1]] + [np.shape(coefs[-1])[0]]
+        if reference_shapes is None:
+            reference_shapes = shapes
+            hidden_weights = [np.zeros(np.shape(W)) for W in coefs[:-1]]
+            hidden_biases = [np.zeros(np.shape(b)) for b in intercepts[:-1]]
+            scratch = np.empty(max([np.size(array) for array in coefs[:-1] + intercepts[:-1]], default=0))
+        elif shapes != reference_shapes:
+            skipped.append((weight_path, f"layer shapes {shapes} do not match {reference_shapes}"))
+            continue
+        if classes is None:
+            if dense_width is not None and np.shape(coefs[-1])[1] != dense_width:
+                skipped.append((weight_path, f"{np.shape(coefs[-1])[1]} output units, expected {dense_width}"))
+                continue
+            dense_width = np.shape(coefs[-1])[1]
+
+        for layer, (W, b) in enumerate(zip(coefs[:-1], intercepts[:-1])):
+            scaled_add(hidden_weights[layer], W, n, scratch)
+            scaled_add(hidden_biases[layer], b, n, scratch)
+        output = accumulate_output_layer(output, coefs[-1], intercepts[-1], classes, n)
+        total_samples += n
+        del peer, coefs, intercepts
+
+    for weight_path, reason in skipped:
+        print(f"> FedAvg: skipped {weight_path}: {reason}")
+    if output is None:
+        raise ValueError("No participant parameters could be aggregated.")
+
+    for accumulator in hidden_weights + hidden_biases:
+        accumulator /= total_samples
+    if sparse:
+        previous_output = (previous[0][-1], previous[1][-1]) if previous is not None else None
+        output_weights, output_biases = finalize_output_layer(output, previous_output, num_classes)
+    else:
+        output_weights, output_biases = finalize_output_layer(output)
+    return hidden_weights + [output_weights], hidden_biases + [output_biases]
+
+
+## Incremental FedAvg: per-peer contributions kept in a `ContributionCache` between ticks
+
+def mlp_contribution(artifact) -> dict:
+    """
+    One participant's contribution to the FedAvg sums: its sample-weighted hidden layers and
+    output units, and its number of samples. A participant without samples contributes zeros.
+
+    Vocabulary-aligned uploads add their output units by class (see `ContributionCache`) and
+    count in "sparse". Dense uploads are summed apart, under "dense_" names, with a fixed
+    output width: their output units follow a local label encoding, so they are only used in
+    rounds without any vocabulary-aligned upload (see `mlp_fedavg_cached`).
+    """
+    peer = load_peer_parameters(artifact, mmap=True)
+    coefs, intercepts, n, classes = peer["coefs"], peer["intercepts"], peer["num_samples"], peer["classes"]
+    if n < 0:
+        raise ValueError(f"{n} samples")
+    prefix = "" if classes is not None else "dense_"
+    contribution = {prefix + "num_samples": np.array(n, dtype=np.float64)}
+    for layer, (W, b) in enumerate(zip(coefs[:-1], intercepts[:-1])):
+        contribution[f"{prefix}coef_{layer}"] = n * np.asarray(W, dtype=np.float64)
+        contribution[f"{prefix}intercept_{layer}"] = n * np.asarray(b, dtype=np.float64)
+
+    if classes is None:
+        contribution["dense_peers"] = np.array(1.0)
+        contribution["dense_output_weights"] = n * np.asarray(coefs[-1], dtype=np.float64)
+        contribution["dense_output_biases"] = n * np.asarray(intercepts[-1], dtype=np.float64)
+        return contribution
+
+    classes = np.asarray(classes, dtype=np.int64)
+    contribution["sparse"] = np.array(1.0)
+    contribution["output_weights"] = (n * np.asarray(coefs[-1], dtype=np.float64), classes)
+    contribution["output_biases"] = (n * np.asarray(intercepts[-1], dtype=np.float64), classes)
+    contribution["output_totals"] = (np.full(len(classes), float(n)), classes)
+    return contribution
+
+def mlp_fedavg_cached(cache, artifacts: list, previous=None, num_classes: int = None, prefetch: int = 2, only_if_changed: bool = False):
+    """
+    FedAvg from a `ContributionCache`: only participants whose parameters changed since the
+    last tick are loaded; the others' contributions are already in the cached sums. The result
+    is the same as `mlp_fedavg`'s (hidden layers averaged by samples, output units merged per
+    class into `previous` for vocabulary-aligned uploads, dense uploads skipped as soon as one
+    upload is vocabulary-aligned, and one output width for dense uploads: a dense upload of
+    another width is rejected by the cache). Changed participants are loaded `prefetch` at a
+    time ahead of the one being added to the sums.
+
+    With `only_if_changed`, None is returned when no participant was added, updated or removed
+    since the last tick, so that the previous global model can be kept as is.
+    """
+    artifact_of = {str(artifact_path(artifact)): artifact for artifact in artifacts}
+    report = cache.update(
+        {path: path for path in artifact_of},
+        decode=lambda path: mlp_contribution(artifact_of[path]),
+        prefetch=prefetch,
+    )
+    for weight_path, reason in report["failed"]:
+        print(f"> FedAvg: skipped {weight_path}: {reason}")
+    print(f"> FedAvg: {len(report['added']) + len(report['updated'])} new contributions, "
+          f"{len(report['unchanged'])} unchanged, {len(report['removed'])} removed.")
+    if only_if_changed and not report["changed"]:
+        return None
+
+    sums = cache.sums
+    sparse = float(sums.get("sparse", 0)) > 0
+    if sparse and float(sums.get("dense_peers", 0)) > 0:
+        print(f"> FedAvg: skipped {int(sums['dense_peers'])} dense uploads (local label encoding) in a vocabulary-aligned round.")
+    prefix = "" if sparse else "dense_"
+    if not len(cache) or prefix + "num_samples" not in sums:
+        raise ValueError("No participant parameters could be aggregated.")
+    total_samples = float(sums[prefix + "num_samples"])
+    if not total_samples > 0:
+        raise ValueError("No participant parameters could be aggregated: every participant reported 0 samples.")
 
-    fedavg_weights = [weighted_average([w[layer] for w in weight_matrices], samples) for layer in range(len(weight_matrices[0]))]
-    fedavg_biases = [weighted_average([b[layer] for b in bias_vectors], samples) for layer in range(len(bias_vectors[0]))]
+    num_hidden = sum(1 for name in sums if name.startswith(prefix + "coef_"))
+    hidden_weights = [sums[f"{prefix}coef_{layer}"] / total_samples for layer in range(num_hidden)]
+    hidden_biases = [sums[f"{prefix}intercept_{layer}"] / total_samples for layer in range(num_hidden)]
 
-    return fedavg_weights, fedavg_biases
\ No newline at end of file
+    if sparse:
+        output = {"weights": sums["output_weights"], "biases": sums["output_biases"], "totals": sums["output_totals"], "width": len(sums["output_totals"])}
+        previous_output = (previous[0][-1], previous[1][-1]) if previous is not None else None
+        output_weights, output_biases = finalize_output_layer(output, previous_output, num_classes)
+    else:
+        output_weights, output_biases = sums["dense_output_weights"] / total_samples, sums["dense_output_biases"] / total_samples
+    return hidden_weights + [output_weights], hidden_biases + [output_biases]
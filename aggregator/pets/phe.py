@@ -1,15 +1,29 @@
 import base64
 import json
+import os
 import numpy as np
 from phe import paillier
 from pathlib import Path
+from common.peer_io import peer_artifact_paths, prefetch_peer_artifacts
+from common.phe_vectors import (
+    load_public_key,
+    load_encrypted_vector,
+    key_fingerprint,
+    unpack_vector,
+    LAYOUT_FIELDS,
+    PUBLIC_KEY_FILE,
+    PHE_VECTOR_FILE,
+)
+from aggregator.pets.dp_top5 import write_top5
+
+API_NAME = os.getenv("API_NAME")
 
 
 def generate_keys(public_path: Path, private_path: Path):
     public_path.mkdir(parents=True, exist_ok=True)
     private_path.mkdir(parents=True, exist_ok=True)
     
-    public_key_file = public_path / "public_phe_key.json"
+    public_key_file = public_path / PUBLIC_KEY_FILE
     private_key_file = private_path / "private_phe_key.json"
     
     if public_key_file.exists() and private_key_file.exists():
@@ -32,24 +46,7 @@ def generate_keys(public_path: Path, private_path: Path):
 
 
 
-def load_public_key(public_path: Path):
-    key_file = public_path / "public_phe_key.json"
-    if not key_file.exists():
-        raise FileNotFoundError(f"Public key file not found: {key_file}")
-    
-    # load public key
-    with open(key_file, "r") as pub_file:
-        public_key_data = json.load(pub_file)
-
-    try:
-        n = int(base64.b64decode(public_key_data["n"]).decode("utf-8"))
-        return paillier.PaillierPublicKey(n=n)
-    except (KeyError, ValueError, TypeError) as e:
-        raise ValueError("Invalid public key format.") from e
-
-
-def decode_data(data, public_path: Path, private_path: Path):
-
+def load_private_key(public_path: Path, private_path: Path):
     public_key = load_public_key(public_path)
 
     private_key_file = private_path / "private_phe_key.json"
@@ -63,10 +60,15 @@ def decode_data(data, public_path: Path, private_path: Path):
     try:
         p = int(base64.b64decode(private_key_data["p"]).decode("utf-8"))
         q = int(base64.b64decode(private_key_data["q"]).decode("utf-8"))
-        private_key = paillier.PaillierPrivateKey(public_key=public_key, p=p, q=q)
+        return paillier.PaillierPrivateKey(public_key=public_key, p=p, q=q)
     except (KeyError, ValueError, TypeError) as e:
         raise ValueError("Invalid private key format.") from e
 
+
+def decode_data(data, public_path: Path, private_path: Path):
+
+    private_key = load_private_key(public_path, private_path)
+
     # Decrypt the data
     decrypt_scalar = np.vectorize(private_key.decrypt)
     try:
@@ -74,4 +76,88 @@ def decode_data(data, public_path: Path, private_path: Path):
     except Exception as e:
         raise ValueError("Error during decryption.") from e
 
-    return decrypted_data
\ No newline at end of file
+    return decrypted_data
+
+
+## ==================================================================================================
+## Packed Vectors (see common/phe_vectors.py)
+## ==================================================================================================
+
+def sum_encrypted_vectors(paths: list, public_key, prefetch: int = 4) -> dict:
+    """
+    Homomorphically add the packed vectors of several participants: multiplying Paillier
+    ciphertexts (mod n^2) adds their plaintexts, so every slot ends up holding the sum of the
+    participants' counts, without decrypting any of them. Artifacts are read `prefetch` ahead
+    (see `common.peer_io.prefetch_peer_artifacts`). Artifacts for another key, with another
+    layout, or beyond the layout's `max_peers` headroom are skipped and reported.
+
+    Returns:
+        dict: The summed payload (as `load_encrypted_vector`), "num_peers" counting the participants added.
+
+    Raises:
+        ValueError: If no artifact could be added.
+    """
+    nsquare = public_key.n * public_key.n
+    fingerprint = key_fingerprint(public_key)
+    total, skipped = None, []
+
+    for path, payload, error in prefetch_peer_artifacts(paths, load_encrypted_vector, prefetch):
+        if error is not None:
+            skipped.append((path, f"unreadable ciphertexts ({error})"))
+        elif payload["key_fingerprint"] != fingerprint:
+            skipped.append((path, "encrypted under another public key"))
+        elif total is None:
+            total = payload
+        elif any(payload[name] != total[name] for name in LAYOUT_FIELDS):
+            skipped.append((path, "packing layout does not match"))
+        elif total["num_peers"] + payload["num_peers"] > total["max_peers"]:
+            skipped.append((path, f"more than {total['max_peers']} participants would overflow the slots"))
+        else:
+            total["ciphertexts"] = [a * b % nsquare for a, b in zip(total["ciphertexts"], payload["ciphertexts"])]
+            total["num_peers"] += payload["num_peers"]
+
+    for path, reason in skipped:
+        print(f"> PHE: skipped {path}: {reason}")
+    if total is None:
+        raise ValueError("No encrypted vectors could be added.")
+    return total
+
+def decrypt_packed_vector(payload: dict, private_key) -> np.ndarray:
+    """
+    Decrypt a (summed) packed vector and unpack its slots into counts.
+
+    Participants clip their own counts to `max_value`, which the aggregator cannot check on the
+    ciphertexts. The decrypted sum is checked instead: no slot of a sum over `num_peers`
+    participants may exceed `num_peers * max_value` (see `unpack_vector`).
+
+    Raises:
+        ValueError: If the sum does not fit the layout, i.e. some participant's counts did not.
+    """
+    blocks = [private_key.raw_decrypt(ciphertext) for ciphertext in payload["ciphertexts"]]
+    return unpack_vector(
+        blocks, payload["length"], payload["slot_bits"], payload["slots_per_block"],
+        max_slot_value=payload["num_peers"] * payload["max_value"],
+    )
+
+def phe_top5_series(datasites_path: Path, peers: list[str], public_path: Path, private_path: Path, vocab: Path, min_participants: int, prefetch: int = 4):
+    """
+    Top-5 most seen TV series from the participants' encrypted view counts: the packed vectors
+    are added homomorphically and only their sum is decrypted.
+
+    Returns:
+        np.ndarray: The summed view counts, or None if too few participants published a vector.
+    """
+    paths = [path for _, path in peer_artifact_paths(datasites_path, peers, API_NAME, PHE_VECTOR_FILE)]
+    if len(paths) < min_participants:
+        print(f"{API_NAME} | Aggregator | Not enough participants with encrypted vectors (Available: {len(paths)} | Required: {min_participants})")
+        return None
+
+    private_key = load_private_key(public_path, private_path)
+    total = sum_encrypted_vectors(paths, private_key.public_key, prefetch=prefetch)
+    if total["num_peers"] < min_participants:
+        print(f"{API_NAME} | Aggregator | Only {total['num_peers']} encrypted vectors could be added (Required: {min_participants})")
+        return None
+
+    series_totals = decrypt_packed_vector(total, private_key)
+    write_top5(series_totals, private_path, vocab, filename="top5_series_phe.json")
+    return series_totals
@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import numpy as np
+from common.peer_io import prefetch_peer_artifacts
+
+INDEX_FILE = "index.json"
+SUMS_FILE = "sums.npz"
+CONTRIBUTIONS_DIR = "contributions"
+
+def file_fingerprint(path, previous: dict = None) -> dict:
+    """
+    Fingerprint of a peer artifact: its (size, mtime_ns) signature and SHA-256.
+
+    The file is only hashed when its signature differs from `previous`, so unchanged files cost a stat.
+    """
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    if previous is not None and previous["signature"] == signature:
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"signature": signature, "sha256": digest.hexdigest()}
+
+class ContributionCache:
+    """
+    Running sums of per-peer contributions, updated incrementally between aggregator runs.
+
+    Each peer artifact is decoded into a contribution: a dict of named arrays that are summed
+    over peers (e.g. sample-weighted layers for FedAvg, view counts for the top-5). A value can
+    also be an (array, index) pair, added to the columns `index` (last axis) of the sum, for
+    sparse contributions such as vocabulary-aligned output units. For every peer, the cache
+    keeps the artifact's fingerprint (see `file_fingerprint`) and its last contribution, so that
+    on `update` unchanged peers are skipped entirely, and a changed or vanished peer's stale
+    contribution is subtracted before its new one is added. A tick thus costs work proportional
+    to the number of changed peers, plus one stat per peer.
+
+    Sums may only grow along their last axis for names in `growable` or for indexed values
+    (e.g. when the vocabulary grows); any other shape mismatch rejects the peer's contribution.
+
+    Subtracting and re-adding float64 contributions accumulates rounding errors, so the sums are
+    rebuilt from the stored contributions whenever peers leave, and otherwise after
+    `rebuild_every` updated contributions. Joining peers are only added to the sums.
+    """
+
+    def __init__(self, path, growable=(), rebuild_every: int = 100):
+        self.path = str(path)
+        self.growable = set(growable)
+        self.rebuild_every = rebuild_every
+        self.index, self.sums, self.changes_since_rebuild = self.load()
+
+    ## Persistence
+
+    def load(self) -> tuple:
+        index, sums, changes = {}, {}, 0
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.isfile(index_path):
+            with open(index_path, "r") as f:
+                state = json.load(f)
+            if "peers" in state:
+                index, changes = state["peers"], state["changes_since_rebuild"]
+            else:
+                index = state  # index written before rebuilds were tracked
+            with np.load(os.path.join(self.path, SUMS_FILE)) as data:
+                sums = {name: data[name] for name in data.files}
+        return index, sums, changes
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        sums_path = os.path.join(self.path, SUMS_FILE)
+        with open(sums_path + ".tmp", "wb") as f:
+            np.savez(f, **self.sums)
+        os.replace(sums_path + ".tmp", sums_path)
+
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"peers": self.index, "changes_since_rebuild": self.changes_since_rebuild}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    def contribution_path(self, peer: str) -> str:
+        return os.path.join(self.path, CONTRIBUTIONS_DIR, hashlib.sha1(peer.encode("utf-8")).hexdigest() + ".npz")
+
+    def save_contribution(self, peer: str, contribution: dict):
+        arrays = {}
+        for name, value in contribution.items():
+            if isinstance(value, tuple):
+                arrays[name], arrays[name + "__index"] = value
+            else:
+                arrays[name] = value
+        os.makedirs(os.path.join(self.path, CONTRIBUTIONS_DIR), exist_ok=True)
+        with open(self.contribution_path(peer), "wb") as f:
+            np.savez(f, **arrays)
+
+    def load_contribution(self, peer: str) -> dict:
+        with np.load(self.contribution_path(peer)) as data:
+            return {
+                name: (data[name], data[name + "__index"]) if name + "__index" in data.files else data[name]
+                for name in data.files if not name.endswith("__index")
+            }
+
+    ## Running sums
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def apply(self, contribution: dict, sign: int = 1):
+        """
+        Add (sign=1) or subtract (sign=-1) a contribution to the running sums.
+        Shapes are checked for every value before any sum is modified.
+        """
+        targets = {}
+        for name, value in contribution.items():
+            array, index = value if isinstance(value, tuple) else (value, None)
+            array = np.asarray(array, dtype=np.float64)
+            current = self.sums.get(name)
+            if index is None and name not in self.growable:
+                if current is not None and current.shape != array.shape:
+                    raise ValueError(f"'{name}' has shape {array.shape}, expected {current.shape}.")
+                shape = array.shape
+            else:
+                width = int(np.max(index, initial=-1)) + 1 if index is not None else array.shape[-1]
+                if current is not None and current.shape[:-1] != array.shape[:-1]:
+                    raise ValueError(f"'{name}' has shape {array.shape}, incompatible with {current.shape}.")
+                shape = array.shape[:-1] + (max(width, current.shape[-1] if current is not None else 0),)
+            targets[name] = (array, index, shape)
+
+        for name, (array, index, shape) in targets.items():
+            current = self.sums.get(name)
+            if current is None:
+                current = np.zeros(shape)
+            elif current.shape != shape:
+                current = np.pad(current, [(0, 0)] * (current.ndim - 1) + [(0, shape[-1] - current.shape[-1])])
+            if index is not None:
+                current[..., index] += sign * array
+            elif array.ndim == 0:
+                current += sign * array
+            else:
+                current[..., :array.shape[-1]] += sign * array
+            self.sums[name] = current
+
+    def rebuild(self):
+        """
+        Recompute the running sums from scratch, from every peer's stored contribution.
+        """
+        self.sums = {}
+        for peer in self.index:
+            self.apply(self.load_contribution(peer))
+        self.changes_since_rebuild = 0
+
+    def update(self, peer_files: dict, decode, prefetch: int = 0) -> dict:
+        """
+        Bring the running sums up to date with the current peer artifacts.
+
+        Args:
+            peer_files (dict): Peer key -> path of its current artifact. Peers that are no longer
+                listed, or whose file disappeared, have their contribution removed.
+            decode (callable): path -> contribution dict.
+            prefetch (int): Number of peers fingerprinted and decoded ahead on background threads
+                (see `common.peer_io.prefetch_peer_artifacts`); 0 reads them one at a time.
+
+        Returns:
+            dict: Peer keys by outcome: "added", "updated", "removed", "unchanged" and "failed"
+            (a list of (peer, reason); a failed peer keeps its previous contribution), and
+            "changed": whether the sums changed, i.e. any peer was added, updated or removed.
+        """
+        report = {"added": [], "updated": [], "removed": [], "unchanged": [], "failed": []}
+        for peer in [peer for peer in self.index if peer not in peer_files or not os.path.isfile(peer_files[peer])]:
+            self.apply(self.load_contribution(peer), sign=-1)
+            os.remove(self.contribution_path(peer))
+            del self.index[peer]
+            report["removed"].append(peer)
+        if not self.index:
+            self.sums = {}  # start over, e.g. after a change of model architecture
+
+        def load(item):
+            # Runs on the prefetch threads: only changed artifacts are decoded
+            peer, path, previous = item
+            fingerprint = file_fingerprint(path, previous)
+            if previous is not None and fingerprint["sha256"] == previous["sha256"]:
+                return fingerprint, None
+            return fingerprint, decode(path)
+
+        items = [
+            (peer, path, self.index[peer]["fingerprint"] if peer in self.index else None)
+            for peer, path in peer_files.items() if os.path.isfile(path)
+        ]
+        for (peer, _, _), loaded, error in prefetch_peer_artifacts(items, load, prefetch):
+            entry = self.index.get(peer)
+            if error is not None:
+                report["failed"].append((peer, str(error)))
+                continue
+            fingerprint, contribution = loaded
+            if contribution is None:
+                entry["fingerprint"] = fingerprint
+                report["unchanged"].append(peer)
+                continue
+
+            try:
+                previous = self.load_contribution(peer) if entry is not None else None
+                if previous is not None:
+                    self.apply(previous, sign=-1)
+                try:
+                    self.apply(contribution, sign=1)
+                except ValueError:
+                    if previous is not None:
+                        self.apply(previous, sign=1)
+                    raise
+            except Exception as e:
+                report["failed"].append((peer, str(e)))
+                continue
+
+            self.save_contribution(peer, contribution)
+            self.index[peer] = {"fingerprint": fingerprint}
+            report["updated" if entry is not None else "added"].append(peer)
+
+        report["changed"] = bool(report["added"] or report["updated"] or report["removed"])
+        self.changes_since_rebuild += len(report["updated"])
+        if report["removed"] or self.changes_since_rebuild >= self.rebuild_every:
+            self.rebuild()
+        self.save()
+        return report
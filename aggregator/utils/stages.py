@@ -0,0 +1,102 @@
+import time
+from typing import Callable, NamedTuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class Stage(NamedTuple):
+    """
+    One aggregator step. `func` is called with the results of the stages in `requires`, in that order.
+    """
+    name: str
+    func: Callable
+    requires: tuple = ()
+
+def check_stages(stages: list[Stage]):
+    """
+    Validate the stage graph: unique names, known dependencies and no cycles.
+
+    Raises:
+        ValueError: If the graph is invalid.
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names in {names}.")
+    for stage in stages:
+        unknown = [name for name in stage.requires if name not in names]
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' requires unknown stages {unknown}.")
+
+    resolved, pending = set(), list(stages)
+    while pending:
+        ready = [stage for stage in pending if set(stage.requires) <= resolved]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {[stage.name for stage in pending]}.")
+        resolved.update(stage.name for stage in ready)
+        pending = [stage for stage in pending if stage.name not in resolved]
+
+def run_timed(func: Callable, args: tuple) -> tuple:
+    """
+    Run `func(*args)` and time it. Exceptions are returned rather than raised, so that the
+    duration of a failing stage is recorded too.
+
+    Returns:
+        tuple: (result, error, seconds)
+    """
+    start = time.perf_counter()
+    try:
+        result, error = func(*args), None
+    except Exception as e:
+        result, error = None, e
+    return result, error, time.perf_counter() - start
+
+def run_stages(stages: list[Stage], max_workers: int = None) -> dict:
+    """
+    Run the aggregator stages, each as soon as the stages it requires have succeeded, with
+    independent stages running concurrently on a thread pool (stages are closures over the
+    aggregator's state, so they share it rather than being pickled to worker processes).
+    A failing stage does not stop the others: only the stages that depend on it (directly or
+    not) are skipped.
+
+    Args:
+        stages (list[Stage]): The stages to run.
+        max_workers (int, optional): Size of the pool (defaults to the number of stages).
+
+    Returns:
+        dict: Stage name -> {"status": "ok" | "failed" | "skipped", "result", "error", "seconds"},
+        in the order of `stages`.
+    """
+    check_stages(stages)
+    report = {stage.name: {"status": None, "result": None, "error": None, "seconds": 0.0} for stage in stages}
+    waiting = list(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(stages), 1)) as pool:
+        while waiting or running:
+            for stage in list(waiting):
+                statuses = [report[name]["status"] for name in stage.requires]
+                if any(status in ("failed", "skipped") for status in statuses):
+                    report[stage.name]["status"] = "skipped"
+                    report[stage.name]["error"] = f"requires {[name for name in stage.requires if report[name]['status'] != 'ok']}"
+                    waiting.remove(stage)
+                elif all(status == "ok" for status in statuses):
+                    args = tuple(report[name]["result"] for name in stage.requires)
+                    running[pool.submit(run_timed, stage.func, args)] = stage
+                    waiting.remove(stage)
+
+            if not running:
+                continue  # only skipped stages were left to resolve
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                result, error, seconds = future.result()  # `run_timed` returns stage errors
+                report[stage.name].update(status="ok" if error is None else "failed", result=result, error=error, seconds=seconds)
+    return report
+
+def print_stage_report(report: dict, prefix: str = ""):
+    """
+    Print the status and duration of every stage.
+    """
+    for name, outcome in report.items():
+        line = f"{prefix}Stage {name}: {outcome['status']} ({outcome['seconds']:.2f}s)"
+        if outcome["error"] is not None:
+            line += f" -> {outcome['error']}"
+        print(line)
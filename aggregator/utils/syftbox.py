@@ -1,50 +1,162 @@
 import os
+import json
 import yaml
 from pathlib import Path
 from syftbox.lib import Client, SyftPermission
 
-def participants_datasets(datasites_path: Path, dataset_name = "Netflix Data", dataset_format = "CSV") -> list[str]:
+# libyaml's C loader when available: several times faster than the pure-Python SafeLoader
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def load_datasets_yaml(datasets_yaml) -> list[dict]:
+    """
+    Parse a datasites/<user>/public/datasets.yaml file into its list of datasets.
+    """
+    with open(datasets_yaml, "r") as file:
+        data = yaml.load(file, Loader=YamlLoader) or {}
+    return [dataset for dataset in data.get("datasets", []) if isinstance(dataset, dict)]
+
+def has_dataset(datasets: list[dict], dataset_name: str, dataset_format: str) -> bool:
+    return any(
+        dataset.get("name") == dataset_name and dataset.get("format") == dataset_format and "path" in dataset
+        for dataset in datasets
+    )
+
+def participants_datasets(datasites_path: Path, dataset_name = "Netflix Data", dataset_format = "CSV", index = None) -> list[str]:
     """
     Check for "Netflix Data" from datasites/<user>/public/datasets.yaml
+
+    With a `DiscoveryIndex`, only the datasets.yaml files that changed since its last refresh are parsed.
     """
-    entries = sorted(os.listdir(datasites_path))
-    users = []
+    if index is not None:
+        return index.participants_datasets(dataset_name, dataset_format)
 
-    for entry in entries:
+    users = []
+    for entry in sorted(entry.name for entry in os.scandir(datasites_path) if entry.is_dir()):
         datasets_yaml = Path(datasites_path / entry / "public" / "datasets.yaml")
-        if datasets_yaml.is_file():
-            with open(datasets_yaml, "r") as file:
-                data = yaml.safe_load(file)
-
-                for dataset in data.get("datasets", []):
-                    if (
-                        dataset.get("name") == dataset_name and
-                        dataset.get("format") == dataset_format and
-                        "path" in dataset
-                    ):
-                        users.append(entry)
+        if datasets_yaml.is_file() and has_dataset(load_datasets_yaml(datasets_yaml), dataset_name, dataset_format):
+            users.append(entry)
 
     return users
 
-def network_participants(datasite_path: Path, api_name:str) -> list[str]:
+def network_participants(datasite_path: Path, api_name:str, index = None) -> list[str]:
     """
     Network Participants Discovery:
     Retrieves a list of user directories (participants) in a given datasite path. 
     This function scans the network for all available peers by looking at directories in the datasite path.
     
     By looking for "api_data / API_NAME" only those from the specific app will be considered.
-    
+
+    With a `DiscoveryIndex`, only the datasites whose api_data changed since its last refresh are listed.
     """
+    if index is not None:
+        return index.network_participants(api_name)
 
-    entries = sorted(os.listdir(datasite_path))
     users = []
-
-    for entry in entries:
+    for entry in sorted(entry.name for entry in os.scandir(datasite_path) if entry.is_dir()):
         if Path(datasite_path / entry / "api_data" / api_name).is_dir():
             users.append(entry)
 
     return users
 
+def stat_signature(path):
+    """
+    (mtime_ns, size) of a path, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+class DiscoveryIndex:
+    """
+    Incremental index of the datasites: which apps each one has installed (api_data/<app>) and
+    which datasets it publishes (public/datasets.yaml).
+
+    The index keeps the mtime of every directory and file it read, together with what it found
+    there, and is persisted as JSON between aggregator runs. On `refresh`, the datasites
+    directory is only listed again if its own mtime changed (a datasite was added or removed),
+    and for each datasite an `api_data` directory or `datasets.yaml` file is only listed or
+    parsed again if its mtime changed. A refresh thus costs one stat per datasite plus work
+    proportional to the number of changed entries, instead of a full tree walk with YAML parsing.
+    """
+
+    def __init__(self, datasites_path: Path, index_path: Path = None):
+        self.datasites_path = Path(datasites_path)
+        self.index_path = index_path
+        self.state = self.load()
+        self.changed = []
+
+    def load(self) -> dict:
+        if self.index_path is not None and os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    state = json.load(f)
+                if state.get("datasites_path") == str(self.datasites_path):
+                    return state
+            except (OSError, ValueError):
+                pass
+        return {"datasites_path": str(self.datasites_path), "root": None, "names": [], "datasites": {}}
+
+    def save(self):
+        if self.index_path is None:
+            return
+        os.makedirs(os.path.dirname(str(self.index_path)) or ".", exist_ok=True)
+        with open(str(self.index_path) + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(str(self.index_path) + ".tmp", str(self.index_path))
+
+    def refresh(self):
+        """
+        Bring the index up to date with the datasites directory and persist it.
+
+        Returns:
+            list[str]: The datasites whose apps or datasets were re-read.
+        """
+        state = self.state
+        root_signature = stat_signature(self.datasites_path)
+        if root_signature != state["root"]:
+            state["names"] = sorted(entry.name for entry in os.scandir(self.datasites_path) if entry.is_dir()) if root_signature else []
+            state["root"] = root_signature
+
+        datasites, self.changed = {}, []
+        for name in state["names"]:
+            cached = state["datasites"].get(name, {})
+            entry = dict(cached)
+            datasite = self.datasites_path / name
+
+            api_signature = stat_signature(datasite / "api_data")
+            if "apis" not in cached or api_signature != cached.get("api_data"):
+                entry["apis"] = sorted(e.name for e in os.scandir(datasite / "api_data") if e.is_dir()) if api_signature else []
+                entry["api_data"] = api_signature
+
+            yaml_signature = stat_signature(datasite / "public" / "datasets.yaml")
+            if "datasets" not in cached or yaml_signature != cached.get("datasets_yaml"):
+                try:
+                    datasets = load_datasets_yaml(datasite / "public" / "datasets.yaml") if yaml_signature else []
+                    entry["datasets"] = [{key: str(dataset[key]) for key in ("name", "format", "path") if key in dataset} for dataset in datasets]
+                except (OSError, yaml.YAMLError) as e:
+                    print(f"> Unable to parse the datasets of {name}: {e}")
+                    entry["datasets"] = []
+                entry["datasets_yaml"] = yaml_signature
+
+            if entry != cached:
+                self.changed.append(name)
+            datasites[name] = entry
+
+        state["datasites"] = datasites
+        self.save()
+        return self.changed
+
+    def network_participants(self, api_name: str) -> list[str]:
+        return [name for name in self.state["names"] if api_name in self.state["datasites"].get(name, {}).get("apis", [])]
+
+    def participants_datasets(self, dataset_name = "Netflix Data", dataset_format = "CSV") -> list[str]:
+        return [
+            name for name in self.state["names"]
+            if has_dataset(self.state["datasites"].get(name, {}).get("datasets", []), dataset_name, dataset_format)
+        ]
+
 
 def create_shared_folder(path: Path, api_name:str, client: Client, participants: list) -> Path:
     """
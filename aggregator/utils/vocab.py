@@ -1,18 +1,51 @@
 import json
 import os
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
 from pathlib import Path
+from common.vocabulary import file_sha256, write_binary_vocab, load_vocabulary, VOCAB_JSON_FILE, VOCAB_BINARY_FILE
 
-def create_tvseries_vocab(shared_folder: Path):
+VOCAB_STATE_FILE = "tv-series_vocabulary.state.json"
+
+def create_tvseries_vocab(shared_folder: Path, private_folder: Path = None):
+    """
+    Publish the TV series vocabulary (title -> ID, IDs in sorted title order) to the shared folder,
+    as `tv-series_vocabulary.json` and as a binary vocabulary that participants can memory-map.
+    Rows without a title are ignored.
+
+    The build is content-addressed: when the source CSV has the same SHA-256 as at the last build
+    and both files are in place, nothing is re-read nor rewritten (so nothing is re-synced).
+    The build state is kept in the aggregator's `private_folder`, out of the synced shared folder;
+    without one, the vocabulary is rebuilt every time.
+
+    Returns:
+        Vocabulary: The vocabulary mapping (see `common.vocabulary.load_vocabulary`).
+    """
     zip_file = os.path.join(os.getcwd(), "aggregator", "data", "netflix_series_2024-12.csv.zip")  # TODO: retrieve most up-to-date file
-    df = pd.read_csv(zip_file)
+    json_path = os.path.join(str(shared_folder), VOCAB_JSON_FILE)
+    binary_path = os.path.join(str(shared_folder), VOCAB_BINARY_FILE)
+    state_path = os.path.join(str(private_folder), VOCAB_STATE_FILE) if private_folder is not None else None
+
+    source_sha256 = file_sha256(zip_file)
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if state["source_sha256"] == source_sha256 and os.path.isfile(json_path) and os.path.isfile(binary_path):
+            return load_vocabulary(binary_path)
+    except (TypeError, OSError, ValueError, KeyError):
+        pass  # no usable previous build
+
+    df = pd.read_csv(zip_file, usecols=["Title"])
+    titles = sorted(df["Title"].dropna().unique())
+    vocab_mapping = {title: idx for idx, title in enumerate(titles)}
+
+    with open(json_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(vocab_mapping, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(json_path + ".tmp", json_path)
+    version = write_binary_vocab(binary_path, titles)
 
-    label_encoder = LabelEncoder()
-    label_encoder.fit(df['Title'])
+    if state_path is not None:
+        os.makedirs(str(private_folder), exist_ok=True)
+        with open(state_path, "w") as f:
+            json.dump({"source_sha256": source_sha256, "version": version, "size": len(titles)}, f)
 
-    vocab_mapping = {title: idx for idx, title in enumerate(label_encoder.classes_)}
-    
-    output_path = os.path.join(str(shared_folder), "tv-series_vocabulary.json")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(vocab_mapping, f, ensure_ascii=False, indent=4)
\ No newline at end of file
+    return load_vocabulary(binary_path)
@@ -0,0 +1,105 @@
+import os
+import struct
+import zipfile
+import numpy as np
+
+MLP_PARAMS_FILE = "netflix_mlp_params.npz"
+FEDAVG_PARAMS_FILE = "netflix_mlp_fedavg_params.npz"
+FORMAT_VERSION = 1
+
+ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")  # signature, ..., file name length, extra field length
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+def save_mlp_params(path, coefs, intercepts, num_samples: int = 0, version: int = 0, classes=None, dtype: str = "float32"):
+    """
+    Save MLP parameters as a single self-describing, pickle-free `.npz` file.
+
+    The file holds one array per layer ("coef_<i>", "intercept_<i>", whose shapes are the layer
+    shapes) in `dtype`, plus "num_layers", "num_samples" (training samples, the FedAvg weight),
+    "version" (round of the global model it derives from) and, for vocabulary-aligned uploads,
+    "classes" (vocabulary IDs of the output units). It is written uncompressed, so that the
+    aggregator can memory-map the layers, and atomically, so that peers never read a partial file.
+    """
+    arrays = {
+        "format_version": np.array(FORMAT_VERSION),
+        "num_layers": np.array(len(coefs)),
+        "num_samples": np.array(num_samples, dtype=np.int64),
+        "version": np.array(version, dtype=np.int64),
+    }
+    for layer, (W, b) in enumerate(zip(coefs, intercepts)):
+        arrays[f"coef_{layer}"] = np.asarray(W, dtype=dtype)
+        arrays[f"intercept_{layer}"] = np.asarray(b, dtype=dtype)
+    if classes is not None:
+        arrays["classes"] = np.asarray(classes, dtype=np.int64)
+
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, str(path))
+
+def memmap_npz_members(path) -> dict:
+    """
+    Memory-map the arrays of a `.npz` file, without reading their data.
+
+    `np.load` ignores `mmap_mode` for `.npz` files; since `np.savez` stores members
+    uncompressed, each member's `.npy` data can be mapped at its offset in the archive (the
+    offsets come from `zipfile`, so ZIP64 archives are handled too). Members that cannot be
+    mapped (compressed, e.g. written by `np.savez_compressed`, empty or scalar) are read
+    with `np.lib.format.read_array` instead.
+
+    Returns:
+        dict: Member name (without ".npy") -> read-only np.memmap, or np.ndarray for the members read.
+    """
+    arrays = {}
+    with zipfile.ZipFile(str(path)) as archive, open(str(path), "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            array = None
+            if info.compress_type == zipfile.ZIP_STORED:
+                f.seek(info.header_offset)
+                signature, name_length, extra_length = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+                if signature == ZIP_LOCAL_SIGNATURE:
+                    f.seek(info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length)
+                    array = memmap_npy(path, f)
+            if array is None:
+                with archive.open(info) as member:
+                    array = np.lib.format.read_array(member, allow_pickle=False)
+            arrays[name] = array
+    return arrays
+
+def memmap_npy(path, f):
+    """
+    Memory-map the `.npy` array starting at the current position of `f` (an open handle on
+    `path`), or return None if it holds Python objects, no data or a scalar.
+    """
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if dtype.hasobject or shape == () or 0 in shape:
+        return None
+    order = "F" if fortran_order else "C"
+    return np.memmap(str(path), dtype=dtype, mode="r", offset=f.tell(), shape=shape, order=order)
+
+def load_mlp_params(path, mmap: bool = False) -> dict:
+    """
+    Load MLP parameters saved with `save_mlp_params`, memory-mapping the layers if `mmap` is True.
+
+    Returns:
+        dict: "coefs" and "intercepts" (lists of arrays), "num_samples", "version" and "classes" (or None).
+    """
+    if mmap:
+        data = memmap_npz_members(path)
+    else:
+        with np.load(str(path)) as npz:
+            data = {name: npz[name] for name in npz.files}
+
+    num_layers = int(data["num_layers"])
+    return {
+        "coefs": [data[f"coef_{layer}"] for layer in range(num_layers)],
+        "intercepts": [data[f"intercept_{layer}"] for layer in range(num_layers)],
+        "num_samples": int(data["num_samples"]),
+        "version": int(data["version"]),
+        "classes": np.asarray(data["classes"]) if "classes" in data else None,
+    }
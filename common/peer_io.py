@@ -0,0 +1,69 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+def peer_artifact_paths(datasites_path: Path, peers: list[str], api_name: str, filename: str) -> list[tuple[str, Path]]:
+    """
+    Resolve the path of a peer artifact (`<datasite>/api_data/<api_name>/<filename>`) for every peer.
+
+    Returns:
+        list[tuple[str, Path]]: (peer, path) for the peers where the file exists, in the order of `peers`.
+    """
+    artifacts = []
+    for peer in peers:
+        path = Path(datasites_path) / peer / "api_data" / api_name / filename
+        if os.path.isfile(path):
+            artifacts.append((peer, path))
+    return artifacts
+
+def prefetch_peer_artifacts(items, load, prefetch: int = 4):
+    """
+    Iterate over peer artifacts while the next ones are being loaded in the background.
+
+    Up to `prefetch` calls of `load` run ahead on a bounded thread pool while the caller folds
+    the current artifact into its aggregate, so at most `prefetch + 1` loaded artifacts are held
+    at once. Results come back in the order of `items`, and a failing load does not stop the
+    iteration: its exception is returned instead. With `prefetch=0`, artifacts are loaded
+    one at a time in the calling thread.
+
+    Args:
+        items (iterable): Whatever `load` takes, e.g. paths or (weight, bias) path pairs.
+        load (callable): item -> loaded artifact.
+        prefetch (int): Maximum number of loads in flight ahead of the consumer.
+
+    Yields:
+        tuple: (item, artifact, error), with artifact None when `load` raised `error`.
+    """
+    if prefetch <= 0:
+        for item in items:
+            try:
+                artifact, error = load(item), None
+            except Exception as e:
+                artifact, error = None, e
+            yield item, artifact, error
+        return
+
+    items = iter(items)
+    pending = deque()
+    pool = ThreadPoolExecutor(max_workers=prefetch)
+
+    def submit_next():
+        for item in items:
+            pending.append((item, pool.submit(load, item)))
+            return
+
+    try:
+        for _ in range(prefetch):
+            submit_next()
+        while pending:
+            item, future = pending.popleft()
+            submit_next()  # keep the window full while the caller works on this one
+            try:
+                artifact, error = future.result(), None
+            except Exception as e:
+                artifact, error = None, e
+            yield item, artifact, error
+    finally:
+        # Closing the iterator early drops the loads that have not started yet
+        pool.shutdown(wait=True, cancel_futures=True)
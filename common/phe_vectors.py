@@ -0,0 +1,131 @@
+import os
+import json
+import base64
+import hashlib
+import numpy as np
+from pathlib import Path
+from phe import paillier
+
+PUBLIC_KEY_FILE = "public_phe_key.json"
+PHE_VECTOR_FILE = "top5_series_phe.npz"
+FORMAT_VERSION = 1
+
+# Packed vectors: counts in [0, max_value] take `slot_bits`-bit slots, `slots_per_block` slots
+# per Paillier plaintext (count i of a block at bits [i * slot_bits, (i + 1) * slot_bits)).
+LAYOUT_FIELDS = ["length", "slot_bits", "slots_per_block", "max_value", "max_peers"]
+
+## ==================================================================================================
+## Keys
+## ==================================================================================================
+
+def load_public_key(public_path: Path) -> paillier.PaillierPublicKey:
+    """
+    Load the aggregator's Paillier public key (as published by `aggregator/pets/phe.generate_keys`).
+    """
+    key_file = Path(public_path) / PUBLIC_KEY_FILE
+    if not key_file.exists():
+        raise FileNotFoundError(f"Public key file not found: {key_file}")
+
+    with open(key_file, "r") as pub_file:
+        public_key_data = json.load(pub_file)
+    try:
+        n = int(base64.b64decode(public_key_data["n"]).decode("utf-8"))
+        return paillier.PaillierPublicKey(n=n)
+    except (KeyError, ValueError, TypeError) as e:
+        raise ValueError("Invalid public key format.") from e
+
+def key_fingerprint(public_key: paillier.PaillierPublicKey) -> str:
+    return hashlib.sha256(str(public_key.n).encode("utf-8")).hexdigest()
+
+## ==================================================================================================
+## Slot Packing
+## ==================================================================================================
+
+def packing_layout(public_key: paillier.PaillierPublicKey, max_value: int, max_peers: int) -> tuple[int, int]:
+    """
+    Layout of the counts in Paillier plaintexts. Each count takes a slot wide enough to hold the
+    sum of `max_peers` counts of at most `max_value`, so that adding the ciphertexts of up to
+    `max_peers` participants never carries into the next slot. As many slots as fit under the
+    modulus n go into one plaintext.
+
+    Returns:
+        tuple: (slot_bits, slots_per_block)
+    """
+    slot_bits = max(int(max_value) * int(max_peers), 1).bit_length()
+    slots_per_block = (public_key.n.bit_length() - 1) // slot_bits
+    if slots_per_block < 1:
+        raise ValueError(f"A {slot_bits}-bit slot does not fit in a {public_key.n.bit_length()}-bit key.")
+    return slot_bits, slots_per_block
+
+def pack_vector(vector: np.ndarray, slot_bits: int, slots_per_block: int) -> list[int]:
+    """
+    Pack non-negative counts into integers, `slots_per_block` counts of `slot_bits` bits each.
+    """
+    vector = np.asarray(vector, dtype=np.int64)
+    blocks = []
+    for start in range(0, len(vector), slots_per_block):
+        block = 0
+        for count in reversed(vector[start:start + slots_per_block].tolist()):
+            block = (block << slot_bits) | count
+        blocks.append(block)
+    return blocks
+
+def unpack_vector(blocks: list[int], length: int, slot_bits: int, slots_per_block: int, max_slot_value: int = None) -> np.ndarray:
+    """
+    Inverse of `pack_vector`.
+
+    With `max_slot_value`, the blocks are also checked against the layout: every slot must hold
+    at most `max_slot_value`, and the bits above the last slot, as well as the slots past
+    `length`, must be zero. Packed sums only break these bounds when some input did (e.g. a
+    participant that encrypted counts above the agreed `max_value`), in which case slots may
+    have carried into their neighbours.
+
+    Raises:
+        ValueError: If a block does not fit the layout.
+    """
+    mask = (1 << slot_bits) - 1
+    values = []
+    for block in blocks:
+        if max_slot_value is not None and block >> (slot_bits * slots_per_block):
+            raise ValueError("A packed block overflows its slots.")
+        values.extend((block >> (slot * slot_bits)) & mask for slot in range(slots_per_block))
+    if max_slot_value is not None and (any(values[length:]) or any(value > max_slot_value for value in values[:length])):
+        raise ValueError(f"Packed slots exceed their bound of {max_slot_value}.")
+    return np.array(values[:length], dtype=np.int64)
+
+## ==================================================================================================
+## Ciphertext Artifact
+## ==================================================================================================
+
+def save_encrypted_vector(path, payload: dict):
+    """
+    Save a ciphertext payload as a pickle-free `.npz` file: the ciphertexts as fixed-width
+    big-endian bytes (a (blocks, ciphertext_bytes) uint8 array) next to the packing layout.
+    The file is replaced atomically.
+    """
+    width = payload["ciphertext_bytes"]
+    ciphertexts = np.frombuffer(b"".join(c.to_bytes(width, "big") for c in payload["ciphertexts"]), dtype=np.uint8)
+    arrays = {name: np.array(payload[name]) for name in LAYOUT_FIELDS + ["num_peers"]}
+    arrays["format_version"] = np.array(FORMAT_VERSION)
+    arrays["key_fingerprint"] = np.frombuffer(bytes.fromhex(payload["key_fingerprint"]), dtype=np.uint8)
+    arrays["ciphertexts"] = ciphertexts.reshape(len(payload["ciphertexts"]), width)
+
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, str(path))
+
+def load_encrypted_vector(path) -> dict:
+    """
+    Load a packed ciphertext artifact saved with `save_encrypted_vector`.
+
+    Returns:
+        dict: The packing layout (LAYOUT_FIELDS), "num_peers", "key_fingerprint" (hex),
+        "ciphertexts" (list of int) and "ciphertext_bytes".
+    """
+    with np.load(str(path)) as data:
+        payload = {name: int(data[name]) for name in LAYOUT_FIELDS + ["num_peers"]}
+        payload["key_fingerprint"] = data["key_fingerprint"].tobytes().hex()
+        payload["ciphertexts"] = [int.from_bytes(row.tobytes(), "big") for row in data["ciphertexts"]]
+        payload["ciphertext_bytes"] = int(data["ciphertexts"].shape[1])
+    return payload
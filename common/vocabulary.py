@@ -0,0 +1,296 @@
+import os
+import json
+import struct
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from collections.abc import Mapping
+
+VOCAB_JSON_FILE = "tv-series_vocabulary.json"
+VOCAB_BINARY_FILE = "tv-series_vocabulary.bin"
+
+# Binary vocabulary (written by the aggregator, memory-mapped by participants):
+#   magic (8 bytes) | count (uint64 LE) | version = SHA-256 of offsets + blob (32 bytes)
+#   | offsets ((count + 1) uint64 LE) | blob (UTF-8 titles, concatenated in sorted order)
+# Title i (its vocabulary ID) is blob[offsets[i]:offsets[i + 1]].
+VOCAB_MAGIC = b"TVVOCAB1"
+VOCAB_HEADER = struct.Struct("<8sQ32s")
+
+MAX_CACHED_VOCABULARIES = 4
+
+def normalize_string(s):
+    """
+    Normalize a string by removing zero-width spaces and converting to lowercase.
+
+    Args:
+        s (str): The input string.
+
+    Returns:
+        str: The normalized string.
+    """
+    return s.replace('\u200b', '').lower()
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+## ==================================================================================================
+## Binary Vocabulary
+## ==================================================================================================
+
+def write_binary_vocab(path, titles: list[str]) -> str:
+    """
+    Write sorted titles as a binary vocabulary (see VOCAB_MAGIC), atomically.
+
+    Returns:
+        str: The vocabulary version (hex SHA-256 of its offsets and titles).
+    """
+    encoded = [title.encode("utf-8") for title in titles]
+    if any(a >= b for a, b in zip(encoded, encoded[1:])):
+        raise ValueError("Titles must be unique and sorted for the binary vocabulary.")
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(title) for title in encoded])
+    blob = b"".join(encoded)
+    version = hashlib.sha256(offsets.tobytes() + blob)
+
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(VOCAB_HEADER.pack(VOCAB_MAGIC, len(encoded), version.digest()))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, str(path))
+    return version.hexdigest()
+
+def load_binary_vocabulary(path) -> dict:
+    """
+    Memory-map a binary vocabulary: nothing but the header is read until titles are looked up.
+
+    Returns:
+        dict: "size", "version" (hex), "offsets" (uint64 memmap) and "blob" (uint8 memmap).
+    """
+    with open(path, "rb") as f:
+        magic, count, version = VOCAB_HEADER.unpack(f.read(VOCAB_HEADER.size))
+    if magic != VOCAB_MAGIC:
+        raise ValueError(f"{path} is not a binary vocabulary.")
+
+    offsets = np.memmap(path, dtype="<u8", mode="r", offset=VOCAB_HEADER.size, shape=(count + 1,))
+    blob_offset = VOCAB_HEADER.size + 8 * (count + 1)
+    blob_size = int(offsets[-1])
+    blob = np.memmap(path, dtype=np.uint8, mode="r", offset=blob_offset, shape=(blob_size,)) if blob_size else np.zeros(0, dtype=np.uint8)
+    return {"size": int(count), "version": version.hex(), "offsets": offsets, "blob": blob}
+
+def title_bytes(vocabulary: dict, idx: int) -> bytes:
+    offsets = vocabulary["offsets"]
+    return vocabulary["blob"][int(offsets[idx]):int(offsets[idx + 1])].tobytes()
+
+def title_at(vocabulary: dict, idx: int) -> str:
+    """
+    Title with vocabulary ID `idx`.
+    """
+    return title_bytes(vocabulary, idx).decode("utf-8")
+
+def find_title(vocabulary: dict, title: str) -> int:
+    """
+    Vocabulary ID of an exact title, by binary search over the sorted titles (O(log n) reads).
+
+    Returns:
+        int: The ID, or -1 if the title is not in the vocabulary (as `match_title`).
+    """
+    key = title.encode("utf-8")
+    low, high = 0, vocabulary["size"]
+    while low < high:
+        mid = (low + high) // 2
+        if title_bytes(vocabulary, mid) < key:
+            low = mid + 1
+        else:
+            high = mid
+    return low if low < vocabulary["size"] and title_bytes(vocabulary, low) == key else -1
+
+def vocabulary_titles(vocabulary: dict) -> list[str]:
+    """
+    All titles, in ID order.
+    """
+    blob = vocabulary["blob"].tobytes()
+    offsets = vocabulary["offsets"]
+    return [blob[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+## ==================================================================================================
+## Shared Vocabulary
+## ==================================================================================================
+
+class Vocabulary(Mapping):
+    """
+    The TV series vocabulary (title -> ID), as a read-only mapping shared by every caller of
+    `load_vocabulary` in the process.
+
+    It is backed either by a dict (JSON vocabularies) or by a memory-mapped binary vocabulary
+    (`from_binary`), whose exact lookups are binary searches and whose titles are only decoded
+    when a caller needs all of them. On top of the mapping, it keeps an array-backed ID -> title
+    lookup (`titles`, None for unused IDs) and a normalized title -> ID index, both built on
+    first use.
+    """
+
+    def __init__(self, mapping: dict = None, version: str = None, binary: dict = None):
+        self.version = version
+        self.binary = binary
+        self._index = None if binary is not None else {title: int(item_id) for title, item_id in mapping.items()}
+        self._title_list = None
+        self._titles = None
+        self._item_ids = None
+        self._normalized = None
+
+    @classmethod
+    def from_titles(cls, titles: list[str], version: str = None) -> "Vocabulary":
+        return cls({title: item_id for item_id, title in enumerate(titles)}, version)
+
+    @classmethod
+    def from_binary(cls, path) -> "Vocabulary":
+        binary = load_binary_vocabulary(path)
+        return cls(version=binary["version"], binary=binary)
+
+    @property
+    def index(self) -> dict:
+        """
+        Title -> ID, as a dict.
+        """
+        if self._index is None:
+            self._index = {title: item_id for item_id, title in enumerate(vocabulary_titles(self.binary))}
+        return self._index
+
+    @property
+    def title_list(self) -> list[str]:
+        """
+        Titles, in insertion order (for fuzzy matching).
+        """
+        if self._title_list is None:
+            self._title_list = list(self.index)
+        return self._title_list
+
+    @property
+    def titles(self) -> np.ndarray:
+        """
+        ID -> title, as an object array (None for unused IDs).
+        """
+        if self._titles is None:
+            titles = np.full(max(self.index.values(), default=-1) + 1, None, dtype=object)
+            for title, item_id in self.index.items():
+                titles[item_id] = title
+            self._titles = titles
+        return self._titles
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        """
+        IDs of the titles, as an int64 array.
+        """
+        if self._item_ids is None:
+            if self._index is None:
+                self._item_ids = np.arange(self.binary["size"], dtype=np.int64)
+            else:
+                self._item_ids = np.fromiter(self._index.values(), dtype=np.int64, count=len(self._index))
+        return self._item_ids
+
+    def __getitem__(self, title: str) -> int:
+        if self._index is None:
+            item_id = find_title(self.binary, title) if isinstance(title, str) else -1
+            if item_id == -1:
+                raise KeyError(title)
+            return item_id
+        return self._index[title]
+
+    def __contains__(self, title) -> bool:
+        if self._index is None:
+            return isinstance(title, str) and find_title(self.binary, title) != -1
+        return title in self._index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return self.binary["size"] if self._index is None else len(self._index)
+
+    def get(self, title, default=None):
+        try:
+            return self[title]
+        except KeyError:
+            return default
+
+    def title(self, item_id: int):
+        """
+        Title of an item ID, or None if the ID is unused.
+        """
+        if self._index is None and self._titles is None:
+            return title_at(self.binary, item_id) if 0 <= item_id < self.binary["size"] else None
+        return self.titles[item_id] if 0 <= item_id < len(self.titles) else None
+
+    @property
+    def normalized(self) -> dict:
+        """
+        Normalized title (see `normalize_string`) -> ID.
+        """
+        if self._normalized is None:
+            self._normalized = {normalize_string(title): item_id for title, item_id in self.index.items()}
+        return self._normalized
+
+    def find_normalized(self, title: str):
+        """
+        ID of a title compared in normalized form, or None.
+        """
+        return self.normalized.get(normalize_string(title))
+
+_vocabularies = OrderedDict()  # content hash -> Vocabulary, least recently used first
+_hashes = {}                   # path -> ((size, mtime_ns), content hash)
+_cache_lock = threading.RLock()  # aggregator stages load vocabularies concurrently
+
+def vocabulary_hash(path: str) -> str:
+    """
+    Content hash of a vocabulary file: the version in the header of a binary vocabulary, the
+    SHA-256 of a JSON one. It is only recomputed when the file's size or mtime changed.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        known = _hashes.get(path)
+        if known is not None and known[0] == signature:
+            return known[1]
+
+        digest = load_binary_vocabulary(path)["version"] if path.endswith(".bin") else file_sha256(path)
+        _hashes[path] = (signature, digest)
+        return digest
+
+def load_vocabulary(path) -> Vocabulary:
+    """
+    Load a vocabulary, from its JSON or its binary (`.bin`) form, once per process: the same
+    `Vocabulary` is returned for as long as the file's content does not change. Only the
+    `MAX_CACHED_VOCABULARIES` most recently used versions are kept. Safe to call from several
+    threads: the cache is only read and updated under a lock.
+    """
+    path = str(path)
+    with _cache_lock:
+        digest = vocabulary_hash(path)
+        vocabulary = _vocabularies.get(digest)
+        if vocabulary is None:
+            if path.endswith(".bin"):
+                vocabulary = Vocabulary.from_binary(path)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    vocabulary = Vocabulary(json.load(f), version=digest)
+            _vocabularies[digest] = vocabulary
+            while len(_vocabularies) > MAX_CACHED_VOCABULARIES:
+                _vocabularies.popitem(last=False)
+        _vocabularies.move_to_end(digest)
+        return vocabulary
+
+def find_vocabulary(folder, fallback=None):
+    """
+    Path of the vocabulary published in `folder`, preferring the binary form, else `fallback`.
+    """
+    for name in [VOCAB_BINARY_FILE, VOCAB_JSON_FILE]:
+        path = os.path.join(str(folder), name)
+        if os.path.isfile(path):
+            return path
+    return fallback
@@ -1,6 +1,6 @@
 import numpy as np
-from datetime import datetime
 from collections import Counter, defaultdict
+from participant.participant_utils.viewing_history import parse_viewing_history
 
 ## ==================================================================================================
 ## Data Processing (1) - Reduction
@@ -8,25 +8,27 @@ from collections import Counter, defaultdict
 
 def extract_titles(history: np.ndarray) -> np.ndarray:
     """
-    Extract and reduce titles from the viewing history.
+    Extract and reduce titles from the viewing history (see `parse_viewing_history`).
     """
-    return np.array([title.split(":")[0] if ":" in title else title for title in history[:, 0]])
+    return parse_viewing_history(history)["show"].to_numpy(dtype=str)
 
 def convert_dates_to_weeks(history: np.ndarray) -> np.ndarray:
     """
-    Convert viewing dates to ISO week numbers.
+    Convert viewing dates to ISO week numbers (see `parse_viewing_history`).
     """
-    return np.array([
-        datetime.strptime(date, "%d/%m/%Y").isocalendar()[1]
-        for date in history[:, 1]
-    ])
+    return parse_viewing_history(history)["week"].to_numpy()
 
-def orchestrate_reduction(history: np.ndarray) -> np.ndarray:
+def orchestrate_reduction(history: np.ndarray, parsed_history=None) -> np.ndarray:
     """
     Orchestrates the reduction process for Netflix viewing history.
+
+    Titles and dates are parsed in one vectorized pass, or taken from `parsed_history`
+    (see `parse_viewing_history`) when the caller already parsed them.
     """
-    titles = extract_titles(history)
-    weeks = convert_dates_to_weeks(history)
+    if parsed_history is None:
+        parsed_history = parse_viewing_history(history)
+    titles = parsed_history["show"].to_numpy(dtype=str)
+    weeks = parsed_history["week"].to_numpy()
     return np.column_stack((titles, weeks))
 
 ## ==================================================================================================
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+from pathlib import Path
+from phe import paillier
+from concurrent.futures import ProcessPoolExecutor
+from common.phe_vectors import (
+    load_public_key,
+    key_fingerprint,
+    packing_layout,
+    pack_vector,
+    save_encrypted_vector,
+    PUBLIC_KEY_FILE,
+    PHE_VECTOR_FILE,
+)
+
+## ==================================================================================================
+## Encryption
+## ==================================================================================================
+
+def encrypt_blocks(n: int, blocks: list[int]) -> list[int]:
+    """
+    Raw Paillier encryption (with fresh obfuscation) of plaintext blocks. Module-level, so that it
+    can run in worker processes.
+    """
+    public_key = paillier.PaillierPublicKey(n=n)
+    return [public_key.raw_encrypt(block) for block in blocks]
+
+def encrypt_vector(vector, public_key: paillier.PaillierPublicKey, max_value: int = 1023, max_peers: int = 1024, processes: int = None) -> dict:
+    """
+    Encrypt a vector of bounded counts (e.g. view counts per vocabulary ID).
+
+    The counts are clipped to [0, max_value] and slot-packed (see `packing_layout`), so that one
+    Paillier encryption covers a whole block of counts instead of a single one; the blocks are
+    encrypted in parallel on a process pool (`processes` workers, all cores by default).
+    The ciphertexts of up to `max_peers` participants can then be added slot-wise by the aggregator.
+
+    Returns:
+        dict: The ciphertext payload (see `common.phe_vectors.save_encrypted_vector`).
+    """
+    vector = np.asarray(vector)
+    clipped = np.clip(vector, 0, max_value).astype(np.int64)
+    if np.any(clipped != vector):
+        print(f">> (PHE) {int(np.sum(clipped != vector))} counts clipped to [0, {max_value}]")
+
+    slot_bits, slots_per_block = packing_layout(public_key, max_value, max_peers)
+    blocks = pack_vector(clipped, slot_bits, slots_per_block)
+
+    workers = processes or os.cpu_count() or 1
+    chunk = -(-len(blocks) // workers) if blocks else 1
+    chunks = [blocks[start:start + chunk] for start in range(0, len(blocks), chunk)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            ciphertexts = [c for part in pool.map(encrypt_blocks, [public_key.n] * len(chunks), chunks) for c in part]
+    else:
+        ciphertexts = encrypt_blocks(public_key.n, blocks)
+
+    return {
+        "key_fingerprint": key_fingerprint(public_key),
+        "length": len(clipped),
+        "slot_bits": slot_bits,
+        "slots_per_block": slots_per_block,
+        "max_value": int(max_value),
+        "max_peers": int(max_peers),
+        "num_peers": 1,
+        "ciphertexts": ciphertexts,
+        "ciphertext_bytes": ((public_key.n ** 2).bit_length() + 7) // 8,
+    }
+
+def run_top5_phe(sparse_vector: Path, restricted_public_folder: Path, shared_folder: Path, max_value: int = 1023, max_peers: int = 1024):
+    """
+    Publish the view counts per TV series encrypted under the aggregator's public key, if it has
+    published one, for a homomorphic sum over participants.
+    """
+    if not (Path(shared_folder) / PUBLIC_KEY_FILE).is_file():
+        print(">> (Top-5 Series PHE | Participant) -> No aggregator public key available yet.")
+        return
+    public_key = load_public_key(shared_folder)
+    payload = encrypt_vector(np.load(sparse_vector), public_key, max_value=max_value, max_peers=max_peers)
+
+    save_path = Path(restricted_public_folder) / PHE_VECTOR_FILE
+    save_encrypted_vector(save_path, payload)
+    print(f">> (Top-5 Series PHE | Participant) -> {len(payload['ciphertexts'])} ciphertexts saved to: {save_path}")
@@ -1,44 +1,79 @@
 # Routines for ML
 # Reference: https://syftbox.openmined.org/datasites/andrew@openmined.org/netflix_fl/example_job/job.py
 
+import os
 import re
-import joblib
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.neural_network import MLPClassifier
 from sklearn.model_selection import train_test_split
+from participant.federated_learning.sequence_data import match_title
+from participant.participant_utils.viewing_history import parse_viewing_history, is_parsed_history
+from common.vocabulary import load_vocabulary, find_vocabulary, Vocabulary
+from participant.federated_learning.mlp_recommendation import save_local_model
+from common.mlp_params import save_mlp_params, load_mlp_params, MLP_PARAMS_FILE, FEDAVG_PARAMS_FILE
+
+MAX_SEASON = 20  # upper end of the season feature's scaling range (see `fixed_scaler`)
+MIN_TRAINING_ROWS = 2  # fewer training pairs cannot be split into a train and a test set
 
 ## ==================================================================================================
 ## Data Processing
 ## ==================================================================================================
 
 def extract_features(df):
-    # Extract show name and season from title
-    df['show'] = df['Title'].apply(lambda x: x.split(':')[0] if ':' in x else x)
-    df['season'] = df['Title'].apply(lambda x: 
-        int(re.search(r'Season (\d+)', x).group(1)) if re.search(r'Season (\d+)', x) else 0)
-    
-    # Convert date strings to datetime objects
-    df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
-    
-    # Extract temporal features
-    df['day_of_week'] = df['Date'].dt.dayofweek
+    # Extract show name, season and temporal features (see `parse_viewing_history`)
+    parsed = parse_viewing_history(df)
+    df['show'] = parsed['show'].to_numpy()
+    df['season'] = parsed['season'].to_numpy()
+    df['Date'] = parsed['Date'].to_numpy()
+    df['day_of_week'] = parsed['day_of_week'].to_numpy()
     # df['hour'] = df['Date'].dt.hour
     
     return df
 
-def prepare_data(file_path):
-    # Read the CSV file
-    df = pd.read_csv(file_path)
-    
-    # Process features
-    df = extract_features(df)
+def vocabulary_encoder(vocabulary: dict) -> LabelEncoder:
+    """
+    LabelEncoder whose classes are the titles of the shared vocabulary, at their vocabulary IDs.
+    """
+    if isinstance(vocabulary, Vocabulary):
+        titles = vocabulary.titles.copy()
+    else:
+        titles = np.empty(max(vocabulary.values()) + 1, dtype=object)
+        for title, idx in vocabulary.items():
+            titles[idx] = title
+    le_show = LabelEncoder()
+    le_show.classes_ = titles
+    return le_show
+
+def prepare_data(file_path, vocabulary=None):
+    """
+    Build the (show, season, day_of_week) -> next show training pairs.
+
+    `file_path` is the viewing history CSV, or a history already parsed with `parse_viewing_history`.
+
+    Without `vocabulary`, shows are encoded with a LabelEncoder fitted on the local history.
+    With the shared TV series vocabulary (title -> ID), shows are encoded with their vocabulary
+    IDs, so input encoding and output classes are the same for every participant; shows that
+    do not match any title (see `match_title`) are dropped.
+    """
+    if is_parsed_history(file_path):
+        df = file_path.copy()
+    else:
+        # Read the CSV file and process features
+        df = extract_features(pd.read_csv(file_path))
     
     # Encode categorical variables
-    le_show = LabelEncoder()
-    df['show_encoded'] = le_show.fit_transform(df['show'])
+    if vocabulary is None:
+        le_show = LabelEncoder()
+        df['show_encoded'] = le_show.fit_transform(df['show'])
+    else:
+        le_show = vocabulary_encoder(vocabulary)
+        show_ids = {show: match_title(show, vocabulary) for show in df['show'].unique()}
+        df['show_encoded'] = df['show'].map(show_ids)
+        df = df[df['show_encoded'] >= 0].reset_index(drop=True)
     
     # Create feature matrix
     X = df[['show_encoded', 'season', 'day_of_week']].values
@@ -48,33 +83,157 @@ def prepare_data(file_path):
     
     return X[:-1], y[:-1], le_show
 
+def fixed_scaler(num_shows: int) -> StandardScaler:
+    """
+    Feature scaling shared by every participant: each feature (show ID, season, day of week) is
+    mapped from its known range to [-1, 1] instead of being standardized with local statistics,
+    so that the global (FedAvg) weights see consistently scaled inputs on every participant.
+
+    Args:
+        num_shows: Number of show IDs (the vocabulary size, or the number of local labels).
+
+    Returns:
+        StandardScaler: A scaler with fixed statistics (no fitting needed).
+    """
+    low = np.zeros(3)
+    high = np.array([max(num_shows - 1, 1), MAX_SEASON, 6], dtype=np.float64)
+    scaler = StandardScaler()
+    scaler.mean_ = (low + high) / 2
+    scaler.scale_ = (high - low) / 2
+    scaler.var_ = scaler.scale_ ** 2
+    scaler.n_features_in_ = 3
+    scaler.n_samples_seen_ = 0
+    return scaler
 
 ## ==================================================================================================
 ## Model Training
 ## ==================================================================================================
 
-def train_model(dataset_location):
+def new_mlp():
+    return MLPClassifier(
+        hidden_layer_sizes=(64, 32),
+        max_iter=2000,
+        random_state=42
+    )
+
+def load_global_mlp_parameters(shared_folder):
+    """
+    Load the FedAvg model published by the aggregator.
+
+    Args:
+        shared_folder: Aggregator folder holding `netflix_mlp_fedavg_params.npz`.
+
+    Returns:
+        dict: The parameters (see `load_mlp_params`), or None if the aggregator has not published a model yet.
+    """
+    params_file = os.path.join(str(shared_folder), FEDAVG_PARAMS_FILE)
+    if not os.path.isfile(params_file):
+        return None
+    try:
+        return load_mlp_params(params_file)
+    except Exception as e:
+        print(f"> Unable to load the global MLP parameters: {e}")
+        return None
+
+def warm_start_mlp(mlp, X, y, classes, global_parameters):
+    """
+    Initialize `mlp` with the global coefficients for incremental training.
+
+    A first `partial_fit` call builds the network for this data; its weights are then replaced
+    by the global ones. If the layer shapes do not match (e.g. different output classes), the
+    network is left untouched.
+
+    Returns:
+        bool: Whether the global coefficients were loaded.
+    """
+    mlp.partial_fit(X, y, classes=classes)
+    coefs, intercepts = global_parameters
+    shapes_match = (
+        len(coefs) == len(mlp.coefs_) and len(intercepts) == len(mlp.intercepts_)
+        and all(np.shape(c) == m.shape for c, m in zip(coefs, mlp.coefs_))
+        and all(np.shape(b) == m.shape for b, m in zip(intercepts, mlp.intercepts_))
+    )
+    if not shapes_match:
+        print("> Global MLP does not match the local data, training from scratch.")
+        return False
+
+    mlp.coefs_ = [np.array(c, dtype=np.float64) for c in coefs]
+    mlp.intercepts_ = [np.array(b, dtype=np.float64) for b in intercepts]
+    return True
+
+def train_incrementally(mlp, X, y, max_epochs=20, time_budget=None, tol=1e-4):
+    """
+    Continue training with `partial_fit` until the epoch or wall-clock budget is spent,
+    or the training loss stops improving by more than `tol`.
+
+    Returns:
+        int: Number of epochs run.
+    """
+    start = time.perf_counter()
+    previous_loss = np.inf
+    for epoch in range(1, max_epochs + 1):
+        mlp.partial_fit(X, y)
+        if previous_loss - mlp.loss_ < tol:
+            break
+        previous_loss = mlp.loss_
+        if time_budget is not None and time.perf_counter() - start > time_budget:
+            break
+    return epoch
+
+def train_model(dataset_location, global_parameters=None, max_epochs=20, time_budget=30.0, vocabulary=None):
+    """
+    Train the MLP on the viewing history.
+
+    With `global_parameters` (see `load_global_mlp_parameters`), training starts from the
+    FedAvg model and continues for at most `max_epochs` epochs or `time_budget` seconds,
+    so that rounds build on each other. Otherwise, or if the global model does not fit the
+    local data, a fresh model is trained to convergence, within `time_budget` seconds for a
+    vocabulary-aligned model.
+
+    Features are scaled with `fixed_scaler`, the same on every participant, so that the shared
+    weights see the same input scale everywhere.
+
+    With `vocabulary`, the output layer has one unit per vocabulary title (see `prepare_data`)
+    and the classes seen as training targets are stored in `mlp.trained_classes_`.
+
+    Returns:
+        tuple: (mlp, scaler, le_show, num_samples). With fewer than `MIN_TRAINING_ROWS`
+        training pairs (e.g. no watched show is in the vocabulary), nothing is trained:
+        mlp and scaler are None and num_samples is 0.
+    """
     # Load and prepare data
-    X, y, le_show = prepare_data(dataset_location)
+    X, y, le_show = prepare_data(dataset_location, vocabulary)
+    if len(X) < MIN_TRAINING_ROWS:
+        print(f"> No trainable rows ({len(X)} training pairs), the MLP is not trained.")
+        return None, None, le_show, 0
     
     # Split the data
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
     )
     
-    # Scale features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
+    # Scale features, with the scaling shared by every participant
+    scaler = fixed_scaler(len(le_show.classes_))
+    X_train_scaled = scaler.transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    # Create and train the MLP
-    mlp = MLPClassifier(
-        hidden_layer_sizes=(64, 32),
-        max_iter=2000,
-        random_state=42
-    )
-    
-    mlp.fit(X_train_scaled, y_train)
+    # Create and train the MLP, from the global model when possible
+    mlp = new_mlp()
+    classes = np.arange(len(le_show.classes_))
+    if global_parameters is not None and warm_start_mlp(mlp, X_train_scaled, y_train, classes, global_parameters):
+        epochs = train_incrementally(mlp, X_train_scaled, y_train, max_epochs=max_epochs, time_budget=time_budget)
+        print(f"Warm-started from the global MLP, trained {epochs} epochs.")
+    elif vocabulary is not None:
+        # `fit` would only create outputs for the classes present locally
+        mlp = new_mlp()
+        start = time.perf_counter()
+        mlp.partial_fit(X_train_scaled, y_train, classes=classes)
+        remaining = None if time_budget is None else max(time_budget - (time.perf_counter() - start), 0.0)
+        epochs = train_incrementally(mlp, X_train_scaled, y_train, max_epochs=mlp.max_iter, time_budget=remaining)
+        print(f"Trained a vocabulary-aligned MLP for {epochs + 1} epochs.")
+    else:
+        mlp = new_mlp()
+        mlp.fit(X_train_scaled, y_train)
     
     # Calculate accuracy
     train_accuracy = mlp.score(X_train_scaled, y_train)
@@ -83,35 +242,63 @@ def train_model(dataset_location):
     print(f"Training accuracy: {train_accuracy:.2f}")
     print(f"Test accuracy: {test_accuracy:.2f}")
 
-    # TODO: Train the model in the full data
-    #   X_full = np.vstack((X_train, X_test))
-    #   y_full = np.hstack((y_train, y_test))
-    #   X_full_scaled = scaler.transform(X_full)
-    #   mlp.fit(X_full_scaled, y_full)
+    if vocabulary is not None:
+        mlp.trained_classes_ = np.unique(y_train)
     num_samples = X.shape[0]
     return mlp, scaler, le_show, num_samples
 
 ## ==================================================================================================
 ## Predictor Process
 ## ==================================================================================================
-def train_and_save_mlp(latest_data_file, restricted_public_folder):
+def sparse_output_layer(coefs, intercepts, classes):
+    """
+    Keep only the output units of `classes`; hidden layers are kept whole.
+    """
+    return coefs[:-1] + [coefs[-1][:, classes]], intercepts[:-1] + [intercepts[-1][classes]]
+
+def train_and_save_mlp(latest_data_file, restricted_public_folder, shared_folder=None, max_epochs=20, time_budget=30.0, parsed_history=None, private_folder=None):
     """
     Train the MLP model and save its weights and biases.
 
+    The upload is a single `netflix_mlp_params.npz` (see `save_mlp_params`) with the number of
+    samples and the version of the global model training started from.
+
+    When the aggregator publishes the TV series vocabulary, the model is trained on vocabulary
+    IDs and only the output units of the shows it was trained on are uploaded, together with
+    their IDs, so that the upload does not grow with the size of the catalog.
+
     Args:
         latest_data_file: Path to the latest data file.
         restricted_public_folder: Path to the restricted public folder.
+        shared_folder: Aggregator folder with the FedAvg model to warm-start from, if any.
+        max_epochs: Epoch budget of a warm-started training.
+        time_budget: Wall-clock budget (seconds) of a warm-started training.
+        parsed_history: The history of `latest_data_file` already parsed with `parse_viewing_history`, if available.
+        private_folder: Where to keep the full local model for recommendations (see `mlp_recommendation`), if any.
     """
+    vocabulary_path = find_vocabulary(shared_folder) if shared_folder else None
+    vocabulary = load_vocabulary(vocabulary_path) if vocabulary_path else None
+
     # Train the MLP model
-    mlp, _, _, num_samples = train_model(latest_data_file)
+    global_model = load_global_mlp_parameters(shared_folder) if shared_folder else None
+    global_parameters = (global_model["coefs"], global_model["intercepts"]) if global_model else None
+    dataset = parsed_history if parsed_history is not None else latest_data_file
+    mlp, scaler, le_show, num_samples = train_model(dataset, global_parameters, max_epochs=max_epochs, time_budget=time_budget, vocabulary=vocabulary)
+    if mlp is None:
+        print("> No MLP parameters uploaded this round.")
+        return
+
+    if private_folder is not None:
+        save_local_model(private_folder, mlp, scaler, le_show)
 
-    # Define paths
-    mlp_weights_file = restricted_public_folder / f"netflix_mlp_weights_{num_samples}.joblib"
-    mlp_bias_file = restricted_public_folder / f"netflix_mlp_bias_{num_samples}.joblib"
+    coefs, intercepts, classes = mlp.coefs_, mlp.intercepts_, None
+    if vocabulary is not None:
+        classes = mlp.trained_classes_
+        coefs, intercepts = sparse_output_layer(coefs, intercepts, classes)
 
     # Save MLP weights and biases
-    joblib.dump(mlp.coefs_, str(mlp_weights_file))
-    joblib.dump(mlp.intercepts_, str(mlp_bias_file))
+    version = global_model["version"] if global_model else 0
+    save_mlp_params(restricted_public_folder / MLP_PARAMS_FILE, coefs, intercepts, num_samples=num_samples, version=version, classes=classes)
 
 ## ==================================================================================================
 ## Inference Process
@@ -0,0 +1,161 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from participant.participant_utils.viewing_history import parse_titles
+from common.mlp_params import save_mlp_params, load_mlp_params, FEDAVG_PARAMS_FILE
+
+LOCAL_PARAMS_FILE = "netflix_mlp_local_params.npz"
+PREPROCESSING_FILE = "netflix_mlp_preprocessing.json"
+
+# path -> (mtime, loaded object)
+_cache = {}
+
+## ==================================================================================================
+## Model Files
+## ==================================================================================================
+
+def save_local_model(private_folder, mlp, scaler, le_show):
+    """
+    Save the full local model and its preprocessing (scaler parameters and show classes),
+    so that recommendations do not need a freshly trained model in memory.
+    """
+    save_mlp_params(os.path.join(str(private_folder), LOCAL_PARAMS_FILE), mlp.coefs_, mlp.intercepts_, dtype="float64")
+    preprocessing = {
+        "mean": scaler.mean_.tolist(),
+        "scale": scaler.scale_.tolist(),
+        "classes": [None if title is None else str(title) for title in le_show.classes_],
+    }
+    with open(os.path.join(str(private_folder), PREPROCESSING_FILE), "w", encoding="utf-8") as f:
+        json.dump(preprocessing, f, ensure_ascii=False)
+
+def load_cached(path, loader):
+    """
+    Load a file with `loader`, reusing the previous result while the file's mtime is unchanged.
+    """
+    mtime = os.path.getmtime(path)
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, loader(path))
+        _cache[path] = cached
+    return cached[1]
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_model(private_folder, shared_folder=None):
+    """
+    Load the most recent MLP (FedAvg or local) whose output layer matches the local show classes.
+
+    Args:
+        private_folder: Folder of the local model and preprocessing (see `save_local_model`).
+        shared_folder: Aggregator folder with the FedAvg model, if any.
+
+    Returns:
+        tuple: (coefs, intercepts, preprocessing), or None if no usable model was found.
+    """
+    preprocessing_path = os.path.join(str(private_folder), PREPROCESSING_FILE)
+    if not os.path.isfile(preprocessing_path):
+        return None
+    preprocessing = load_cached(preprocessing_path, load_json)
+
+    candidates = [os.path.join(str(private_folder), LOCAL_PARAMS_FILE)]
+    if shared_folder:
+        candidates.append(os.path.join(str(shared_folder), FEDAVG_PARAMS_FILE))
+    candidates = sorted((path for path in candidates if os.path.isfile(path)), key=os.path.getmtime, reverse=True)
+
+    num_classes = len(preprocessing["classes"])
+    num_outputs = 1 if num_classes == 2 else num_classes  # binary classifiers have a single output unit
+    for params_path in candidates:
+        params = load_cached(params_path, load_mlp_params)
+        coefs, intercepts = params["coefs"], params["intercepts"]
+        if coefs[0].shape[0] == len(preprocessing["mean"]) and coefs[-1].shape[1] == num_outputs:
+            return coefs, intercepts, preprocessing
+    return None
+
+## ==================================================================================================
+## Batched Inference
+## ==================================================================================================
+
+def forward(coefs, intercepts, X: np.ndarray) -> np.ndarray:
+    """
+    Class probabilities of a ReLU/softmax MLP (the `MLPClassifier` defaults) for a batch of inputs.
+
+    Returns:
+        np.ndarray: Probabilities (n_samples, n_classes).
+    """
+    activations = X
+    for W, b in zip(coefs[:-1], intercepts[:-1]):
+        activations = np.maximum(activations @ W + b, 0)
+    logits = activations @ coefs[-1] + intercepts[-1]
+
+    if logits.shape[1] == 1:  # binary classifier: a single logistic unit
+        positive = 1 / (1 + np.exp(-logits[:, 0]))
+        return np.column_stack((1 - positive, positive))
+    logits -= logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+def build_features(titles, preprocessing: dict, day_of_week: int) -> tuple:
+    """
+    Scaled (show, season, day_of_week) features of a batch of titles.
+
+    Returns:
+        tuple: (X (n_known, 3), known) where `known` marks the titles whose show is a known class.
+    """
+    parsed = parse_titles(titles)
+    class_ids = {title: idx for idx, title in enumerate(preprocessing["classes"]) if title is not None}
+    show_ids = parsed["show"].map(class_ids)
+    known = show_ids.notna().to_numpy()
+
+    X = np.column_stack((
+        show_ids[known].to_numpy(dtype=np.float64),
+        parsed["season"][known].to_numpy(dtype=np.float64),
+        np.full(known.sum(), day_of_week, dtype=np.float64),
+    ))
+    X = (X - np.asarray(preprocessing["mean"])) / np.asarray(preprocessing["scale"])
+    return X, known
+
+def recommend_batch(titles, private_folder, shared_folder=None, k: int = 5, day_of_week: int = None) -> list:
+    """
+    Recommend the top-k next shows for every title of a batch with a single forward pass.
+
+    Args:
+        titles (list[str]): Last watched titles (e.g. every show watched this week).
+        private_folder: Folder of the local model (see `save_local_model`).
+        shared_folder: Aggregator folder with the FedAvg model, if any.
+        k (int): Number of recommendations per title.
+        day_of_week (int, optional): Day of week of the prediction (0 = Monday), today by default.
+
+    Returns:
+        list: For each title, a list of (show, probability) ordered by descending probability,
+        or None if the title's show is unknown to the model (or no model is available).
+    """
+    model = load_model(private_folder, shared_folder)
+    if model is None:
+        return [None] * len(titles)
+    coefs, intercepts, preprocessing = model
+
+    if day_of_week is None:
+        day_of_week = datetime.now().weekday()
+    X, known = build_features(titles, preprocessing, day_of_week)
+    probabilities = forward(coefs, intercepts, X)
+
+    k = min(k, probabilities.shape[1])
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    top_probabilities = np.take_along_axis(probabilities, top, axis=1)
+    order = np.argsort(-top_probabilities, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_probabilities = np.take_along_axis(top_probabilities, order, axis=1)
+
+    classes = preprocessing["classes"]
+    rows = iter(zip(top, top_probabilities))
+    results = []
+    for is_known in known:
+        if not is_known:
+            results.append(None)
+            continue
+        ids, probs = next(rows)
+        results.append([(classes[i], float(p)) for i, p in zip(ids, probs)])
+    return results
@@ -1,5 +1,4 @@
 import os
-import json
 import numpy as np
 import shutil
 import diffprivlib.tools as dp
@@ -10,21 +9,33 @@ from participant.main import setup_environment
 from syftbox.lib import Client
 
 
-from participant.federated_learning.svd_participant_finetuning import participant_fine_tuning
+from participant.federated_learning.svd_participant_finetuning import participant_fine_tuning, participant_fine_tuning_batched
 from participant.federated_learning.svd_server_initialisation import initialize_item_factors
-from participant.federated_learning.svd_server_aggregation import aggregate_item_factors
-from participant.server_utils.data_loading import load_tv_vocabulary, load_imdb_ratings, load_global_item_factors
+from participant.federated_learning.svd_server_aggregation import aggregate_deltas
+from participant.federated_learning.svd_als import solve_item_rows, load_item_statistics
+from participant.federated_learning.svd_recommendation import (
+    build_exclusion_mask,
+    recommend_top_k,
+    published_version,
+    titles_hash,
+    RecommendationCache
+)
+from participant.federated_learning.svd_item_neighbours import NEIGHBOURS_FILE, publish_item_neighbours, load_item_neighbours, similar_items
+from participant.federated_learning.svd_item_shards import publish_item_factor_shards
+from participant.federated_learning.svd_item_patches import publish_global_V_version, sync_global_item_factors
+from participant.federated_learning.svd_item_store import STORE_DIR, ItemFactorStore
+from participant.federated_learning.svd_round_controller import CONTROLLER_FILE, RATINGS_COUNT_FILE, RoundController, relative_delta_norm, count_new_ratings
+from participant.participant_utils.data_loading import load_participant_ratings
+from participant.server_utils.data_loading import load_tv_vocabulary, load_imdb_ratings, load_global_item_factors, normalize_string
+from common.vocabulary import Vocabulary, file_sha256
 
 from dotenv import load_dotenv
 load_dotenv()
 
+RECOMMENDATION_CACHE_TOP_N = 50
 
-def normalize_string(s):
-    """
-    """
-    return s.replace('\u200b', '').lower()
 
-def server_initialization(save_to:str = "mock_dataset_location/tmp_model_parms", tv_series_path="aggregator/data/tv-series_vocabulary.json", imdb_ratings_path="data/imdb_ratings.npy"):
+def server_initialization(save_to:str = "mock_dataset_location/tmp_model_parms", tv_series_path="aggregator/data/tv-series_vocabulary.json", imdb_ratings_path="data/imdb_ratings.npy", dtype=np.float64):
 
     # Step 1: Load vocabulary and IMDB ratings
     tv_vocab = load_tv_vocabulary(tv_series_path)
@@ -35,20 +46,29 @@ def server_initialization(save_to:str = "mock_dataset_location/tmp_model_parms",
     imdb_ratings = {normalize_string(title): float(rating) for title, rating in imdb_data.items() if rating}
 
     # Step 2: Initialize item factors
-    V = initialize_item_factors(tv_vocab, imdb_ratings)
+    V = initialize_item_factors(tv_vocab, imdb_ratings, dtype=dtype)
 
-    # Step 4: Save the initialized model
+    # Step 4: Save the initialized model (participants sync it from the published versions)
     os.makedirs(save_to, exist_ok=True)
-    np.save(os.path.join(save_to, "global_V.npy"), V)
+    ItemFactorStore.create(os.path.join(save_to, STORE_DIR), V, tv_vocab)
+
+    # Step 5: Publish a full snapshot version, the row shards and the item-to-item neighbour table
+    publish_global_V_version(V, save_to)
+    publish_item_factor_shards(V, save_to)
+    publish_item_neighbours(V, save_to)
 
     print("Server initialization complete. Item factors (V) are saved.")
 
-def server_aggregate(updates, weights=None, learning_rate=1.0, epsilon=1.0, clipping_threshold=0.5, save_to="mock_dataset_location/tmp_model_parms"):
+def server_aggregate(updates, weights=None, learning_rate=1.0, epsilon=1.0, clipping_threshold=0.5, save_to="mock_dataset_location/tmp_model_parms", controller=None, validation_errors=None, method="sgd", lambda_reg=0.1):
     """
     Orchestrates the server aggregation process:
     1. Loads current global item factors.
-    2. Calls `aggregate_item_factors` to perform the aggregation.
-    3. Saves the updated global item factors.
+    2. Calls `aggregate_deltas` to aggregate the participants' updates (with method "als",
+       `solve_item_rows` solves the rated rows from their item statistics instead).
+    3. Applies them in place to the changed rows and saves the global item factors (to the
+       store; `global_V.npy` without one).
+    4. Publishes them as a versioned patch of the changed rows, as row shards, and the item-to-item
+       neighbour table built from them.
 
     Args:
         updates (list[dict]): List of delta dictionaries from participants.
@@ -57,76 +77,120 @@ def server_aggregate(updates, weights=None, learning_rate=1.0, epsilon=1.0, clip
         epsilon (float): Privacy budget for differential privacy.
         clipping_threshold (float): Clipping threshold for updates.
         save_to (str): Path to save the updated global item factors.
+        controller (RoundController, optional): If given, sets the learning rate and records the round's progress.
+        validation_errors (list[float], optional): DP-noised validation errors reported by participants.
+        method (str): "sgd" (updates are deltas) or "als" (updates are item statistics, or the
+            paths of their `.npz` files; `weights`, `learning_rate`, `epsilon` and `clipping_threshold` do not apply).
+        lambda_reg (float): L2 regularization per rating of the ALS solve.
     """
+    if method not in ("sgd", "als"):
+        raise ValueError("Invalid method. Use 'sgd' or 'als'.")
     global_V_path = os.path.join(save_to, "global_V.npy")
 
-    # Step 1: Load current global item factors
-    V = load_global_item_factors(global_V_path)
+    # Step 1: Load current global item factors (a view on the growable store when there is one)
+    store_path = os.path.join(save_to, STORE_DIR)
+    store = ItemFactorStore.open(store_path) if os.path.isdir(store_path) else None
+    V = store.factors if store is not None else load_global_item_factors(global_V_path)
 
     # Step 2: Aggregate updates
-    V = aggregate_item_factors(
-        V, updates, weights=weights, learning_rate=learning_rate, epsilon=epsilon, clipping_threshold=clipping_threshold
-    )
+    if method == "als":
+        statistics = [load_item_statistics(update) if isinstance(update, str) else update for update in updates]
+        item_ids, solved_rows = solve_item_rows(V.shape[1], statistics, lambda_reg=lambda_reg)
+        delta_rows = (solved_rows - V[item_ids]).astype(V.dtype)
+    else:
+        if controller is not None:
+            learning_rate = controller.learning_rate
+        aggregated_delta = aggregate_deltas(
+            V, updates, weights=weights, learning_rate=learning_rate, epsilon=epsilon, clipping_threshold=clipping_threshold
+        )
+        item_ids = np.array([item_id for item_id, delta in aggregated_delta.items() if np.any(delta)], dtype=np.int64)
+        delta_rows = np.array([aggregated_delta[item_id] for item_id in item_ids], dtype=V.dtype).reshape(len(item_ids), V.shape[1])
+    previous_norm = float(np.sqrt(np.einsum("ij,ij->", V, V)))
+
+    # Step 3: Apply the deltas to the changed rows only and save. Participants catch up through
+    # the published patches, so the full matrix is only rewritten for the layout without a store.
+    V[item_ids] += delta_rows
+    if store is not None:
+        store.flush()
+    else:
+        os.makedirs(os.path.dirname(global_V_path), exist_ok=True)
+        np.save(global_V_path, V)
+    if controller is not None:
+        controller.record_round(relative_delta_norm(delta_rows, previous_norm), validation_errors)
 
-    # Step 3: Save the updated global item factors
-    os.makedirs(os.path.dirname(global_V_path), exist_ok=True)
-    np.save(global_V_path, V)
+    # Step 4: Publish the changed rows as a new version, refresh the row shards and the item-to-item neighbour table
+    publish_global_V_version(V, save_to, item_ids=item_ids)
+    publish_item_factor_shards(V, save_to)
+    publish_item_neighbours(V, save_to)
 
     print("Server aggregation complete. Global item factors (V) updated.")
 
-def local_recommendation(user_id, tv_vocab, user_ratings, exclude_watched=True):
+def local_recommendation(user_id, tv_vocab, user_ratings, exclude_watched=True, k=6, cache=None):
     # Assume we have user_ratings, global_V, global_U, tv_vocab, etc. from previous code
 
     # Load model parameters
     global_path = "mock_dataset_location/tmp_model_parms"
     local_path = os.path.join("mock_dataset_location/tmp_model_parms", user_id)
-    global_V_path = os.path.join(global_path, "global_V.npy")
     user_U_path = os.path.join(local_path, f"{user_id}_U.npy")
 
-    user_U = np.load(user_U_path)
-    global_V = np.load(global_V_path)
-
     print("Selecting recommendations based on most recent shows watched...")
     recent_week = 12
     recent_items = [title for (title, week, n_watched, rating) in user_ratings if week == recent_week]
-    recent_item_ids = [tv_vocab[title] for title in recent_items if title in tv_vocab]
     print("For week (of all years)", recent_week, "watched n_shows=:", len(recent_items))
 
-    alpha = 0.7  # Weight for long-term preferences
-    beta = 0.3   # Weight for recent preferences
-
-    if recent_item_ids:
-        U_global_activity = sum(global_V[item_id] for item_id in recent_item_ids) / len(recent_item_ids)
-        U_recent = alpha * user_U + beta * U_global_activity
-    else:
-        U_recent = user_U  # fallback
-
-    all_items = list(tv_vocab.keys())
-    watched_titles = set(normalize_string(t) for (t, _, _, _) in user_ratings)
-
     # Optionally, exclude already watched items
-    if exclude_watched:
-        candidate_items = [title for title in all_items if normalize_string(title) not in watched_titles]
-    else:
-        # Or consider all items
-        candidate_items = all_items
-
-
-    # tv_vocab = {normalize_string(title): item_id for title, item_id in tv_vocab.items()}
-
-    predictions = []
-    for title in candidate_items:
-        item_id = tv_vocab[title]
-        pred_rating = U_recent.dot(global_V[item_id])
-        predictions.append((title, pred_rating))
-
-    predictions.sort(key=lambda x: x[1], reverse=True)
-    top_6 = predictions[:6]
+    watched_titles = [t for (t, _, _, _) in user_ratings] if exclude_watched else []
+
+    # Serve from the cache (if given) unless the published global model, the user vector or the
+    # user's activity changed; it is checked before anything is synced or loaded
+    cache_key = {
+        "model_version": published_version(global_path),
+        "user_hash": file_sha256(user_U_path),
+        "exclusion_hash": titles_hash(watched_titles),
+        "recent_hash": titles_hash(recent_items),
+    }
+    top_6 = cache.get(user_id, cache_key, k) if cache is not None else None
+    vocabulary = tv_vocab if isinstance(tv_vocab, Vocabulary) else Vocabulary(tv_vocab)  # pass a Vocabulary to index it only once
+
+    if top_6 is None:
+        user_U = np.load(user_U_path)
+
+        # Catch up with the published versions of the global item factors: only the changed rows are read
+        global_V, sync_stats = sync_global_item_factors(global_path, local_path, mmap=True)
+        print(f"Global V at version {sync_stats['version']} ({sync_stats['bytes_read']} bytes read).")
+
+        recent_item_ids = [tv_vocab[title] for title in recent_items if title in tv_vocab]
+
+        alpha = 0.7  # Weight for long-term preferences
+        beta = 0.3   # Weight for recent preferences
+
+        if recent_item_ids:
+            U_global_activity = global_V[recent_item_ids].mean(axis=0)
+            U_recent = alpha * user_U + beta * U_global_activity
+        else:
+            U_recent = user_U  # fallback
+
+        exclude_mask = build_exclusion_mask(vocabulary, len(global_V), watched_titles)
+
+        top_n = max(k, RECOMMENDATION_CACHE_TOP_N)
+        top_ids, top_scores = recommend_top_k(U_recent, global_V, k=top_n, exclude_mask=exclude_mask)
+        top_n_items = [(vocabulary.title(int(item_id)), score) for item_id, score in zip(top_ids, top_scores)]
+        if cache is not None:
+            cache.put(user_id, cache_key, top_n_items, top_n)
+        top_6 = top_n_items[:k]
 
     print("Recommended based on most recently watched:")
     for i, (show, score) in enumerate(top_6):
         print(f"\t{i+1} => {show}: {score:.4f}")
 
+    # "More like this": nearest items of the top recommendation, from the published neighbour table
+    if top_6 and os.path.isfile(os.path.join(global_path, NEIGHBOURS_FILE)):
+        top_show = top_6[0][0]
+        neighbours = load_item_neighbours(global_path)
+        print(f"More like '{top_show}':")
+        for item_id, similarity in similar_items(neighbours, vocabulary.get(top_show, -1), k=3):
+            print(f"\t{vocabulary.title(item_id)}: {similarity:.3f}")
+
 
     # Debug for development...
     # # Analytics for the shows that are rated by user
@@ -179,12 +243,13 @@ def run_process():
 
     # Server initialisation
     server_initialization()
-    backup_global_v = np.load("mock_dataset_location/tmp_model_parms/global_V.npy") # For analytics
+    controller = RoundController(os.path.join(fldr_base, CONTROLLER_FILE))
+    controller.reset()
+    recommendation_cache = RecommendationCache(fldr_base)
+    backup_global_v, _ = sync_global_item_factors(fldr_base, os.path.join(fldr_base, test_user)) # For analytics
 
-    delta_V = {}
-    for user_id in user_ids:
-        # Fine-tuning of the item embeddings with user data
-        delta_V[user_id] = participant_fine_tuning(user_id, private_folders[user_id], epsilon=1, noise_type="gaussian", clipping_threshold=None, plot=False) #0.36
+    # Fine-tuning of the item embeddings with the data of all local profiles at once
+    delta_V = participant_fine_tuning_batched(user_ids, private_folders, epsilon=1, noise_type="gaussian", clipping_threshold=None) #0.36
 
     # # Dictionary to store all mocked user IDs and map them to original user IDs
     # mocked_to_original_mapping = {}
@@ -218,8 +283,8 @@ def run_process():
     # Step 1: Local Recommendation Computation
     ########################################
 
-    with open("aggregator/data/tv-series_vocabulary.json", "r") as f:
-        tv_vocab = json.load(f)
+    tv_vocab = dict(load_tv_vocabulary("aggregator/data/tv-series_vocabulary.json"))  # a copy: new items are added below
+    vocabulary = Vocabulary(tv_vocab)  # indexed once, for every recommendation until the vocabulary changes
 
     # Example user data
     my_activity_path = os.path.join(restricted_public_folders[test_user], 'netflix_aggregated.npy')
@@ -232,21 +297,25 @@ def run_process():
     my_activity_formatted[:, 3] = my_activity[:, 3].astype(float)  # Ratings as float
 
     print("Vanilla Recommendations (IMDB)...")
-    top_6 = local_recommendation(test_user, tv_vocab, user_ratings=my_activity_formatted)
+    top_6 = local_recommendation(test_user, vocabulary, user_ratings=my_activity_formatted, cache=recommendation_cache)
 
     print("Updating Global Model with user deltas...")
     # Server aggregation
     # server_aggregate([delta_V[user_ids[0]], delta_V[user_ids[1]]])
     delta_V_list = list(delta_V.values())
-    server_aggregate(delta_V_list, epsilon=None, clipping_threshold=None)
+    new_ratings = sum(
+        count_new_ratings(len(load_participant_ratings(private_folders[user_id])), os.path.join(fldr_base, user_id, RATINGS_COUNT_FILE))
+        for user_id in user_ids
+    )
+    if controller.should_run_round(new_ratings=new_ratings):
+        server_aggregate(delta_V_list, epsilon=None, clipping_threshold=None, controller=controller)
 
     print("Federated Recommendations (IMDB)...")
-    top_6 = local_recommendation(test_user, tv_vocab, user_ratings=my_activity_formatted)
+    top_6 = local_recommendation(test_user, vocabulary, user_ratings=my_activity_formatted, cache=recommendation_cache)
 
 
     # Logs
-    global_V_path = os.path.join("mock_dataset_location/tmp_model_parms", "global_V.npy")
-    global_V = np.load(global_V_path)
+    global_V, _ = sync_global_item_factors(fldr_base, os.path.join(fldr_base, test_user))
     print("Global V shape:", global_V.shape)
 
     top_show = top_6[0][0]
@@ -338,54 +407,51 @@ def run_process():
     # Load model parameters
     load_from = "mock_dataset_location/tmp_model_parms"
     local_U_path = os.path.join(load_from, test_user, f"{test_user}_U.npy")
-    global_V_path = os.path.join(load_from, "global_V.npy")
 
     local_U = np.load(local_U_path)
-    global_V = np.load(global_V_path)
+    global_V, _ = sync_global_item_factors(load_from, os.path.join(load_from, test_user))
 
     # Identify item_id for the newly chosen item
     # If user_new_choice not in tv_vocab, add it dynamically:
     if user_new_choice not in tv_vocab:
-        print(f"Item '{user_new_choice}' not in vocabulary. Adding it now.")
+        print(f"Item '{user_new_choice}' not in vocabulary. Proposing it to the server.")
 
-        # Find a new item_id for this show
-        new_item_id = max(tv_vocab.values()) + 1
-        tv_vocab[user_new_choice] = new_item_id
+        # The item ID is assigned by the server when it merges the proposal; until then the new
+        # item is identified by its title.
+        new_item_id = None
 
-        # Initialize item factors randomly
+        # Initialize item factors randomly. The new row is kept on its own rather than appended
+        # to global_V, which would copy the whole matrix; the server adds it to its store.
         k = local_U.shape[0]  # latent dimension (assuming global_U is [k])
-        new_item_factors = np.random.normal(scale=0.01, size=(k,))
-        # Expand global_V to accommodate this new item
-        # Assuming global_V is shape [num_items, k]
-        # We'll need to append a new row
-        global_V = np.vstack([global_V, new_item_factors[np.newaxis, :]])
-        
-        print(f"Assigned item_id={new_item_id} for new show '{user_new_choice}'")
+        item_factors = np.random.normal(scale=0.01, size=(k,))
+        new_item_proposal = {user_new_choice: item_factors.copy()}
     else:
         new_item_id = tv_vocab[user_new_choice]
+        item_factors = global_V[new_item_id].copy()
+        new_item_proposal = {}
 
-    # Now we have new_item_id for the chosen show.
+    # Now we have the factors of the chosen show.
     # Perform a mini step of gradient descent to incorporate the new rating
     alpha = 0.01
     lambda_reg = 0.1
 
     # Current prediction before update
-    pred_before = local_U.dot(global_V[new_item_id])
+    pred_before = local_U.dot(item_factors)
     error = new_rating - pred_before
 
     # Compute gradients
-    U_u_grad = error * global_V[new_item_id] - lambda_reg * local_U
-    V_i_grad = error * local_U - lambda_reg * global_V[new_item_id]
+    U_u_grad = error * item_factors - lambda_reg * local_U
+    V_i_grad = error * local_U - lambda_reg * item_factors
 
     # Store the old item factors to compute delta
-    old_V_item = global_V[new_item_id].copy()
+    old_V_item = item_factors.copy()
 
     # Update locally
     local_U += alpha * U_u_grad
-    global_V[new_item_id] += alpha * V_i_grad
+    item_factors += alpha * V_i_grad
 
     # Compute the delta for the item factor
-    delta_V = global_V[new_item_id] - old_V_item
+    delta_V = item_factors - old_V_item
 
     ########################################
     # Step 4: Send Updates (Delta) Back to Server
@@ -395,7 +461,7 @@ def run_process():
     # we might send gradient updates or encrypted parameters.
     # For demonstration, let's just print what would be sent.
     print("\nSending updates back to the server:")
-    print(f"Item factor delta for item_id {new_item_id} ({user_new_choice}): {delta_V}")
+    print(f"Item factor delta for {'new item' if new_item_id is None else f'item_id {new_item_id}'} ({user_new_choice}): {delta_V}")
 
     # Server-side pseudo-code to handle updates:
     # In reality, the server would:
@@ -407,24 +473,28 @@ def run_process():
     os.makedirs(save_to, exist_ok=True)
 
     # Mock server load:
-    server_global_V = np.load(os.path.join(save_to, "global_V.npy"))
+    store = ItemFactorStore.open(os.path.join(save_to, STORE_DIR))
     server_local_U = np.load(os.path.join(save_to, test_user, f"{test_user}_U.npy"))
-
-    # If we added a new item not previously in server_global_V, we need to align the dimensions.
-    # Assume server_global_V shape: [N_items, k]
-    # If new_item_id >= server_global_V.shape[0], we must expand server_global_V as well.
-    if new_item_id >= server_global_V.shape[0]:
-        # Expand server_global_V to accommodate new_item_id
-        rows_to_add = new_item_id - server_global_V.shape[0] + 1
-        additional_rows = np.random.normal(scale=0.01, size=(rows_to_add, server_global_V.shape[1]))
-        server_global_V = np.vstack([server_global_V, additional_rows])
-
-    # Apply delta:
-    server_global_V[new_item_id] += delta_V
-
-    # Save updated global parameters:
+    num_items_before = len(store)
+
+    # New items proposed this round (by any number of participants) are merged in one batch;
+    # the store grows geometrically, so adding a title never copies the whole matrix.
+    server_item_id = store.merge_proposals([new_item_proposal]).get(user_new_choice, new_item_id)
+    if new_item_id is None:
+        # The participant adopts the ID assigned by the server
+        tv_vocab[user_new_choice] = new_item_id = server_item_id
+        vocabulary = Vocabulary(tv_vocab)
+        print(f"Server assigned item_id={server_item_id} for new show '{user_new_choice}'")
+
+    # Apply delta (in place, on the store's rows):
+    store.factors[server_item_id] += delta_V
+    store.flush()
+
+    # Save updated global parameters: only the updated and the appended rows are published
     np.save(os.path.join(save_to, test_user, f"{test_user}_U.npy"), server_local_U)
-    np.save(os.path.join(save_to, "global_V.npy"), server_global_V)
+    changed_item_ids = np.union1d([server_item_id], np.arange(num_items_before, len(store)))
+    publish_global_V_version(store.factors, save_to, item_ids=changed_item_ids)
+    publish_item_factor_shards(store.factors, save_to)
 
     print("\nServer: Applied client delta updates to global parameters and re-saved.")
 
@@ -433,7 +503,7 @@ def run_process():
 
     ### Re-run local recommendation to see if the new item is now recommended
     print("Recalculating recommendations after user interaction and model update to verify consistency...")
-    local_recommendation(test_user, tv_vocab, user_ratings=my_activity_formatted[:-1])
+    local_recommendation(test_user, vocabulary, user_ratings=my_activity_formatted[:-1], cache=recommendation_cache)
 
 
 if __name__ == "__main__":
@@ -1,31 +1,28 @@
 import os
 import re
-import json
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from rapidfuzz import process
+from participant.participant_utils.viewing_history import parse_viewing_history, is_parsed_history
+from common.vocabulary import load_vocabulary, find_vocabulary, Vocabulary
 
 class SequenceData:
     """
     This class creates, from the original data, an ordered dataframe from oldest to newest,
     with the attributes First_Seen (date), a number of episodes seen.
+
+    `dataset` is the raw [Title, Date] array or a history parsed with `parse_viewing_history`.
     """
     def __init__(self, dataset: np.ndarray):
         self.dataset = dataset
         self.aggregated_data = self.process_dataset()
 
     def extract_features(self, df):
-        # Extract show name and season from title
-        df['show'] = df['Title'].apply(lambda x: x.split(':')[0] if ':' in x else x)
-        df['season'] = df['Title'].apply(lambda x: 
-            int(re.search(r'Season (\d+)', x).group(1)) if re.search(r'Season (\d+)', x) else 0)
-        
-        # Convert date strings to datetime objects
-        df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
-        
-        # Extract temporal features
-        df['day_of_week'] = df['Date'].dt.dayofweek
+        # Extract show name, season and temporal features (see `parse_viewing_history`)
+        parsed = parse_viewing_history(df)
+        for column in ["show", "season", "Date", "day_of_week"]:
+            df[column] = parsed[column].to_numpy()
         # df['hour'] = df['Date'].dt.hour
     
         return df
@@ -35,8 +32,10 @@ class SequenceData:
         This method get the original data and organizes sequentially by oldest to the newest seen TV Series.
         Aggregating the number of episodes seen (Total_Views) and the stating date (First_Seen).
         """
-        df = pd.DataFrame(self.dataset, columns=["Title", "Date"])
-        df = self.extract_features(df).copy()
+        if is_parsed_history(self.dataset):
+            df = self.dataset
+        else:
+            df = self.extract_features(pd.DataFrame(self.dataset, columns=["Title", "Date"]))
         df_aggregated = (
             df.groupby("show")
             .agg(Total_Views=("Date", "size"), First_Seen=("Date", "min"))
@@ -58,7 +57,8 @@ def match_title(title, vocabulary: dict, threshold=80):
         return vocabulary[title]
     
     # Fuzzy match
-    vocab_keys = list(vocabulary.keys())  # Convert keys to list for fuzzy matching
+    # Convert keys to list for fuzzy matching (a `Vocabulary` keeps one)
+    vocab_keys = vocabulary.title_list if isinstance(vocabulary, Vocabulary) else list(vocabulary.keys())
     match_result = process.extractOne(title, vocab_keys)
     
     # Extract only the best match and score
@@ -72,18 +72,18 @@ def match_title(title, vocabulary: dict, threshold=80):
 
 def create_view_counts_vector(datasite_path, aggregated_data: pd.DataFrame, parent_path: Path) -> np.ndarray:
     # TODO: load vocabulary from aggregator (LATER BE UPDATED TO RETRIEVE FROM AGGREGATOR'S PUBLIC SITE)
+    shared_folder = os.path.join(str(parent_path), datasite_path, "api_data", "netflix_data")
+    # A binary vocabulary stays memory-mapped: exact titles are binary-searched, and the titles
+    # are only decoded for fuzzy matching when some show is not found as is
     try:
-        shared_file = os.path.join(str(parent_path), datasite_path, "api_data", "netflix_data", "tv-series_vocabulary.json")
-        with open(shared_file, "r", encoding="utf-8") as file:
-            vocabulary = json.load(file)
-    except:
+        vocabulary = load_vocabulary(find_vocabulary(shared_folder, fallback="./aggregator/data/tv-series_vocabulary.json"))
+    except (OSError, ValueError):
         # TODO: to remove once available in the Aggregator
-        with open("./aggregator/data/tv-series_vocabulary.json", "r", encoding="utf-8") as file:
-            vocabulary = json.load(file)
+        vocabulary = load_vocabulary("./aggregator/data/tv-series_vocabulary.json")
 
     aggregated_data["ID"] = aggregated_data["show"].apply(lambda x: match_title(x, vocabulary))
-    
-    vector_size = len(vocabulary) 
+    vector_size = len(vocabulary)
+
     sparse_vector = np.zeros(vector_size, dtype=int)
 
     for _, row in aggregated_data.iterrows():
@@ -0,0 +1,112 @@
+import numpy as np
+
+ENCODINGS = ("float64", "float32", "float16", "int8")
+
+## ==================================================================================================
+## Participant - Encoding
+## ==================================================================================================
+
+def stochastic_quantize(rows: np.ndarray, rng: np.random.Generator):
+    """
+    Quantize rows to int8 with one scale per row and unbiased stochastic rounding.
+
+    Returns:
+        tuple: (values, scales) with values (n, k) int8 and scales (n,) float32.
+    """
+    scales = (np.abs(rows).max(axis=1) / 127.0).astype(np.float32)
+    safe_scales = np.where(scales > 0, scales, 1.0)[:, np.newaxis]
+    values = np.floor(rows / safe_scales + rng.random(rows.shape))
+    return np.clip(values, -127, 127).astype(np.int8), scales
+
+def encode_deltas(delta_V: dict, encoding: str = "float32", top_k: int = None, residual: dict = None, random_seed: int = None):
+    """
+    Encode a participant's item deltas for upload.
+
+    Rows are stored as one array of item IDs and one array of values in the chosen encoding:
+    "float64", "float32", "float16", or "int8" (stochastic quantization with per-row scales).
+    With `top_k`, only the k rows with the largest norm are sent. What is not sent, including
+    the rounding error of the quantization, is returned as a residual to keep locally and pass
+    back on the next round (error feedback), so it is delayed rather than lost.
+
+    Args:
+        delta_V (dict): Item ID -> delta vector.
+        encoding (str): Value encoding, one of ENCODINGS.
+        top_k (int, optional): Maximum number of rows sent.
+        residual (dict, optional): Residual returned by the previous call.
+        random_seed (int, optional): Seed of the stochastic rounding.
+
+    Returns:
+        tuple: (payload, residual) where payload is a dict of arrays (see `decode_deltas`).
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Invalid encoding '{encoding}'. Use one of {', '.join(ENCODINGS)}.")
+
+    residual = residual or {}
+    item_ids = np.array(sorted(set(delta_V) | set(residual)), dtype=np.int64)
+    latent_dim = len(next(iter(delta_V.values()), next(iter(residual.values()), [])))
+    rows = np.zeros((len(item_ids), latent_dim))
+    for row, item_id in enumerate(item_ids):
+        if item_id in delta_V:
+            rows[row] += delta_V[item_id]
+        if item_id in residual:
+            rows[row] += residual[item_id]
+
+    sent = np.arange(len(item_ids))
+    if top_k is not None and top_k < len(item_ids):
+        sent = np.sort(np.argpartition(-np.linalg.norm(rows, axis=1), top_k - 1)[:top_k])
+
+    payload = {"encoding": np.array(encoding), "item_ids": item_ids[sent].astype(np.int32), "latent_dim": np.array(latent_dim)}
+    if encoding == "int8":
+        payload["values"], payload["scales"] = stochastic_quantize(rows[sent], np.random.default_rng(random_seed))
+    else:
+        payload["values"] = rows[sent].astype(encoding)
+
+    transmitted = np.zeros_like(rows)
+    transmitted[sent] = decode_rows(payload)
+    errors = rows - transmitted
+    new_residual = {int(item_id): error for item_id, error in zip(item_ids, errors) if np.any(error)}
+    return payload, new_residual
+
+## ==================================================================================================
+## Aggregator - Decoding
+## ==================================================================================================
+
+def is_encoded(update) -> bool:
+    """
+    Whether an update is an encoded payload rather than a plain {item_id: delta} dict.
+    """
+    return isinstance(update, dict) and "encoding" in update and "values" in update
+
+def decode_rows(payload: dict) -> np.ndarray:
+    values = np.asarray(payload["values"])
+    if str(payload["encoding"]) == "int8":
+        return values.astype(np.float64) * np.asarray(payload["scales"], dtype=np.float64)[:, np.newaxis]
+    return values.astype(np.float64)
+
+def decode_deltas(payload: dict) -> dict:
+    """
+    Decode an encoded payload back into an {item_id: float64 delta} dict.
+    """
+    rows = decode_rows(payload)
+    return {int(item_id): row for item_id, row in zip(payload["item_ids"], rows)}
+
+def payload_nbytes(payload: dict) -> int:
+    """
+    Size of the arrays of an encoded payload, i.e. the upload size without container overhead.
+    """
+    return sum(np.asarray(value).nbytes for key, value in payload.items() if key != "encoding")
+
+def save_encoded_deltas(path: str, payload: dict):
+    """
+    Save an encoded payload as an uncompressed, pickle-free `.npz` file.
+    """
+    np.savez(path, **payload)
+
+def load_deltas(path: str) -> dict:
+    """
+    Load a participant's deltas, whether uploaded encoded (`.npz`) or as a pickled dict (`.npy`).
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return decode_deltas({key: data[key] for key in data.files})
+    return np.load(path, allow_pickle=True).item()
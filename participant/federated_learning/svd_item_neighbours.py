@@ -0,0 +1,258 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# One row per item: the IDs of its nearest items (-1 when there are fewer candidates) and their cosine similarity
+NEIGHBOURS_DTYPE = np.dtype([("id", np.int32), ("score", np.float16)])
+NEIGHBOURS_FILE = "global_V_neighbours.npy"
+NEIGHBOURS_META_FILE = "global_V_neighbours.json"
+
+## ==================================================================================================
+## Server - Neighbour Table Construction
+## ==================================================================================================
+
+def normalize_rows(V: np.ndarray) -> np.ndarray:
+    """
+    Normalize rows to unit length as float32, so that dot products are cosine similarities.
+    Zero rows (items without factors) are left as zeros.
+    """
+    V = np.asarray(V, dtype=np.float32)
+    norms = np.linalg.norm(V, axis=1, keepdims=True)
+    return np.divide(V, norms, out=np.zeros_like(V), where=(norms != 0))
+
+def merge_top_n(best_ids, best_scores, candidate_ids, candidate_scores, top_n):
+    """
+    Merge a block of candidates into the running top-n of each query row.
+
+    Args:
+        best_ids (np.ndarray): Current top-n IDs, shape (n_queries, top_n).
+        best_scores (np.ndarray): Current top-n scores, shape (n_queries, top_n).
+        candidate_ids (np.ndarray): Candidate IDs, shape (n_candidates,) shared by all queries.
+        candidate_scores (np.ndarray): Candidate scores, shape (n_queries, n_candidates).
+        top_n (int): Number of neighbours to keep.
+
+    Returns:
+        tuple: Updated (best_ids, best_scores), unordered within each row.
+    """
+    ids = np.concatenate([best_ids, np.broadcast_to(candidate_ids, candidate_scores.shape)], axis=1)
+    scores = np.concatenate([best_scores, candidate_scores], axis=1)
+    keep = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    return np.take_along_axis(ids, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+
+def check_top_n(top_n: int):
+    if top_n <= 0:
+        raise ValueError(f"top_n must be positive, got {top_n}.")
+
+def empty_top_n(n_queries: int, top_n: int):
+    """
+    Running top-n buffers filled with placeholders that any real candidate replaces.
+    """
+    return np.full((n_queries, top_n), -1, dtype=np.int64), np.full((n_queries, top_n), -np.inf, dtype=np.float32)
+
+def pack_neighbours(best_ids: np.ndarray, best_scores: np.ndarray) -> np.ndarray:
+    """
+    Sort each row by descending similarity and pack IDs and scores into the published table format.
+    """
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    ids = np.take_along_axis(best_ids, order, axis=1)
+    scores = np.take_along_axis(best_scores, order, axis=1)
+
+    missing = ~np.isfinite(scores)
+    table = np.empty(ids.shape, dtype=NEIGHBOURS_DTYPE)
+    table["id"] = np.where(missing, -1, ids)
+    table["score"] = np.where(missing, np.nan, scores)
+    return table
+
+def build_item_neighbours(V: np.ndarray, top_n: int = 20, block_size: int = 2048) -> np.ndarray:
+    """
+    Build the exact top-n cosine neighbour table of every item.
+
+    Similarities are computed in (block_size x block_size) tiles and merged into a running
+    top-n, so memory stays bounded by O(block_size * (block_size + top_n)) regardless of the
+    catalog size.
+
+    Args:
+        V (np.ndarray): Item factors matrix (num_items, k).
+        top_n (int): Number of neighbours per item.
+        block_size (int): Number of rows per tile.
+
+    Returns:
+        np.ndarray: Neighbour table of shape (num_items, top_n) with NEIGHBOURS_DTYPE.
+
+    Raises:
+        ValueError: If `top_n` is not positive.
+    """
+    check_top_n(top_n)
+    Vn = normalize_rows(V)
+    num_items = len(Vn)
+    valid = Vn.any(axis=1)
+    table = np.empty((num_items, top_n), dtype=NEIGHBOURS_DTYPE)
+
+    for q_start in range(0, num_items, block_size):
+        q_stop = min(q_start + block_size, num_items)
+        best_ids, best_scores = empty_top_n(q_stop - q_start, top_n)
+
+        for c_start in range(0, num_items, block_size):
+            c_stop = min(c_start + block_size, num_items)
+            scores = Vn[q_start:q_stop] @ Vn[c_start:c_stop].T
+            scores[:, ~valid[c_start:c_stop]] = -np.inf
+            if q_start == c_start:  # an item is not its own neighbour
+                np.fill_diagonal(scores, -np.inf)
+            best_ids, best_scores = merge_top_n(best_ids, best_scores, np.arange(c_start, c_stop), scores, top_n)
+
+        best_scores[~valid[q_start:q_stop]] = -np.inf
+        table[q_start:q_stop] = pack_neighbours(best_ids, best_scores)
+
+    return table
+
+def assign_to_lists(Vn: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    """
+    Assign every (normalized) item to its most similar centroid, in blocks.
+    """
+    assignments = np.empty(len(Vn), dtype=np.int64)
+    for start in range(0, len(Vn), block_size):
+        assignments[start:start + block_size] = np.argmax(Vn[start:start + block_size] @ centroids.T, axis=1)
+    return assignments
+
+def build_item_neighbours_approx(V: np.ndarray, top_n: int = 20, n_lists: int = None, n_probe: int = 8, iterations: int = 5, block_size: int = 2048, random_seed: int = 42) -> np.ndarray:
+    """
+    Build an approximate top-n cosine neighbour table with an IVF (inverted file) index.
+
+    Items are clustered on the unit sphere into `n_lists` lists with a few spherical k-means
+    iterations. The neighbours of an item are then searched only among the members of the
+    `n_probe` lists whose centroids are closest to the item's own list, which keeps the cost
+    close to O(num_items * n_probe * num_items / n_lists) instead of O(num_items^2).
+
+    Args:
+        V (np.ndarray): Item factors matrix (num_items, k).
+        top_n (int): Number of neighbours per item.
+        n_lists (int, optional): Number of inverted lists. Defaults to sqrt(num_items).
+        n_probe (int): Number of lists searched per item.
+        iterations (int): Number of k-means iterations.
+        block_size (int): Maximum number of query items scored at once.
+        random_seed (int): Seed for the centroid initialization.
+
+    Returns:
+        np.ndarray: Neighbour table of shape (num_items, top_n) with NEIGHBOURS_DTYPE.
+
+    Raises:
+        ValueError: If `top_n` is not positive.
+    """
+    check_top_n(top_n)
+    rng = np.random.default_rng(random_seed)
+    Vn = normalize_rows(V)
+    num_items = len(Vn)
+    valid = Vn.any(axis=1)
+    valid_ids = np.flatnonzero(valid)
+
+    table = np.empty((num_items, top_n), dtype=NEIGHBOURS_DTYPE)
+    table["id"] = -1
+    table["score"] = np.nan
+    if len(valid_ids) == 0:
+        return table
+
+    n_lists = min(n_lists or max(1, int(np.sqrt(len(valid_ids)))), len(valid_ids))
+    n_probe = min(n_probe, n_lists)
+
+    # Spherical k-means over the valid items
+    centroids = Vn[rng.choice(valid_ids, size=n_lists, replace=False)]
+    for _ in range(iterations):
+        assignments = assign_to_lists(Vn[valid_ids], centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, Vn[valid_ids])
+        non_empty = sums.any(axis=1)
+        centroids[non_empty] = normalize_rows(sums[non_empty])
+    assignments = assign_to_lists(Vn[valid_ids], centroids)
+
+    order = np.argsort(assignments, kind="stable")
+    members = np.split(valid_ids[order], np.cumsum(np.bincount(assignments, minlength=n_lists))[:-1])
+    probes = np.argsort(-(centroids @ centroids.T), axis=1)[:, :n_probe]
+
+    for list_id in range(n_lists):
+        if len(members[list_id]) == 0:
+            continue
+        candidates = np.concatenate([members[p] for p in probes[list_id]])
+
+        for start in range(0, len(members[list_id]), block_size):
+            queries = members[list_id][start:start + block_size]
+            scores = Vn[queries] @ Vn[candidates].T
+            scores[queries[:, np.newaxis] == candidates[np.newaxis, :]] = -np.inf
+            best_ids, best_scores = merge_top_n(*empty_top_n(len(queries), top_n), candidates, scores, top_n)
+            table[queries] = pack_neighbours(best_ids, best_scores)
+
+    return table
+
+def factors_digest(V: np.ndarray) -> str:
+    """
+    SHA-1 of the item factors' dtype, shape and values, hashed in row blocks (no full copy).
+    """
+    digest = hashlib.sha1(f"{V.dtype.str}{V.shape}".encode("utf-8"))
+    for start in range(0, len(V), 8192):
+        digest.update(np.ascontiguousarray(V[start:start + 8192]).tobytes())
+    return digest.hexdigest()
+
+def publish_item_neighbours(V: np.ndarray, save_to: str, top_n: int = 20, approx_threshold: int = 20_000) -> str:
+    """
+    Build the neighbour table of the global item factors and publish it next to `global_V.npy`.
+
+    The exact blocked search is used up to `approx_threshold` items and the IVF approximate
+    index above it. The table is only rebuilt when the factors (or `top_n`) changed since it
+    was last published, which a hash of V (see `factors_digest`) tells at O(n) cost.
+
+    Returns:
+        str: Path of the published table.
+    """
+    check_top_n(top_n)
+    os.makedirs(save_to, exist_ok=True)
+    path = os.path.join(save_to, NEIGHBOURS_FILE)
+    meta_path = os.path.join(save_to, NEIGHBOURS_META_FILE)
+    meta = {"sha1": factors_digest(V), "top_n": top_n}
+    try:
+        with open(meta_path, "r") as f:
+            if json.load(f) == meta and os.path.isfile(path):
+                print("Item neighbour table up to date.")
+                return path
+    except (OSError, ValueError):
+        pass  # no usable previous build
+
+    if len(V) > approx_threshold:
+        table = build_item_neighbours_approx(V, top_n=top_n)
+    else:
+        table = build_item_neighbours(V, top_n=top_n)
+
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, table)
+    os.replace(path + ".tmp", path)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return path
+
+## ==================================================================================================
+## Participant - "More Like This" Lookups
+## ==================================================================================================
+
+def load_item_neighbours(save_path: str) -> np.ndarray:
+    """
+    Memory-map the published neighbour table; only the rows that are looked up are read.
+    """
+    return np.load(os.path.join(save_path, NEIGHBOURS_FILE), mmap_mode="r")
+
+def similar_items(neighbours: np.ndarray, item_id: int, k: int = None) -> list:
+    """
+    Return the most similar items to `item_id` as a list of (item_id, similarity). Items newer
+    than the table have no neighbours yet.
+
+    Args:
+        neighbours (np.ndarray): Neighbour table (see `load_item_neighbours`).
+        item_id (int): Item to look up.
+        k (int, optional): Maximum number of neighbours to return.
+
+    Returns:
+        list: (item_id, similarity) pairs ordered by descending similarity.
+    """
+    if not 0 <= item_id < len(neighbours) or (k is not None and k <= 0):
+        return []
+    row = neighbours[item_id][:k]
+    return [(int(i), float(s)) for i, s in zip(row["id"], row["score"]) if i >= 0]
@@ -0,0 +1,206 @@
+import os
+import json
+import numpy as np
+
+PATCHES_DIR = "global_V_patches"
+VERSIONS_FILE = "versions.json"
+LOCAL_VERSION_FILE = "global_V.version.json"
+
+## ==================================================================================================
+## Server - Versioned Publication
+## ==================================================================================================
+
+def load_versions(save_path: str):
+    """
+    Load the version index of the published global item factors, or None if nothing was published.
+    """
+    versions_path = os.path.join(save_path, PATCHES_DIR, VERSIONS_FILE)
+    if not os.path.isfile(versions_path):
+        return None
+    with open(versions_path, "r") as f:
+        return json.load(f)
+
+def changed_rows(V_previous: np.ndarray, V_new: np.ndarray) -> np.ndarray:
+    """
+    IDs of the rows of `V_new` that differ from `V_previous`, including rows appended to the catalog.
+    """
+    common = min(len(V_previous), len(V_new))
+    changed = np.flatnonzero(np.any(V_new[:common] != V_previous[:common], axis=1))
+    return np.concatenate([changed, np.arange(common, len(V_new))])
+
+def save_atomically(path: str, save):
+    """
+    Write a file through `save(file)` under a temporary name, then move it in place, so that
+    readers see either the previous file or the complete new one.
+    """
+    with open(path + ".tmp", "wb") as f:
+        save(f)
+    os.replace(path + ".tmp", path)
+
+def publish_global_V_version(V_new: np.ndarray, save_to: str, V_previous: np.ndarray = None, snapshot_every: int = 10, retain_patches: int = 20, item_ids=None) -> dict:
+    """
+    Publish a new monotonically versioned state of the global item factors.
+
+    Each version is published as a patch holding only the changed row IDs and their new
+    values. Every `snapshot_every` versions (or when no previous state is given) a full
+    snapshot is written instead. Compaction keeps the latest snapshot and the last
+    `retain_patches` patches.
+
+    New files are complete before the version index (`versions.json`) is replaced, and files
+    the new index no longer references are only removed afterwards, so that a participant
+    reading the previous index still finds its files.
+
+    Args:
+        V_new (np.ndarray): New global item factors.
+        save_to (str): Folder where the global item factors are published.
+        V_previous (np.ndarray, optional): Global item factors of the latest published version.
+        item_ids (array-like, optional): IDs of the rows changed (or appended) since the latest
+            published version, when the caller knows them; replaces the comparison with `V_previous`.
+        snapshot_every (int): Number of versions between full snapshots.
+        retain_patches (int): Number of most recent patches kept for participants that are behind.
+            Must be at least `snapshot_every`, so that the latest snapshot can always be brought up to date.
+
+    Returns:
+        dict: The updated version index.
+
+    Raises:
+        ValueError: If `retain_patches` is smaller than `snapshot_every`.
+    """
+    if retain_patches < snapshot_every:
+        raise ValueError(f"retain_patches ({retain_patches}) must be at least snapshot_every ({snapshot_every}).")
+    patches_path = os.path.join(save_to, PATCHES_DIR)
+    os.makedirs(patches_path, exist_ok=True)
+
+    versions = load_versions(save_to) or {"version": 0, "snapshot_version": None, "snapshot_file": None, "patches": []}
+    version = versions["version"] + 1
+
+    incremental = V_previous is not None or item_ids is not None
+    if incremental and versions["snapshot_version"] is not None:
+        item_ids = changed_rows(V_previous, V_new) if item_ids is None else np.unique(np.asarray(item_ids, dtype=np.int64))
+        patch_file = f"patch_{version:06d}.npz"
+        save_atomically(os.path.join(patches_path, patch_file), lambda f: np.savez(f, item_ids=item_ids, rows=V_new[item_ids], num_items=len(V_new)))
+        versions["patches"].append({"version": version, "file": patch_file, "num_rows": int(len(item_ids))})
+        print(f"Published global V version {version}: {len(item_ids)} changed rows.")
+    else:
+        # Without a previous state every row is new, so there is nothing to gain from a patch
+        versions["patches"] = []
+
+    if versions["snapshot_version"] is None or not incremental or version - versions["snapshot_version"] >= snapshot_every:
+        versions["snapshot_file"] = f"snapshot_{version:06d}.npy"
+        versions["snapshot_version"] = version
+        save_atomically(os.path.join(patches_path, versions["snapshot_file"]), lambda f: np.save(f, V_new))
+        print(f"Published global V snapshot at version {version}.")
+
+    # Compaction
+    versions["patches"] = [patch for patch in versions["patches"] if patch["version"] > version - retain_patches]
+    versions["version"] = version
+    save_atomically(os.path.join(patches_path, VERSIONS_FILE), lambda f: f.write(json.dumps(versions).encode("utf-8")))
+
+    referenced = {VERSIONS_FILE, versions["snapshot_file"]} | {patch["file"] for patch in versions["patches"]}
+    for name in os.listdir(patches_path):
+        if name not in referenced and (name.startswith("patch_") or name.startswith("snapshot_")) and not name.endswith(".tmp"):
+            os.remove(os.path.join(patches_path, name))
+    return versions
+
+## ==================================================================================================
+## Participant - Catching Up
+## ==================================================================================================
+
+def apply_patch(V: np.ndarray, patch_path: str) -> np.ndarray:
+    """
+    Apply a published patch to a local copy of the global item factors, growing it if new items were added.
+    """
+    with np.load(patch_path) as patch:
+        num_items = int(patch["num_items"])
+        if num_items > len(V):
+            V = np.concatenate([V, np.zeros((num_items - len(V), V.shape[1]), dtype=V.dtype)])
+        elif num_items < len(V):
+            V = V[:num_items]
+        V[patch["item_ids"]] = patch["rows"]
+    return V
+
+def apply_patches(V: np.ndarray, patches_path: str, patches: dict, start: int, latest: int, stats: dict) -> np.ndarray:
+    """
+    Apply the patches of versions start + 1 to `latest` (version -> file name), counting the bytes read in `stats`.
+    """
+    for version in range(start + 1, latest + 1):
+        patch_path = os.path.join(patches_path, patches[version])
+        V = apply_patch(V, patch_path)
+        stats["bytes_read"] += os.path.getsize(patch_path)
+    return V
+
+def load_local_version(local_dir: str) -> int:
+    version_path = os.path.join(local_dir, LOCAL_VERSION_FILE)
+    if not os.path.isfile(version_path) or not os.path.isfile(os.path.join(local_dir, "global_V.npy")):
+        return 0
+    with open(version_path, "r") as f:
+        return json.load(f)["version"]
+
+def sync_global_item_factors(save_path: str, local_dir: str, mmap: bool = False, attempts: int = 3):
+    """
+    Bring the participant's local copy of the global item factors up to the latest published version.
+
+    Patches are applied from the local version onwards. When the participant is too far
+    behind (a needed patch was compacted away) or has no local copy, it falls back to the
+    latest snapshot and applies the patches published after it. If a file disappears while
+    it is read (the aggregator published and compacted meanwhile), the sync starts over from
+    the new index, up to `attempts` times.
+
+    The local version is only recorded once the local copy is complete, so that it always
+    describes the local copy (see `svd_recommendation.model_version`).
+
+    Args:
+        save_path (str): Folder where the aggregator publishes the global item factors.
+        local_dir (str): Folder holding the participant's local copy.
+        mmap (bool): Memory-map the local copy when it is already up to date.
+        attempts (int): Number of tries when published files are compacted away during the sync.
+
+    Returns:
+        tuple: (V, stats) with the up-to-date item factors and a dict with the version reached,
+        whether a snapshot was used and the number of bytes read.
+    """
+    for attempt in range(attempts):
+        try:
+            return sync_once(save_path, local_dir, mmap)
+        except FileNotFoundError:
+            if attempt == attempts - 1 or load_versions(save_path) is None:
+                raise
+
+def sync_once(save_path: str, local_dir: str, mmap: bool = False):
+    versions = load_versions(save_path)
+    if versions is None:
+        raise FileNotFoundError(f"No published versions of the global item factors in: {save_path}")
+
+    patches_path = os.path.join(save_path, PATCHES_DIR)
+    local_V_path = os.path.join(local_dir, "global_V.npy")
+    local_version_path = os.path.join(local_dir, LOCAL_VERSION_FILE)
+    local_version = load_local_version(local_dir)
+    latest = versions["version"]
+    stats = {"version": latest, "from_version": local_version, "snapshot": False, "bytes_read": 0}
+
+    if local_version == latest:
+        return np.load(local_V_path, mmap_mode="r" if mmap else None), stats
+
+    patches = {patch["version"]: patch["file"] for patch in versions["patches"]}
+    V = None
+    if local_version > 0 and local_version < latest and all(v in patches for v in range(local_version + 1, latest + 1)):
+        try:
+            V = apply_patches(np.load(local_V_path), patches_path, patches, local_version, latest, stats)
+        except FileNotFoundError:
+            V = None  # a needed patch was compacted away meanwhile: start over from the snapshot
+    if V is None:
+        snapshot_path = os.path.join(patches_path, versions["snapshot_file"])
+        missing = [v for v in range(versions["snapshot_version"] + 1, latest + 1) if v not in patches]
+        if missing:
+            raise ValueError(f"Versions {missing} of {save_path} have no patch after the latest snapshot (retain_patches < snapshot_every).")
+        V = np.load(snapshot_path)
+        stats["snapshot"] = True
+        stats["bytes_read"] += os.path.getsize(snapshot_path)
+        V = apply_patches(V, patches_path, patches, versions["snapshot_version"], latest, stats)
+
+    os.makedirs(local_dir, exist_ok=True)
+    if os.path.isfile(local_version_path):
+        os.remove(local_version_path)
+    save_atomically(local_V_path, lambda f: np.save(f, V))
+    save_atomically(local_version_path, lambda f: f.write(json.dumps({"version": latest}).encode("utf-8")))
+    return V, stats
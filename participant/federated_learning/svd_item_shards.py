@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+SHARDS_DIR = "global_V_shards"
+MANIFEST_FILE = "manifest.json"
+
+## ==================================================================================================
+## Server - Shard Publication
+## ==================================================================================================
+
+def shard_file_name(shard_id: int, digest: str) -> str:
+    return f"shard_{shard_id:05d}_{digest[:16]}.npy"
+
+def load_shard_manifest(save_path: str):
+    """
+    Load the shard manifest published next to `global_V.npy`, or None if V is not sharded.
+    """
+    manifest_path = os.path.join(save_path, SHARDS_DIR, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def publish_item_factor_shards(V: np.ndarray, save_to: str, shard_size: int = 1024) -> dict:
+    """
+    Publish the global item factors as fixed-size row shards with an index manifest.
+
+    Shard `i` holds rows [i * shard_size, (i + 1) * shard_size). Shard files are named after
+    their content, so only shards whose content changed since the previous publication are
+    written, and a round that touches a few items only re-syncs the shards that contain them.
+
+    Publication never modifies a file a manifest points to. New shards are written under their
+    new names, then the manifest is replaced. Shards of the previous manifest are kept for
+    one more publication, so that a participant that read it can still open them.
+
+    Args:
+        V (np.ndarray): Global item factors matrix (num_items, k).
+        save_to (str): Folder where `global_V.npy` is published.
+        shard_size (int): Number of rows per shard.
+
+    Returns:
+        dict: The published manifest.
+    """
+    shards_path = os.path.join(save_to, SHARDS_DIR)
+    os.makedirs(shards_path, exist_ok=True)
+
+    previous = load_shard_manifest(save_to)
+    previous_files = {shard["file"] for shard in previous["shards"]} if previous else set()
+    reusable = previous_files if previous and previous["shard_size"] == shard_size and previous["dtype"] == V.dtype.str else set()
+
+    shards = []
+    written = 0
+    for shard_id, start in enumerate(range(0, len(V), shard_size)):
+        rows = np.ascontiguousarray(V[start:start + shard_size])
+        digest = hashlib.sha1(rows.tobytes()).hexdigest()
+        file_name = shard_file_name(shard_id, digest)
+        file_path = os.path.join(shards_path, file_name)
+
+        if file_name not in reusable or not os.path.isfile(file_path):
+            with open(file_path + ".tmp", "wb") as f:
+                np.save(f, rows)
+            os.replace(file_path + ".tmp", file_path)
+            written += 1
+        shards.append({"file": file_name, "start": start, "stop": start + len(rows), "sha1": digest})
+
+    manifest = {
+        "num_items": int(V.shape[0]),
+        "latent_dim": int(V.shape[1]),
+        "dtype": V.dtype.str,
+        "shard_size": shard_size,
+        "shards": shards,
+    }
+    # Write the manifest last and atomically, so readers never see it ahead of its shards
+    manifest_path = os.path.join(shards_path, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # Remove shards that neither the new nor the previous manifest references
+    keep = previous_files | {shard["file"] for shard in shards}
+    for file_name in os.listdir(shards_path):
+        if file_name.startswith("shard_") and file_name.endswith(".npy") and file_name not in keep:
+            os.remove(os.path.join(shards_path, file_name))
+
+    print(f"Published {len(shards)} item factor shards ({written} updated).")
+    return manifest
+
+## ==================================================================================================
+## Participant - Partial Loading
+## ==================================================================================================
+
+def shards_for_items(manifest: dict, item_ids) -> list:
+    """
+    Return the shard entries that contain the given item IDs.
+    """
+    shard_ids = np.unique(np.asarray(item_ids, dtype=np.int64) // manifest["shard_size"])
+    return [manifest["shards"][shard_id] for shard_id in shard_ids]
+
+def load_item_factor_rows(save_path: str, item_ids, mmap: bool = True) -> np.ndarray:
+    """
+    Load only the global item factor rows for `item_ids`.
+
+    When the aggregator published a sharded V, only the shards containing the requested items
+    are opened (memory-mapped by default). Otherwise `global_V.npy` is memory-mapped and
+    indexed, so only the touched rows are read from disk.
+
+    Args:
+        save_path (str): Folder where the global item factors are published.
+        item_ids (list[int]): Global item IDs to load.
+        mmap (bool): Memory-map the shard files instead of reading them entirely.
+
+    Returns:
+        np.ndarray: Array of shape (len(item_ids), k), row i holding the factors of item_ids[i].
+    """
+    item_ids = np.asarray(item_ids, dtype=np.int64)
+    manifest = load_shard_manifest(save_path)
+
+    if manifest is None:
+        global_V_path = os.path.join(save_path, "global_V.npy")
+        V = np.load(global_V_path, mmap_mode="r" if mmap else None)
+        return np.array(V[item_ids])
+
+    if np.any(item_ids >= manifest["num_items"]) or np.any(item_ids < 0):
+        raise IndexError(f"Item IDs out of range for {manifest['num_items']} published items.")
+
+    rows = np.empty((len(item_ids), manifest["latent_dim"]), dtype=np.dtype(manifest["dtype"]))
+    shard_of_item = item_ids // manifest["shard_size"]
+    for shard in shards_for_items(manifest, item_ids):
+        shard_rows = np.load(os.path.join(save_path, SHARDS_DIR, shard["file"]), mmap_mode="r" if mmap else None)
+        in_shard = shard_of_item == shard["start"] // manifest["shard_size"]
+        rows[in_shard] = shard_rows[item_ids[in_shard] - shard["start"]]
+    return rows
@@ -0,0 +1,176 @@
+import os
+import json
+import numpy as np
+from common.vocabulary import Vocabulary, normalize_string
+
+STORE_DIR = "global_V_store"
+FACTORS_FILE = "factors.npy"
+INDEX_FILE = "index.json"
+
+class ItemFactorStore:
+    """
+    Growable, memory-mapped matrix of item factors with a title -> row index.
+
+    Rows live in a preallocated `.npy` file that is memory-mapped read-write. When it is full,
+    its capacity doubles, so appending n items costs O(n) copies in total instead of the O(n^2)
+    of growing the matrix with `np.vstack` one title at a time. Only the first `len(store)`
+    rows are items; the rest is spare capacity.
+
+    Titles are indexed by their normalized form (see `normalize_string`), so that proposals
+    for the same show spelled differently by participants resolve to the same row.
+    """
+
+    def __init__(self, path: str, factors: np.memmap, index: dict, num_items: int):
+        self.path = path
+        self._data = factors
+        self.index = index
+        self.num_items = num_items
+
+    ## Creation and persistence
+
+    @classmethod
+    def create(cls, path: str, V: np.ndarray, tv_vocab: dict, capacity: int = None):
+        """
+        Create a store holding `V`, whose rows are the item IDs of `tv_vocab`.
+        """
+        os.makedirs(path, exist_ok=True)
+        capacity = max(capacity or 0, 1 << max(len(V) - 1, 0).bit_length())
+        factors = np.lib.format.open_memmap(os.path.join(path, FACTORS_FILE), mode="w+", dtype=V.dtype, shape=(capacity, V.shape[1]))
+        factors[:len(V)] = V
+        if isinstance(tv_vocab, Vocabulary):
+            index = dict(tv_vocab.normalized)  # a copy: the store's index grows with new items
+        else:
+            index = {normalize_string(title): int(item_id) for title, item_id in tv_vocab.items()}
+        store = cls(path, factors, index, len(V))
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path: str):
+        """
+        Open an existing store, memory-mapping its factors.
+        """
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            meta = json.load(f)
+        factors = np.load(os.path.join(path, FACTORS_FILE), mmap_mode="r+")
+        return cls(path, factors, meta["index"], meta["num_items"])
+
+    def flush(self):
+        """
+        Flush the factors to disk and atomically rewrite the index.
+        """
+        self._data.flush()
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"num_items": self.num_items, "index": self.index}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    ## Access
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    @property
+    def factors(self) -> np.ndarray:
+        """
+        Writable view of the item rows (num_items, k).
+        """
+        return self._data[:self.num_items]
+
+    def __len__(self) -> int:
+        return self.num_items
+
+    def __contains__(self, title: str) -> bool:
+        return normalize_string(title) in self.index
+
+    def row_of(self, title: str):
+        """
+        Row of `title`, or None if it is not in the store.
+        """
+        return self.index.get(normalize_string(title))
+
+    ## Growth
+
+    def reserve(self, num_items: int):
+        """
+        Make room for at least `num_items` rows, doubling the capacity as many times as needed.
+        """
+        if num_items <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < num_items:
+            capacity *= 2
+
+        factors_path = os.path.join(self.path, FACTORS_FILE)
+        grown = np.lib.format.open_memmap(factors_path + ".tmp", mode="w+", dtype=self._data.dtype, shape=(capacity, self._data.shape[1]))
+        grown[:self.num_items] = self.factors
+        grown.flush()
+        del grown
+        self._data.flush()
+        self._data = None
+        os.replace(factors_path + ".tmp", factors_path)
+        self._data = np.load(factors_path, mmap_mode="r+")
+
+    def append(self, titles: list, vectors: np.ndarray) -> list:
+        """
+        Append new items, growing the store at most once. Titles already present keep their row.
+
+        Returns:
+            list[int]: The row of each title.
+        """
+        vectors = np.asarray(vectors, dtype=self._data.dtype).reshape(len(titles), self._data.shape[1])
+        rows, new_rows = [], []
+        for title, vector in zip(titles, vectors):
+            key = normalize_string(title)
+            if key not in self.index:
+                self.index[key] = self.num_items + len(new_rows)
+                new_rows.append(vector)
+            rows.append(self.index[key])
+
+        if new_rows:
+            self.reserve(self.num_items + len(new_rows))
+            self._data[self.num_items:self.num_items + len(new_rows)] = new_rows
+            self.num_items += len(new_rows)
+        return rows
+
+    def merge_proposals(self, proposals: list, init_scale: float = 0.01, random_seed: int = None) -> dict:
+        """
+        Merge the new-item proposals of many participants in one batch.
+
+        Each proposal maps a title to the participant's initial factors for it (or None to let
+        the server initialize it). Titles are deduplicated across participants by their
+        normalized form; a new item starts at the mean of the proposed factors, or at small
+        random factors if nobody proposed any. All new items are appended with a single growth.
+
+        Args:
+            proposals (list[dict]): One {title: vector or None} dict per participant.
+            init_scale (float): Standard deviation of the random initialization.
+            random_seed (int, optional): Seed of the random initialization.
+
+        Returns:
+            dict: Row of every proposed title (existing or new).
+        """
+        rng = np.random.default_rng(random_seed)
+        k = self._data.shape[1]
+        titles, sums, counts, proposed = {}, {}, {}, set()
+        for proposal in proposals:
+            for title, vector in proposal.items():
+                key = normalize_string(title)
+                titles.setdefault(key, title)
+                proposed.add(title)
+                if key in self.index or vector is None:
+                    continue
+                sums[key] = sums.get(key, 0) + np.asarray(vector, dtype=np.float64)
+                counts[key] = counts.get(key, 0) + 1
+
+        new_keys = sorted(key for key in titles if key not in self.index)
+        vectors = np.array([
+            sums[key] / counts[key] if key in counts else rng.normal(scale=init_scale, size=k)
+            for key in new_keys
+        ]).reshape(len(new_keys), k)
+        self.append([titles[key] for key in new_keys], vectors)
+
+        if new_keys:
+            print(f"Added {len(new_keys)} new items to the item factor store ({self.num_items} items, capacity {self.capacity}).")
+        return {title: self.index[normalize_string(title)] for title in proposed}
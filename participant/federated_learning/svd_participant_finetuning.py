@@ -3,7 +3,6 @@ import copy
 import numpy as np
 from participant.participant_utils.data_loading import (
     load_tv_vocabulary, 
-    load_global_item_factors, 
     load_participant_ratings,
     load_or_initialize_user_matrix)
 from participant.federated_learning.svd_dp import (
@@ -12,15 +11,18 @@ from participant.federated_learning.svd_dp import (
     clip_deltas,
     apply_differential_privacy
 )
+from participant.federated_learning.svd_item_shards import load_item_factor_rows
+from participant.federated_learning.svd_delta_codec import encode_deltas, save_encoded_deltas
+from participant.federated_learning.svd_als import perform_local_als, save_item_statistics
 
 def save_training_results(user_id, base_path, V, delta_V, U_u):
     """
-    Save the updated V matrix, delta_V, and user matrix to disk.
+    Save the updated V rows, delta_V, and user matrix to disk.
 
     Parameters:
         user_id (str): Identifier for the user.
         base_path (str): Base directory for saving files.
-        V (np.ndarray): Updated item factors matrix.
+        V (np.ndarray): Updated item factors (the rows of the items used in training).
         delta_V (dict): Dictionary of delta updates for item factors.
         U_u (np.ndarray): Updated user matrix.
     """
@@ -39,6 +41,25 @@ def save_training_results(user_id, base_path, V, delta_V, U_u):
 
     print(f"Updated and saved training results for user: {user_id} at {user_path}.")
 
+def save_encoded_upload(user_id, base_path, delta_V, encoding, top_k=None):
+    """
+    Encode the deltas for upload (see `encode_deltas`) and save them as `<user_id>_delta_V.npz`.
+
+    The residual of the encoding stays in the user folder and is folded into the next upload.
+
+    Returns:
+        dict: The encoded payload.
+    """
+    user_path = os.path.join(base_path, user_id)
+    os.makedirs(user_path, exist_ok=True)
+    residual_path = os.path.join(user_path, f"{user_id}_delta_residual.npy")
+    residual = np.load(residual_path, allow_pickle=True).item() if os.path.exists(residual_path) else None
+
+    payload, residual = encode_deltas(delta_V, encoding=encoding, top_k=top_k, residual=residual)
+    save_encoded_deltas(os.path.join(user_path, f"{user_id}_delta_V.npz"), payload)
+    np.save(residual_path, residual)
+    return payload
+
 def prepare_training_data(user_id, tv_vocab, final_ratings):
     """
     Prepare training data for the participant.
@@ -62,32 +83,51 @@ def perform_local_training(train_data, initial_V, initial_U_u, alpha=0.01, lambd
             V[item_id] += alpha * V_i_grad
     return initial_V, V, U_u
 
-def participant_fine_tuning(user_id, private_folder, epsilon=None, clipping_threshold=None, noise_type="gaussian", save_path="mock_dataset_location/tmp_model_parms", plot=False):
+def participant_fine_tuning(user_id, private_folder, epsilon=None, clipping_threshold=None, noise_type="gaussian", save_path="mock_dataset_location/tmp_model_parms", plot=False, encoding=None, top_k=None, method="sgd"):
     """
     Orchestrator function for participant fine-tuning.
+
+    With `encoding`, the privatized deltas are also saved in compressed form for upload
+    (see `save_encoded_upload`). With method "als", the user vector is solved in closed form
+    and the item statistics are saved for upload as `<user_id>_item_statistics.npz` instead of
+    deltas (see `perform_local_als`; they are (k + 3) / 2 times larger than the deltas).
     """
+    if method not in ("sgd", "als"):
+        raise ValueError("Invalid method. Use 'sgd' or 'als'.")
+
     # Step 1: Load vocabulary
     vocabulary_path = "aggregator/data/tv-series_vocabulary.json"
     tv_vocab = load_tv_vocabulary(vocabulary_path)
 
-    # Step 2: Load global item factors
-    V = load_global_item_factors(save_path)
-
-    # Step 3: Load participant's ratings
+    # Step 2: Load participant's ratings
     final_ratings = load_participant_ratings(private_folder)
 
-    # Step 4: Load or initialize user matrix
+    # Step 3: Prepare training data
+    train_data = prepare_training_data(user_id, tv_vocab, final_ratings)
+    item_ids = [item_id for (_, item_id, _) in train_data]
+
+    # Step 4: Load only the global item factors of the rated items
+    V = load_item_factor_rows(save_path, item_ids)
+
+    # Step 5: Load or initialize user matrix
     U_u = load_or_initialize_user_matrix(user_id, V.shape[1], save_path=os.path.join(save_path, user_id))
 
-    # Step 5: Prepare training data
-    train_data = prepare_training_data(user_id, tv_vocab, final_ratings)
+    # Step 6: Perform local training (rows of V are indexed by position in item_ids)
+    local_train_data = [(uid, row, r) for row, (uid, _, r) in enumerate(train_data)]
+    if method == "als":
+        updated_U_u, statistics = perform_local_als(local_train_data, V, epsilon=epsilon, noise_type=noise_type)
+        statistics["item_ids"] = np.asarray(item_ids, dtype=np.int64)
+        user_path = os.path.join(save_path, user_id)
+        os.makedirs(user_path, exist_ok=True)
+        np.save(os.path.join(user_path, f"{user_id}_U.npy"), updated_U_u)
+        save_item_statistics(os.path.join(user_path, f"{user_id}_item_statistics.npz"), statistics)
+        print(f"Participant {user_id} finished training and saved its item statistics.")
+        return statistics
 
-    # Step 6: Perform local training
-    initial_V, updated_V, updated_U_u = perform_local_training(train_data, V, U_u)
+    initial_V, updated_V, updated_U_u = perform_local_training(local_train_data, V, U_u)
 
     # Step 7: Compute and privatize deltas
-    ids_training = [item_id for (_, item_id, _) in train_data]
-    delta_V = {item_id: updated_V[item_id] - initial_V[item_id] for (_, item_id, _) in train_data}
+    delta_V = {item_id: updated_V[row] - initial_V[row] for row, item_id in enumerate(item_ids)}
     # delta_V = {item_id: updated_V[item_id] - initial_V[item_id] for item_id, _ in enumerate(initial_V)}
     # delta_norms_before = [np.linalg.norm(v) for i, v in enumerate(delta_V.values()) if i in ids_training]
     delta_norms_before = [np.linalg.norm(v) for i, v in enumerate(delta_V.values())]
@@ -100,13 +140,128 @@ def participant_fine_tuning(user_id, private_folder, epsilon=None, clipping_thre
 
     # Step 8: Save results
     save_training_results(user_id, save_path, updated_V, dp_deltas, updated_U_u)
+    if encoding:
+        save_encoded_upload(user_id, save_path, dp_deltas, encoding, top_k=top_k)
 
     if plot:
         # Step 9: Plot delta distributions
         # sorted_item_ids = sorted(delta_V.keys())
-        sorted_item_ids = range(0, len(ids_training))
+        sorted_item_ids = range(0, len(item_ids))
         # plot_delta_distributions(user_id, delta_norms_before, delta_norms_after)
         plot_ratings_norm(user_id, sorted_item_ids, delta_norms_before, delta_norms_after)
 
     print(f"Participant {user_id} finished training and updated item factors.")
     return delta_V
+
+## ==================================================================================================
+## Batched Fine-Tuning (several local profiles at once)
+## ==================================================================================================
+
+def prepare_batched_training_data(user_ids, tv_vocab, ratings_by_user):
+    """
+    Stack the ratings of several profiles into one sparse ratings matrix in CSR layout.
+
+    The ratings of user_ids[u] are the entries indptr[u]:indptr[u + 1] of `item_ids` and
+    `ratings`, in the same order as `prepare_training_data` would produce them.
+
+    Returns:
+        tuple: (indptr, item_ids, ratings) as NumPy arrays.
+    """
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    item_ids, ratings = [], []
+    for u, user_id in enumerate(user_ids):
+        train_data = prepare_training_data(user_id, tv_vocab, ratings_by_user[user_id])
+        item_ids.extend(item_id for (_, item_id, _) in train_data)
+        ratings.extend(r for (_, _, r) in train_data)
+        indptr[u + 1] = len(item_ids)
+    return indptr, np.asarray(item_ids, dtype=np.int64), np.asarray(ratings, dtype=np.float64)
+
+def perform_batched_local_training(indptr, ratings, initial_V_rows, initial_U, alpha=0.01, lambda_reg=0.1, iterations=10):
+    """
+    Train several users at once, each against its own copy of the item factor rows it rated.
+
+    Step j of an epoch updates the j-th rating of every user that has one in a single
+    vectorized operation. Users never share state, so the result is the same as calling
+    `perform_local_training` for each user in turn, at the cost of iterations * max_ratings
+    NumPy operations instead of iterations * total_ratings Python steps.
+
+    Args:
+        indptr (np.ndarray): CSR row pointer of the ratings matrix (num_users + 1,).
+        ratings (np.ndarray): Ratings, ordered by user (nnz,).
+        initial_V_rows (np.ndarray): Item factor rows of every (user, item) rating (nnz, k).
+        initial_U (np.ndarray): Stacked user vectors (num_users, k).
+
+    Returns:
+        tuple: (updated_V_rows, updated_U), one row per rating and per user respectively.
+    """
+    V_rows = np.array(initial_V_rows, dtype=np.float64)
+    U = np.array(initial_U, dtype=np.float64)
+    counts = np.diff(indptr)
+
+    for _ in range(iterations):
+        for j in range(counts.max(initial=0)):
+            users = np.flatnonzero(counts > j)
+            entries = indptr[users] + j
+            U_u, V_i = U[users], V_rows[entries]
+
+            error = ratings[entries] - np.einsum("ij,ij->i", U_u, V_i)
+            U_grad = error[:, np.newaxis] * V_i - lambda_reg * U_u
+            V_grad = error[:, np.newaxis] * U_u - lambda_reg * V_i
+            U[users] = U_u + alpha * U_grad
+            V_rows[entries] = V_i + alpha * V_grad
+    return V_rows, U
+
+def participant_fine_tuning_batched(user_ids, private_folders, epsilon=None, clipping_threshold=None, noise_type="gaussian", save_path="mock_dataset_location/tmp_model_parms", encoding=None, top_k=None):
+    """
+    Fine-tune all local profiles of a household together.
+
+    The vocabulary and the global item factor rows are loaded once for all profiles; users
+    are trained in the same vectorized steps (see `perform_batched_local_training`). Deltas,
+    DP noise and saved results stay per profile, exactly as in `participant_fine_tuning`.
+
+    Args:
+        user_ids (list[str]): Local profiles to train.
+        private_folders (dict): Private folder of each profile, holding its ratings.
+        encoding (str, optional): Also save each profile's deltas encoded for upload (see `save_encoded_upload`).
+        top_k (int, optional): Maximum number of item rows per encoded upload.
+
+    Returns:
+        dict: Delta updates of each profile, keyed by user ID.
+    """
+    # Step 1: Load vocabulary and every profile's ratings
+    vocabulary_path = "aggregator/data/tv-series_vocabulary.json"
+    tv_vocab = load_tv_vocabulary(vocabulary_path)
+    ratings_by_user = {user_id: load_participant_ratings(private_folders[user_id]) for user_id in user_ids}
+
+    # Step 2: Stack the ratings into one sparse matrix
+    indptr, item_ids, ratings = prepare_batched_training_data(user_ids, tv_vocab, ratings_by_user)
+
+    # Step 3: Load the global item factor rows of all rated items in one pass
+    unique_ids, positions = np.unique(item_ids, return_inverse=True)
+    V = load_item_factor_rows(save_path, unique_ids)
+    initial_V_rows = V[positions]
+
+    # Step 4: Stack the user vectors
+    U = np.stack([
+        load_or_initialize_user_matrix(user_id, V.shape[1], save_path=os.path.join(save_path, user_id))
+        for user_id in user_ids
+    ]) if user_ids else np.empty((0, V.shape[1]))
+
+    # Step 5: Train every profile in the same vectorized steps
+    updated_V_rows, updated_U = perform_batched_local_training(indptr, ratings, initial_V_rows, U)
+
+    # Step 6: Compute, privatize and save the deltas of each profile
+    delta_V = {}
+    for u, user_id in enumerate(user_ids):
+        rows = slice(indptr[u], indptr[u + 1])
+        delta_V[user_id] = {
+            int(item_id): updated - initial
+            for item_id, updated, initial in zip(item_ids[rows], updated_V_rows[rows], initial_V_rows[rows])
+        }
+        dp_deltas = apply_differential_privacy(delta_V[user_id], epsilon, 0.36, noise_type=noise_type)
+        save_training_results(user_id, save_path, updated_V_rows[rows], dp_deltas, updated_U[u])
+        if encoding:
+            save_encoded_upload(user_id, save_path, dp_deltas, encoding, top_k=top_k)
+
+    print(f"Participants {', '.join(user_ids)} finished batched training and updated item factors.")
+    return delta_V
@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import numpy as np
+from common.vocabulary import Vocabulary, normalize_string, file_sha256
+from participant.federated_learning.svd_item_patches import LOCAL_VERSION_FILE, load_local_version, load_versions
+
+def build_exclusion_mask(tv_vocab: dict, num_items: int, watched_titles=None) -> np.ndarray:
+    """
+    Build a boolean mask of the items that must not be recommended.
+
+    Rows of `V` without a title in the vocabulary are always excluded. Watched titles are
+    matched on their normalized form, so zero-width spaces and casing do not matter.
+    A `Vocabulary` keeps its item IDs and normalized title index between calls, so only the
+    watched titles are looked up; a plain dict is indexed on every call.
+
+    Args:
+        tv_vocab (dict): Mapping of TV series titles to item IDs.
+        num_items (int): Number of rows in the item factors matrix.
+        watched_titles (iterable[str], optional): Titles already watched by the user.
+
+    Returns:
+        np.ndarray: Boolean array of shape (num_items,), True for excluded items.
+    """
+    vocabulary = tv_vocab if isinstance(tv_vocab, Vocabulary) else Vocabulary(tv_vocab)
+    mask = np.ones(num_items, dtype=bool)
+    item_ids = vocabulary.item_ids
+    mask[item_ids[item_ids < num_items]] = False
+
+    for title in watched_titles or []:
+        item_id = vocabulary.find_normalized(title)
+        if item_id is not None and item_id < num_items:
+            mask[item_id] = True
+
+    return mask
+
+def score_items(U: np.ndarray, V: np.ndarray) -> np.ndarray:
+    """
+    Score every item for one user vector (k,) or for many user vectors (n_users, k)
+    with a single matrix product.
+
+    Returns:
+        np.ndarray: Scores of shape (num_items,) or (n_users, num_items).
+    """
+    return U @ V.T
+
+def top_k_items(scores: np.ndarray, k: int, exclude_mask: np.ndarray = None):
+    """
+    Select the top-k items from a score vector or a score matrix (one row per user)
+    using `argpartition`, without sorting the full catalog.
+
+    Args:
+        scores (np.ndarray): Scores of shape (num_items,) or (n_users, num_items).
+        k (int): Number of items to return.
+        exclude_mask (np.ndarray, optional): Boolean mask of shape (num_items,) or
+            (n_users, num_items), True for items that must be skipped.
+
+    Returns:
+        tuple: (item_ids, item_scores) ordered by descending score. For a score vector, excluded
+        items are dropped when fewer than k candidates remain; for a score matrix, missing
+        entries are padded with -1 and -inf.
+    """
+    scores = np.asarray(scores, dtype=np.result_type(scores, np.float32))
+    if exclude_mask is not None:
+        scores = np.where(exclude_mask, -np.inf, scores)
+
+    num_items = scores.shape[-1]
+    k = min(k, num_items)
+    if k <= 0:
+        empty_shape = scores.shape[:-1] + (0,)
+        return np.empty(empty_shape, dtype=np.int64), np.empty(empty_shape, dtype=scores.dtype)
+
+    if k < num_items:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(num_items), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    item_ids = np.take_along_axis(candidates, order, axis=-1)
+    item_scores = np.take_along_axis(candidate_scores, order, axis=-1)
+
+    valid = np.isfinite(item_scores)
+    if item_scores.ndim == 1:
+        return item_ids[valid], item_scores[valid]
+    return np.where(valid, item_ids, -1), item_scores
+
+def recommend_top_k(U: np.ndarray, V: np.ndarray, k: int = 6, exclude_mask: np.ndarray = None):
+    """
+    Score all items with one matrix-vector (or matrix-matrix) product and select the top-k.
+
+    Args:
+        U (np.ndarray): User vector (k,) or stacked user/profile vectors (n_users, k).
+        V (np.ndarray): Item factors matrix (num_items, k).
+        k (int): Number of recommendations.
+        exclude_mask (np.ndarray, optional): Boolean exclusion mask (see `build_exclusion_mask`).
+
+    Returns:
+        tuple: (item_ids, item_scores) as returned by `top_k_items`.
+    """
+    return top_k_items(score_items(U, V), k, exclude_mask)
+
+def item_titles(tv_vocab: dict, num_items: int) -> np.ndarray:
+    """
+    Array-backed item ID -> title lookup. IDs without a title map to None.
+    A `Vocabulary` already holds one, which is returned as is (a view) when it covers `num_items`.
+    """
+    titles = (tv_vocab if isinstance(tv_vocab, Vocabulary) else Vocabulary(tv_vocab)).titles
+    if len(titles) >= num_items:
+        return titles[:num_items]
+    padded = np.full(num_items, None, dtype=object)
+    padded[:len(titles)] = titles
+    return padded
+
+## ==================================================================================================
+## Recommendation Cache
+## ==================================================================================================
+
+def model_version(global_V_path) -> str:
+    """
+    Version of a copy of the global item factors: the monotonic version it was synced to (see
+    `svd_item_patches.sync_global_item_factors`), or the SHA-256 of its contents when it was not
+    synced from the published versions. Unlike file metadata, neither can be reused by a
+    republished model of the same size.
+    """
+    local_dir = os.path.dirname(str(global_V_path))
+    if os.path.isfile(os.path.join(local_dir, LOCAL_VERSION_FILE)):
+        return f"v{load_local_version(local_dir)}"
+    return file_sha256(global_V_path)
+
+def published_version(save_path):
+    """
+    Version of the latest published global item factors, in the form of `model_version` (a
+    local copy synced from `save_path` has this version), or None if nothing was published.
+    Only the version index is read, so that a cached entry can be validated before any sync.
+    """
+    versions = load_versions(save_path)
+    return f"v{versions['version']}" if versions is not None else None
+
+def array_hash(array: np.ndarray) -> str:
+    """
+    Hash of an array's dtype, shape and contents.
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def titles_hash(titles) -> str:
+    """
+    Order-independent hash of a collection of titles, compared on their normalized form.
+    """
+    normalized = sorted({normalize_string(str(title)) for title in titles})
+    return hashlib.sha1("\n".join(normalized).encode("utf-8")).hexdigest()
+
+class RecommendationCache:
+    """
+    Per-profile cache of the top-N recommendations.
+
+    Each entry is stored with the key it was computed for (global model version, user vector
+    hash and exclusion-set hash), and is only served while that key still matches. Entries
+    are kept in memory for repeated reads and persisted as JSON next to the profile's model
+    parameters, so they survive between runs.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._entries = {}
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.cache_dir, user_id, f"{user_id}_recommendations.json")
+
+    def get(self, user_id: str, key: dict, k: int):
+        """
+        Return the cached top-k as a list of (title, score), or None on a miss or a stale entry.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            path = self._path(user_id)
+            if not os.path.isfile(path):
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._entries[user_id] = entry
+
+        if entry["key"] != key or (len(entry["items"]) < k and not entry["complete"]):
+            return None
+        return [(title, score) for title, score in entry["items"][:k]]
+
+    def put(self, user_id: str, key: dict, items: list, top_n: int):
+        """
+        Store the top-N recommendations (list of (title, score)) computed for `key`.
+        """
+        entry = {
+            "key": key,
+            "items": [[title, float(score)] for title, score in items],
+            "complete": len(items) < top_n,  # every candidate is cached, so any k can be served
+        }
+        self._entries[user_id] = entry
+
+        path = self._path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def invalidate(self, user_id: str = None):
+        """
+        Drop the cached entries of one profile, or of every profile if `user_id` is None.
+        """
+        user_ids = [user_id] if user_id else list(self._entries)
+        for uid in user_ids:
+            self._entries.pop(uid, None)
+            if os.path.isfile(self._path(uid)):
+                os.remove(self._path(uid))
@@ -0,0 +1,195 @@
+import os
+import json
+import numpy as np
+from participant.federated_learning.svd_dp import get_noise_function
+
+CONTROLLER_FILE = "round_controller.json"
+RATINGS_COUNT_FILE = "ratings_count.json"
+
+## ==================================================================================================
+## Participant - Progress Signal
+## ==================================================================================================
+
+def noisy_validation_error(U_u: np.ndarray, V_rows: np.ndarray, ratings: np.ndarray, epsilon: float = 1.0, sensitivity: float = 0.5, noise_type: str = "laplace") -> float:
+    """
+    RMSE of a participant's model on its held-out ratings, with DP noise added before it is reported.
+
+    Args:
+        U_u (np.ndarray): User vector.
+        V_rows (np.ndarray): Item factor rows of the held-out items (n, k).
+        ratings (np.ndarray): Held-out ratings (n,).
+        epsilon (float): Privacy budget of the reported value.
+        sensitivity (float): Sensitivity of the error.
+        noise_type (str): "gaussian" or "laplace".
+
+    Returns:
+        float: Noised RMSE, or None if there are no held-out ratings.
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    if len(ratings) == 0:
+        return None
+    rmse = float(np.sqrt(np.mean((ratings - V_rows @ U_u) ** 2)))
+    return rmse + float(get_noise_function(noise_type)(sensitivity, epsilon, size=None))
+
+def count_new_ratings(num_ratings: int, state_path: str) -> int:
+    """
+    Number of ratings a participant added since it last reported, from its current number of
+    ratings and the number recorded (in `state_path`) at its last report.
+
+    Returns:
+        int: New ratings (0 if ratings were removed), all of them on the first report.
+    """
+    reported = 0
+    if os.path.isfile(state_path):
+        with open(state_path, "r") as f:
+            reported = json.load(f)["num_ratings"]
+
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump({"num_ratings": int(num_ratings)}, f)
+    os.replace(state_path + ".tmp", state_path)
+    return max(0, int(num_ratings) - reported)
+
+## ==================================================================================================
+## Server - Round Controller
+## ==================================================================================================
+
+def aggregated_delta_norm(V_previous: np.ndarray, V_new: np.ndarray) -> float:
+    """
+    Frobenius norm of the change applied to the global item factors in one round, relative to
+    the norm of the factors before the round.
+    """
+    common = min(len(V_previous), len(V_new))
+    return relative_delta_norm(V_new[:common] - V_previous[:common], np.linalg.norm(V_previous[:common]))
+
+def relative_delta_norm(delta_rows: np.ndarray, previous_norm: float) -> float:
+    """
+    Same as `aggregated_delta_norm`, from the changed rows' deltas and the norm of the factors
+    before the round, so that the factors can be updated in place.
+    """
+    delta_norm = np.linalg.norm(delta_rows)
+    return float(delta_norm / previous_norm) if previous_norm > 0 else float(delta_norm)
+
+class RoundController:
+    """
+    Decides whether the next federated round is worth running, from cheap aggregate signals.
+
+    After every round the controller records the norm of the aggregated delta and, when
+    participants report it, their mean (DP-noised) validation error. A round that makes the
+    validation error worse, or makes the delta norm grow, halves the learning rate. A round
+    that improves the best error by less than `tolerance` (relatively) counts as stale; without
+    validation errors, a round whose relative delta norm is below `delta_tolerance` does.
+    After `patience` stale rounds, or when the learning rate falls below `min_learning_rate`,
+    training is paused. It resumes, with the initial learning rate, once `resume_ratings` new
+    ratings have been reported.
+
+    The state is persisted as JSON, so decisions carry over between runs of the aggregator. Only
+    the last `max_history` rounds are kept in its history.
+    """
+
+    def __init__(self, state_path: str, learning_rate: float = 1.0, min_learning_rate: float = 0.05, decay: float = 0.5, tolerance: float = 1e-3, delta_tolerance: float = 1e-2, patience: int = 2, resume_ratings: int = 100, max_history: int = 100):
+        self.state_path = state_path
+        self.initial_learning_rate = learning_rate
+        self.min_learning_rate = min_learning_rate
+        self.decay = decay
+        self.tolerance = tolerance
+        self.delta_tolerance = delta_tolerance
+        self.patience = patience
+        self.resume_ratings = resume_ratings
+        self.max_history = max_history
+        self.state = self.load()
+
+    def initial_state(self) -> dict:
+        return {
+            "round": 0,
+            "status": "training",
+            "learning_rate": self.initial_learning_rate,
+            "stale_rounds": 0,
+            "new_ratings": 0,
+            "best_validation_error": None,
+            "history": [],
+        }
+
+    def load(self) -> dict:
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        return self.initial_state()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def reset(self):
+        """
+        Start over, e.g. after the global model was re-initialized.
+        """
+        self.state = self.initial_state()
+        self.save()
+
+    @property
+    def learning_rate(self) -> float:
+        return self.state["learning_rate"]
+
+    @property
+    def paused(self) -> bool:
+        return self.state["status"] == "paused"
+
+    def should_run_round(self, new_ratings: int = 0) -> bool:
+        """
+        Report the ratings that arrived since the last call and decide whether to run a round.
+        """
+        if not self.paused:
+            return True
+
+        self.state["new_ratings"] += int(new_ratings)
+        if self.state["new_ratings"] >= self.resume_ratings:
+            print(f"Round controller: {self.state['new_ratings']} new ratings, resuming training.")
+            self.state.update(status="training", learning_rate=self.initial_learning_rate, stale_rounds=0, new_ratings=0, best_validation_error=None)
+        self.save()
+        return not self.paused
+
+    def record_round(self, delta_norm: float, validation_errors: list = None) -> dict:
+        """
+        Record the progress signals of a finished round and adapt the learning rate or pause.
+
+        Args:
+            delta_norm (float): Relative norm of the aggregated delta (see `aggregated_delta_norm`).
+            validation_errors (list[float], optional): Noised validation errors reported by participants.
+
+        Returns:
+            dict: The recorded history entry.
+        """
+        state = self.state
+        reported = [e for e in (validation_errors or []) if e is not None]
+        validation_error = float(np.mean(reported)) if reported else None
+        previous = state["history"][-1] if state["history"] else None
+        stale = False
+
+        if validation_error is not None:
+            best = state["best_validation_error"]
+            if previous and previous["validation_error"] is not None and validation_error > previous["validation_error"]:
+                state["learning_rate"] *= self.decay
+                stale = True
+            elif best is not None and (best - validation_error) < self.tolerance * best:
+                stale = True
+            if best is None or validation_error < best:
+                state["best_validation_error"] = validation_error
+        else:
+            if previous and delta_norm > previous["delta_norm"]:
+                state["learning_rate"] *= self.decay
+            stale = delta_norm < self.delta_tolerance
+
+        state["stale_rounds"] = state["stale_rounds"] + 1 if stale else 0
+        state["round"] += 1
+        entry = {"round": state["round"], "delta_norm": delta_norm, "validation_error": validation_error, "learning_rate": state["learning_rate"]}
+        state["history"].append(entry)
+        del state["history"][:-self.max_history]
+
+        if state["stale_rounds"] >= self.patience or state["learning_rate"] < self.min_learning_rate:
+            state.update(status="paused", new_ratings=0)
+            print(f"Round controller: no further improvement after round {state['round']}, pausing training.")
+        self.save()
+        return entry
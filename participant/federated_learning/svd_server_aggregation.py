@@ -1,5 +1,8 @@
+import os
 import copy
 import numpy as np
+from participant.federated_learning.svd_delta_codec import is_encoded, decode_deltas, load_deltas
+from common.peer_io import prefetch_peer_artifacts
 
 def validate_weights(weights, num_participants):
     """
@@ -99,21 +102,39 @@ def calculate_aggregated_delta(V, updates, normalized_weights, learning_rate):
             aggregated_delta[item_id] += weight * delta
     return aggregated_delta
 
-def aggregate_item_factors(V, updates, weights=None, learning_rate=1.0, epsilon=1.0, clipping_threshold=0.5):
+def load_updates(updates, prefetch=4):
     """
-    Perform aggregation of participant updates with optional clipping and differential privacy.
+    Resolve participant updates into delta dictionaries. Paths of uploaded delta files are
+    loaded with `load_deltas`, `prefetch` files ahead on background threads; encoded payloads
+    are decoded.
 
-    Args:
-        V (np.ndarray): Current global item factors.
-        updates (list[dict]): List of delta dictionaries from participants.
-        weights (list[float]): List of weights for each participant. If None, equal weights are assumed.
-        learning_rate (float): Scaling factor for the aggregated deltas.
-        epsilon (float): Privacy budget for differential privacy.
-        clipping_threshold (float): Clipping threshold for updates.
+    Raises:
+        ValueError: If an uploaded delta file cannot be read (the weights follow the updates' order).
+    """
+    def load(update):
+        if isinstance(update, (str, os.PathLike)):
+            return load_deltas(str(update))
+        return decode_deltas(update) if is_encoded(update) else update
+
+    if not any(isinstance(update, (str, os.PathLike)) for update in updates):
+        prefetch = 0  # nothing to read, no need for threads
+    loaded = []
+    for update, deltas, error in prefetch_peer_artifacts(updates, load, prefetch):
+        if error is not None:
+            raise ValueError(f"Unable to load participant update {update}: {error}")
+        loaded.append(deltas)
+    return loaded
+
+def aggregate_deltas(V, updates, weights=None, learning_rate=1.0, epsilon=1.0, clipping_threshold=0.5, prefetch=4):
+    """
+    Aggregate participant updates into one delta per item, with optional clipping and differential
+    privacy, without applying them (see `aggregate_item_factors` for the arguments).
 
     Returns:
-        np.ndarray: Updated global item factors.
+        dict: Aggregated delta of every item ID.
     """
+    updates = load_updates(updates, prefetch)
+
     # Step 1: Normalize weights (validates internally)
     normalized_weights = normalize_weights(weights, len(updates))
 
@@ -128,9 +149,31 @@ def aggregate_item_factors(V, updates, weights=None, learning_rate=1.0, epsilon=
     if epsilon and epsilon > 0:
         aggregated_delta = add_differential_privacy_noise(aggregated_delta, epsilon, clipping_threshold)
 
+    return aggregated_delta
+
+def aggregate_item_factors(V, updates, weights=None, learning_rate=1.0, epsilon=1.0, clipping_threshold=0.5, prefetch=4):
+    """
+    Perform aggregation of participant updates with optional clipping and differential privacy.
+
+    Args:
+        V (np.ndarray): Current global item factors.
+        updates (list[dict]): List of delta dictionaries from participants. Encoded payloads
+            (see `encode_deltas`) are decoded transparently, and paths of uploaded delta files
+            are loaded (see `load_updates`).
+        weights (list[float]): List of weights for each participant. If None, equal weights are assumed.
+        learning_rate (float): Scaling factor for the aggregated deltas.
+        epsilon (float): Privacy budget for differential privacy.
+        clipping_threshold (float): Clipping threshold for updates.
+        prefetch (int): Number of delta files read ahead on background threads.
+
+    Returns:
+        np.ndarray: Updated global item factors.
+    """
+    aggregated_delta = aggregate_deltas(V, updates, weights, learning_rate, epsilon, clipping_threshold, prefetch)
+
     # Step 5: Update global item factors
     result = copy.deepcopy(V)
     for item_id, delta in aggregated_delta.items():
         result[item_id] += delta
 
-    return result
\ No newline at end of file
+    return result
@@ -1,47 +1,52 @@
 import numpy as np
 
-def initialize_item_factors(tv_vocab: dict, imdb_ratings: dict, latent_dim: int = 10, random_seed: int = 42) -> np.ndarray:
+def initialize_item_factors(tv_vocab: dict, imdb_ratings: dict, latent_dim: int = 10, random_seed: int = 42, dtype=np.float64) -> np.ndarray:
     """
     Initialize item factors using TV vocabulary and IMDB ratings.
+
+    All titles are mapped to their ratings in a single pass and the noise for the whole
+    matrix is drawn at once from a seeded `np.random.Generator`, so the result is reproducible
+    and independent of the global NumPy random state.
+
+    Args:
+        tv_vocab (dict): Mapping of TV series titles to item IDs.
+        imdb_ratings (dict): Mapping of titles to IMDB ratings.
+        latent_dim (int): Number of latent factors per item.
+        random_seed (int): Seed for the random generator.
+        dtype: Output dtype. Use `np.float32` to halve the memory of `V` for large catalogs.
+
+    Returns:
+        np.ndarray: Item factors matrix of shape (num_items, latent_dim) with unit-norm rows.
     """
-    np.random.seed(random_seed)
+    rng = np.random.default_rng(random_seed)
+    num_titles = len(tv_vocab)
     num_items = max(tv_vocab.values()) + 1
     default_rating = np.mean(list(imdb_ratings.values()))
-    V = np.zeros((num_items, latent_dim))
-    not_found = 0
 
-    for title, idx in tv_vocab.items():
-        rating = get_rating_with_fallback(title, imdb_ratings, default_rating)
-        V[idx] = generate_item_vector(rating, latent_dim)
-        if rating == default_rating:
-            not_found += 1
-
-    V = normalize_vectors(V)
-    print(f"Initialized item factors for {num_items} items. {not_found} items not found in IMDB data.")
-    return V
+    # Map every title to its rating (NaN marks the titles not found in IMDB data)
+    item_ids = np.fromiter(tv_vocab.values(), dtype=np.int64, count=num_titles)
+    ratings = np.fromiter((imdb_ratings.get(title, np.nan) for title in tv_vocab), dtype=np.float64, count=num_titles)
+    not_found = np.isnan(ratings)
+    ratings[not_found] = default_rating
+    ratings = ratings.astype(dtype)[:, np.newaxis]
 
-def get_rating_with_fallback(normalized_title: str, imdb_ratings: dict, default_rating: float) -> float:
-    """
-    Retrieve a rating or use the default.
-    """
-    return imdb_ratings.get(normalized_title, default_rating)
+    # Noise around the rating, clamped to +/- 20% of the rating
+    vectors = rng.standard_normal((num_titles, latent_dim), dtype=dtype)
+    vectors *= 0.2 * ratings
+    vectors += ratings
+    np.clip(vectors, 0.8 * ratings, 1.2 * ratings, out=vectors)
 
-def generate_item_vector(rating: float, latent_dim: int) -> np.ndarray:
-    """
-    Generate an item vector with noise, ensuring values stay within a defined range.
-    """
-    base_vector = np.full(latent_dim, rating)
-    noise = np.random.normal(scale=0.2 * rating, size=latent_dim)
-    vector = base_vector + noise
+    V = np.zeros((num_items, latent_dim), dtype=dtype)
+    V[item_ids] = vectors
 
-    # Clamp values to stay within reasonable bounds
-    min_val = rating - 0.2 * rating
-    max_val = rating + 0.2 * rating
-    return np.clip(vector, min_val, max_val)
+    V = normalize_vectors(V)
+    print(f"Initialized item factors for {num_items} items. {int(not_found.sum())} items not found in IMDB data.")
+    return V
 
 def normalize_vectors(V: np.ndarray) -> np.ndarray:
     """
-    Normalize rows of a matrix to unit length.
+    Normalize rows of a matrix to unit length. Zero rows are left as zeros.
     """
     norms = np.linalg.norm(V, axis=1, keepdims=True)
-    return np.divide(V, norms, where=(norms != 0))
\ No newline at end of file
+    out = np.zeros(V.shape, dtype=np.result_type(V.dtype, np.float32))
+    return np.divide(V, norms, out=out, where=(norms != 0))
@@ -0,0 +1,372 @@
+import os
+import time
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from participant.federated_learning.svd_participant_finetuning import perform_batched_local_training
+from participant.federated_learning.svd_dp import apply_differential_privacy
+from participant.federated_learning.svd_server_initialisation import initialize_item_factors
+from participant.federated_learning.svd_server_aggregation import aggregate_item_factors
+from participant.federated_learning.svd_recommendation import score_items, top_k_items
+from participant.federated_learning.svd_delta_codec import encode_deltas, payload_nbytes
+from participant.federated_learning.svd_round_controller import aggregated_delta_norm, noisy_validation_error
+from participant.federated_learning.svd_als import solve_user_vectors, item_sufficient_statistics, aggregate_item_statistics
+
+## ==================================================================================================
+## Synthetic Population
+## ==================================================================================================
+
+def generate_synthetic_population(num_users: int, num_items: int, latent_dim: int = 10, ratings_per_user: int = 20, test_fraction: float = 0.2, noise: float = 0.25, random_seed: int = 42) -> dict:
+    """
+    Generate a synthetic population of participants with ratings drawn from a low-rank model.
+
+    Ratings are 3 + (true user factors . true item factors) plus Gaussian noise, clipped to
+    [1, 5]. Item popularity follows a long tail, so a few items are rated by many users.
+
+    Returns:
+        dict: With keys
+            - "tv_vocab": title -> item ID, as published by the aggregator.
+            - "imdb_ratings": title -> public rating used to initialize V.
+            - "indptr", "item_ids", "ratings": training ratings in CSR layout (see `prepare_batched_training_data`).
+            - "test_indptr", "test_users", "test_items", "test_ratings": held-out ratings, in CSR layout.
+            - "true_scores": callable returning the noiseless scores of a block of users.
+    """
+    rng = np.random.default_rng(random_seed)
+    true_U = rng.normal(scale=latent_dim ** -0.25, size=(num_users, latent_dim))
+    true_V = rng.normal(scale=latent_dim ** -0.25, size=(num_items, latent_dim))
+
+    popularity = 1.0 / (np.arange(num_items) + 10.0)
+    popularity /= popularity.sum()
+    ratings_per_user = min(ratings_per_user, num_items)
+    num_test = int(round(ratings_per_user * test_fraction))
+
+    items = np.stack([rng.choice(num_items, size=ratings_per_user, replace=False, p=popularity) for _ in range(num_users)])
+    users = np.repeat(np.arange(num_users), ratings_per_user).reshape(items.shape)
+    ratings = 3 + np.einsum("uij,uij->ui", true_U[users], true_V[items]) + rng.normal(scale=noise, size=items.shape)
+    ratings = np.clip(ratings, 1, 5)
+
+    tv_vocab = {f"Item {i}": i for i in range(num_items)}
+    imdb_ratings = {title: float(r) for title, r in zip(tv_vocab, 2 * np.clip(3 + true_V.sum(axis=1), 1, 5))}
+
+    train = slice(num_test, None)
+    return {
+        "tv_vocab": tv_vocab,
+        "imdb_ratings": imdb_ratings,
+        "indptr": np.arange(num_users + 1, dtype=np.int64) * (ratings_per_user - num_test),
+        "item_ids": items[:, train].ravel(),
+        "ratings": ratings[:, train].ravel(),
+        "test_indptr": np.arange(num_users + 1, dtype=np.int64) * num_test,
+        "test_users": users[:, :num_test].ravel(),
+        "test_items": items[:, :num_test].ravel(),
+        "test_ratings": ratings[:, :num_test].ravel(),
+        "true_scores": lambda user_block: true_U[user_block] @ true_V.T,
+    }
+
+## ==================================================================================================
+## Participants (run in worker processes)
+## ==================================================================================================
+
+def train_participants(task: dict) -> dict:
+    """
+    Run one round of local training for a chunk of participants.
+
+    Each participant only receives the global V rows of the items it rated (as with the
+    published row shards) and trains independently. With method "sgd" the chunk is vectorized
+    with `perform_batched_local_training` and each participant uploads its deltas; with "als"
+    user vectors are solved in closed form and each participant uploads its item statistics.
+    Must stay a module-level function so that it can be sent to a process pool.
+
+    Returns:
+        dict: "updates" (one delta dict or statistics dict per participant), "U" (updated user
+        vectors), "bytes_down" and "bytes_up" (payload sizes a real participant would sync),
+        "validation_errors" (DP-noised held-out errors, if `validation_epsilon` is set) and
+        "residuals" (the participants' local error feedback, if `delta_encoding` is set).
+    """
+    np.random.seed(task["seed"])  # DP noise is drawn from the global random state
+    indptr, item_ids, ratings = task["indptr"], task["item_ids"], task["ratings"]
+    updates = []
+
+    if task["method"] == "als":
+        updated_U = solve_user_vectors(indptr, task["V_rows"], ratings, lambda_reg=task["lambda_reg"])
+        for u in range(len(indptr) - 1):
+            rows = slice(indptr[u], indptr[u + 1])
+            updates.append(item_sufficient_statistics(item_ids[rows], ratings[rows], updated_U[u], epsilon=task["epsilon"], noise_type=task["noise_type"]))
+        bytes_up = sum(update["item_ids"].nbytes + update["gram"].nbytes + update["rhs"].nbytes for update in updates)
+    else:
+        updated_V_rows, updated_U = perform_batched_local_training(
+            indptr, ratings, task["V_rows"], task["U"],
+            alpha=task["alpha"], lambda_reg=task["lambda_reg"], iterations=task["iterations"]
+        )
+        delta_rows = updated_V_rows - task["V_rows"]
+        residuals = list(task.get("residuals") or [None] * (len(indptr) - 1))
+
+        bytes_up = 0
+        for u in range(len(indptr) - 1):
+            rows = slice(indptr[u], indptr[u + 1])
+            delta_V = {int(item_id): delta for item_id, delta in zip(item_ids[rows], delta_rows[rows])}
+            if task["epsilon"]:
+                delta_V = apply_differential_privacy(delta_V, task["epsilon"], 0.36, noise_type=task["noise_type"])
+            if task.get("delta_encoding"):
+                delta_V, residuals[u] = encode_deltas(delta_V, task["delta_encoding"], top_k=task["top_k"], residual=residuals[u], random_seed=task["seed"] + u)
+                bytes_up += payload_nbytes(delta_V)
+            else:
+                bytes_up += sum(8 + delta.nbytes for delta in delta_V.values())
+            updates.append(delta_V)
+
+    validation_errors = []
+    if task.get("validation_epsilon"):
+        test_indptr = task["test_indptr"]
+        for u in range(len(test_indptr) - 1):
+            rows = slice(test_indptr[u], test_indptr[u + 1])
+            validation_errors.append(noisy_validation_error(updated_U[u], task["test_V_rows"][rows], task["test_ratings"][rows], epsilon=task["validation_epsilon"]))
+
+    return {
+        "updates": updates, "U": updated_U, "validation_errors": validation_errors,
+        "residuals": residuals if task.get("delta_encoding") and task["method"] == "sgd" else None,
+        "bytes_down": task["V_rows"].nbytes + task["test_V_rows"].nbytes, "bytes_up": bytes_up,
+    }
+
+def make_tasks(population: dict, V: np.ndarray, U: np.ndarray, chunk_size: int, round_seed: int, residuals: list = None, **training) -> list:
+    """
+    Split the participants into chunks and slice each chunk's ratings and V rows.
+    """
+    indptr, item_ids, ratings = population["indptr"], population["item_ids"], population["ratings"]
+    test_indptr, test_items = population["test_indptr"], population["test_items"]
+    num_users = len(indptr) - 1
+    tasks = []
+    for start in range(0, num_users, chunk_size):
+        stop = min(start + chunk_size, num_users)
+        entries = slice(indptr[start], indptr[stop])
+        test_entries = slice(test_indptr[start], test_indptr[stop])
+        tasks.append(dict(
+            training,
+            users=(start, stop),
+            indptr=indptr[start:stop + 1] - indptr[start],
+            item_ids=item_ids[entries],
+            ratings=ratings[entries],
+            V_rows=V[item_ids[entries]],
+            U=U[start:stop],
+            residuals=residuals[start:stop] if residuals else None,
+            test_indptr=test_indptr[start:stop + 1] - test_indptr[start],
+            test_ratings=population["test_ratings"][test_entries],
+            test_V_rows=V[test_items[test_entries]] if training.get("validation_epsilon") else V[:0],
+            seed=round_seed * 1_000_003 + start,
+        ))
+    return tasks
+
+## ==================================================================================================
+## Evaluation
+## ==================================================================================================
+
+def evaluate(population: dict, U: np.ndarray, V: np.ndarray, k: int = 10, block_size: int = 1024, max_block_scores: int = 1 << 22) -> dict:
+    """
+    Recommendation quality of the current model.
+
+    Users are scored in blocks of at most `block_size` users and `max_block_scores` scores, so
+    memory stays bounded whatever the catalog size. The items a user rated are excluded by
+    setting their scores to -inf in place (a sparse mask), rather than with a dense boolean
+    mask of the block.
+
+    Returns:
+        dict: "rmse" on the held-out ratings, and "precision_at_k": the share of each user's
+        top-k recommendations (excluding the items they rated) that are among their true top-k.
+    """
+    errors = population["test_ratings"] - np.einsum("ij,ij->i", U[population["test_users"]], V[population["test_items"]])
+    rmse = float(np.sqrt(np.mean(errors ** 2))) if len(errors) else float("nan")
+
+    indptr, item_ids = population["indptr"], population["item_ids"]
+    num_users = len(indptr) - 1
+    block_size = max(1, min(block_size, max_block_scores // max(len(V), 1)))
+    hits = 0
+    for start in range(0, num_users, block_size):
+        stop = min(start + block_size, num_users)
+        rated_rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+        rated_items = item_ids[indptr[start]:indptr[stop]]
+
+        scores = score_items(U[start:stop], V)
+        scores[rated_rows, rated_items] = -np.inf
+        recommended, _ = top_k_items(scores, k)
+        del scores
+
+        true_scores = population["true_scores"](np.arange(start, stop))
+        true_scores[rated_rows, rated_items] = -np.inf
+        relevant = np.argpartition(-true_scores, k - 1, axis=1)[:, :k]
+        hits += sum(len(np.intersect1d(r, t)) for r, t in zip(recommended, relevant))
+
+    return {"rmse": rmse, "precision_at_k": hits / (num_users * k) if num_users else float("nan")}
+
+## ==================================================================================================
+## Simulation
+## ==================================================================================================
+
+def run_simulation(num_users: int = 1000, num_items: int = 2000, rounds: int = 5, latent_dim: int = 10, ratings_per_user: int = 20,
+                   max_workers: int = None, chunk_size: int = 100, epsilon: float = None, noise_type: str = "gaussian",
+                   server_epsilon: float = None, clipping_threshold: float = None, alpha: float = 0.01, lambda_reg: float = 0.1,
+                   iterations: int = 10, method: str = "sgd", controller=None, validation_epsilon: float = None,
+                   delta_encoding: str = None, top_k: int = None, k: int = 10, random_seed: int = 42) -> list:
+    """
+    Simulate federated SVD rounds with synthetic participants, entirely in memory.
+
+    Every round, each participant fine-tunes its user vector and the V rows of the items it
+    rated (as `participant_fine_tuning` does, minus the disk I/O), optionally adds DP noise to
+    its deltas, and the server merges them with `aggregate_item_factors`. With method "als",
+    participants solve their user vectors in closed form and the server solves the item rows
+    from their statistics with `aggregate_item_statistics` instead. Participants are trained
+    in chunks spread over a process pool.
+
+    Args:
+        num_users (int): Number of synthetic participants.
+        num_items (int): Number of items in the catalog.
+        rounds (int): Number of federated rounds.
+        max_workers (int, optional): Size of the process pool. 0 trains in the current process.
+        chunk_size (int): Number of participants per task sent to a worker.
+        epsilon (float, optional): Participant-side DP budget (no noise if None).
+        server_epsilon (float, optional): Server-side DP budget passed to `aggregate_item_factors`.
+        clipping_threshold (float, optional): Server-side clipping threshold (SGD only).
+        method (str): "sgd" or "als".
+        controller (RoundController, optional): Sets the SGD learning rate from the aggregated
+            progress signals and stops the simulation early once it pauses training.
+        validation_epsilon (float, optional): If set, participants report their held-out error
+            with this DP budget, and the controller uses it as its progress signal.
+        delta_encoding (str, optional): Upload the SGD deltas encoded (see `encode_deltas`).
+        top_k (int, optional): Maximum number of rows per encoded upload.
+        k (int): Number of recommendations used for precision@k.
+
+    Returns:
+        list[dict]: One report per round (index 0 is the initial model) with wall times,
+        peak aggregator memory, bytes synced and recommendation quality.
+    """
+    if method not in ("sgd", "als"):
+        raise ValueError("Invalid method. Use 'sgd' or 'als'.")
+
+    population = generate_synthetic_population(num_users, num_items, latent_dim, ratings_per_user, random_seed=random_seed)
+    V = initialize_item_factors(population["tv_vocab"], population["imdb_ratings"], latent_dim=latent_dim, random_seed=random_seed)
+    U = np.random.default_rng(random_seed).normal(scale=0.01, size=(num_users, latent_dim))
+    training = dict(method=method, validation_epsilon=validation_epsilon, delta_encoding=delta_encoding, top_k=top_k, epsilon=epsilon, noise_type=noise_type, alpha=alpha, lambda_reg=lambda_reg, iterations=iterations)
+
+    residuals = [None] * num_users
+    reports = [dict(round=0, **evaluate(population, U, V, k=k))]
+    pool = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 0 else None
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for round_id in range(1, rounds + 1):
+            if controller is not None and not controller.should_run_round():
+                break
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+
+            tasks = make_tasks(population, V, U, chunk_size, round_id, residuals=residuals, **training)
+            results = pool.map(train_participants, tasks) if pool else map(train_participants, tasks)
+            updates, validation_errors, bytes_down, bytes_up = [], [], 0, 0
+            for task, result in zip(tasks, results):
+                updates.extend(result["updates"])
+                validation_errors.extend(result["validation_errors"])
+                U[task["users"][0]:task["users"][1]] = result["U"]
+                if result["residuals"] is not None:
+                    residuals[task["users"][0]:task["users"][1]] = result["residuals"]
+                bytes_down += result["bytes_down"]
+                bytes_up += result["bytes_up"]
+            training_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            previous_V = V
+            if method == "als":
+                V = aggregate_item_statistics(V, updates, lambda_reg=lambda_reg)
+            else:
+                learning_rate = controller.learning_rate if controller is not None else 1.0
+                V = aggregate_item_factors(V, updates, learning_rate=learning_rate, epsilon=server_epsilon, clipping_threshold=clipping_threshold)
+            aggregation_time = time.perf_counter() - start
+            if controller is not None:
+                controller.record_round(aggregated_delta_norm(previous_V, V), validation_errors)
+
+            reports.append(dict(
+                round=round_id,
+                training_time=training_time,
+                aggregation_time=aggregation_time,
+                peak_memory_mb=tracemalloc.get_traced_memory()[1] / 2 ** 20,
+                bytes_down=bytes_down,
+                bytes_up=bytes_up,
+                **evaluate(population, U, V, k=k),
+            ))
+    finally:
+        if pool:
+            pool.shutdown()
+        if not tracing:
+            tracemalloc.stop()
+    return reports
+
+def print_simulation_report(reports: list):
+    """
+    Print one line per round of a simulation report.
+    """
+    for report in reports:
+        line = f"Round {report['round']:3d}: RMSE {report['rmse']:.4f}, precision@k {report['precision_at_k']:.4f}"
+        if report["round"] > 0:
+            line += (
+                f", train {report['training_time']:.2f}s, aggregate {report['aggregation_time']:.2f}s"
+                f", peak memory {report['peak_memory_mb']:.1f} MB"
+                f", down {report['bytes_down'] / 2 ** 20:.2f} MB, up {report['bytes_up'] / 2 ** 20:.2f} MB"
+            )
+        print(line)
+
+def rounds_to_convergence(reports: list, target_rmse: float):
+    """
+    First round whose held-out RMSE is at or below `target_rmse`, or None if never reached.
+    """
+    return next((report["round"] for report in reports if report["rmse"] <= target_rmse), None)
+
+def compare_training_methods(rounds: int = 20, target_rmse: float = None, **kwargs) -> dict:
+    """
+    Benchmark SGD against ALS on the same synthetic population.
+
+    Without `target_rmse`, the target is the best RMSE reached by SGD within `rounds`, plus 1%.
+
+    Returns:
+        dict: Per method, its reports and the number of rounds needed to reach the target.
+    """
+    reports = {method: run_simulation(rounds=rounds, method=method, **kwargs) for method in ("sgd", "als")}
+    if target_rmse is None:
+        target_rmse = 1.01 * min(report["rmse"] for report in reports["sgd"])
+    return {
+        method: {"reports": method_reports, "rounds_to_target": rounds_to_convergence(method_reports, target_rmse), "target_rmse": target_rmse}
+        for method, method_reports in reports.items()
+    }
+
+def compare_delta_encodings(configurations: list = None, rounds: int = 5, **kwargs) -> dict:
+    """
+    Benchmark delta upload encodings against uncompressed float64 deltas on the same population.
+
+    Args:
+        configurations (list[tuple], optional): (encoding, top_k) pairs to compare.
+
+    Returns:
+        dict: Per configuration name, its total upload bytes, compression ratio, and the change
+        in final RMSE and precision@k relative to the uncompressed baseline.
+    """
+    configurations = configurations or [("float32", None), ("float16", None), ("int8", None), ("int8", 8)]
+    baseline = run_simulation(rounds=rounds, **kwargs)
+    baseline_bytes = sum(report["bytes_up"] for report in baseline[1:])
+
+    results = {}
+    for encoding, top_k in configurations:
+        reports = run_simulation(rounds=rounds, delta_encoding=encoding, top_k=top_k, **kwargs)
+        bytes_up = sum(report["bytes_up"] for report in reports[1:])
+        results[encoding if top_k is None else f"{encoding}+top{top_k}"] = {
+            "reports": reports,
+            "bytes_up": bytes_up,
+            "compression": baseline_bytes / bytes_up,
+            "rmse_change": reports[-1]["rmse"] - baseline[-1]["rmse"],
+            "precision_change": reports[-1]["precision_at_k"] - baseline[-1]["precision_at_k"],
+        }
+    return results
+
+if __name__ == "__main__":
+    comparison = compare_training_methods(num_users=int(os.getenv("SIM_USERS", 1000)), num_items=int(os.getenv("SIM_ITEMS", 2000)))
+    for method, result in comparison.items():
+        print(f"{method.upper()}: target RMSE {result['target_rmse']:.4f} reached after {result['rounds_to_target']} rounds")
+        print_simulation_report(result["reports"])
+
+    for name, result in compare_delta_encodings(num_users=int(os.getenv("SIM_USERS", 1000)), num_items=int(os.getenv("SIM_ITEMS", 2000))).items():
+        print(f"{name}: {result['compression']:.1f}x smaller uploads, RMSE {result['rmse_change']:+.4f}, precision@k {result['precision_change']:+.4f}")
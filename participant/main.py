@@ -3,17 +3,19 @@ import sys
 import numpy as np
 from pathlib import Path
 from syftbox.lib import Client
-from participant_utils.checks import should_run
-from participant_utils.syftbox import setup_environment
-from participant_utils.data_loading import load_csv_to_numpy, get_or_download_latest_data
+from participant.participant_utils.checks import should_run
+from participant.participant_utils.syftbox import setup_environment
+from participant.participant_utils.data_loading import load_csv_to_numpy, get_or_download_latest_data
+from participant.participant_utils.viewing_history import parse_viewing_history
 
 # Package functions
-from loaders.netflix_loader import participants_datasets
-import federated_analytics.data_processing as fa
-import federated_learning.mlp_model as mlp
-from federated_learning.sequence_data import SequenceData
-from federated_learning.sequence_data import create_view_counts_vector
-from federated_analytics.dp_series import run_top5_dp
+from participant.loaders.netflix_loader import participants_datasets
+import participant.federated_analytics.data_processing as fa
+import participant.federated_learning.mlp_model as mlp
+from participant.federated_learning.sequence_data import SequenceData
+from participant.federated_learning.sequence_data import create_view_counts_vector
+from participant.federated_analytics.dp_series import run_top5_dp
+from participant.federated_analytics.phe_encryption import run_top5_phe
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -25,9 +27,9 @@ NETFLIX_PROFILE = os.getenv("NETFLIX_PROFILE", None)
 NETFLIX_PROFILES = os.getenv("NETFLIX_PROFILES", NETFLIX_PROFILE)
 
 
-def run_federated_analytics(restricted_public_folder, private_folder, viewing_history):
+def run_federated_analytics(restricted_public_folder, private_folder, viewing_history, parsed_history=None):
     # Reduce and aggregate the original information
-    reduced_history = fa.orchestrate_reduction(viewing_history)
+    reduced_history = fa.orchestrate_reduction(viewing_history, parsed_history)
     aggregated_history = fa.aggregate_title_week_counts(reduced_history)
 
     # For Debugging: Filter rows where index 1 is "Avatar"
@@ -53,20 +55,21 @@ def run_federated_analytics(restricted_public_folder, private_folder, viewing_hi
     fa.save_npy_data(private_folder, "data_full.npy", my_shows_data)
     fa.save_npy_data(private_folder, "ratings.npy", ratings_dict)
 
-def run_federated_learning(aggregator_path, restricted_public_folder, private_folder, viewing_history, latest_data_file, datasite_parent_path):
+def run_federated_learning(aggregator_path, restricted_public_folder, private_folder, viewing_history, latest_data_file, datasite_parent_path, parsed_history=None):
     netflix_file_path = 'data/netflix_titles.csv'
     netflix_show_data = load_csv_to_numpy(netflix_file_path)
 
     # Useful for Embeddings and more complex learning
     my_shows_data = fa.join_viewing_history_with_netflix(viewing_history, netflix_show_data)
 
-    # Train and save MLP model
-    mlp.train_and_save_mlp(latest_data_file, restricted_public_folder)
+    # Train and save MLP model, continuing from the aggregator's FedAvg model when available
+    shared_folder = Path(datasite_parent_path) / aggregator_path / "api_data" / API_NAME
+    mlp.train_and_save_mlp(latest_data_file, restricted_public_folder, shared_folder=shared_folder, parsed_history=parsed_history, private_folder=private_folder)
 
     # Create a sequence data (filter by > 1 episodes)
     # Columns: series (TV series title), Total_Views (quantity), First_Seen (datetime)
     # - loaded with the original NetflixViewingHistory.csv
-    sequence_recommender = SequenceData(viewing_history)
+    sequence_recommender = SequenceData(parsed_history if parsed_history is not None else viewing_history)
         
     view_counts_vector = create_view_counts_vector(aggregator_path, sequence_recommender.aggregated_data, datasite_parent_path)
     private_tvseries_views_file: Path = private_folder / "tvseries_views_sparse_vector.npy"
@@ -105,10 +108,15 @@ def main():
                 print(f"[Error] to load retrieved path for NetflixViewingHistory.csv from datasets.yaml \n{e}")
                 sys.exit(1)
 
+        # Parse titles and dates once for every process below
+        parsed_history = parse_viewing_history(viewing_history)
+
         # Run private processes and write to public/private/restricted directories
-        run_federated_analytics(restricted_public_folder, private_folder, viewing_history)
-        run_federated_learning(AGGREGATOR_DATASITE, restricted_public_folder, private_folder, viewing_history, latest_data_file, client.datasite_path.parent)
+        run_federated_analytics(restricted_public_folder, private_folder, viewing_history, parsed_history)
+        run_federated_learning(AGGREGATOR_DATASITE, restricted_public_folder, private_folder, viewing_history, latest_data_file, client.datasite_path.parent, parsed_history)
         run_top5_dp(private_folder / "tvseries_views_sparse_vector.npy", restricted_public_folder, verbose=False)
+        shared_folder = Path(client.datasite_path.parent) / AGGREGATOR_DATASITE / "api_data" / API_NAME
+        run_top5_phe(private_folder / "tvseries_views_sparse_vector.npy", restricted_public_folder, shared_folder)
         ##############
 
 if __name__ == "__main__":
@@ -1,22 +1,22 @@
 import os
 import sys
-import json
 import numpy as np
 import csv
 from typing import Tuple
 from datetime import datetime
 from syftbox.lib import Client
 import subprocess
-from loaders.netflix_loader import download_daily_data, get_latest_file
+from participant.loaders.netflix_loader import download_daily_data, get_latest_file
+from common.vocabulary import load_vocabulary
 
 API_NAME = os.getenv("API_NAME")
 
 def load_tv_vocabulary(vocabulary_path):
     """
-    Load the TV series vocabulary from the specified JSON file.
+    Load the TV series vocabulary from the specified JSON (or binary) file, as the process-wide
+    `Vocabulary` (see `load_vocabulary`).
     """
-    with open(vocabulary_path, "r") as f:
-        return json.load(f)
+    return load_vocabulary(vocabulary_path)
 
 def load_participant_ratings(private_folder):
     """
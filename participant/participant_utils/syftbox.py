@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from syftbox.lib import Client, SyftPermission
-from participant_utils.checks import should_run
+from participant.participant_utils.checks import should_run
 
 API_NAME = os.getenv("API_NAME")
 
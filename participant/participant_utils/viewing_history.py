@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+SEASON_PATTERN = r"Season (\d+)"
+DATE_FORMAT = "%d/%m/%Y"
+
+def parse_titles(titles) -> pd.DataFrame:
+    """
+    Parse Netflix titles ("Show: Season 1: Episode") in one vectorized pass.
+
+    Args:
+        titles: Sequence of titles.
+
+    Returns:
+        pd.DataFrame: Columns "show" (text before the first ':'), "season" (int, 0 if none)
+                      and "episode" (whether the title has a part after the show, e.g. an episode).
+    """
+    titles = pd.Series(np.asarray(titles, dtype=str), dtype=object)
+    parts = titles.str.split(":", n=1)
+    return pd.DataFrame({
+        "show": parts.str[0],
+        "season": titles.str.extract(SEASON_PATTERN, expand=False).fillna(0).astype(int),
+        "episode": parts.str.len() > 1,
+    })
+
+def parse_dates(dates) -> pd.DataFrame:
+    """
+    Parse viewing dates (dd/mm/YYYY) in one vectorized pass.
+
+    Returns:
+        pd.DataFrame: Columns "Date" (datetime64), "day_of_week" (0 = Monday) and "week" (ISO week).
+    """
+    parsed = pd.to_datetime(pd.Series(np.asarray(dates, dtype=str)), format=DATE_FORMAT)
+    return pd.DataFrame({
+        "Date": parsed,
+        "day_of_week": parsed.dt.dayofweek,
+        "week": parsed.dt.isocalendar().week.astype(int),
+    })
+
+def parse_viewing_history(history) -> pd.DataFrame:
+    """
+    Parse a viewing history once, for every consumer of its titles and dates
+    (MLP features, sequence data and the analytics reduction).
+
+    Args:
+        history: (n, 2) array of [Title, Date] rows, or a DataFrame with "Title" and "Date" columns.
+
+    Returns:
+        pd.DataFrame: "Title" plus the columns of `parse_titles` and `parse_dates`, in history order.
+    """
+    if isinstance(history, pd.DataFrame):
+        titles, dates = history["Title"].to_numpy(), history["Date"].to_numpy()
+    else:
+        history = np.asarray(history)
+        titles, dates = history[:, 0], history[:, 1]
+
+    parsed = pd.concat([parse_titles(titles), parse_dates(dates)], axis=1)
+    parsed.insert(0, "Title", np.asarray(titles, dtype=str))
+    return parsed
+
+def is_parsed_history(data) -> bool:
+    return isinstance(data, pd.DataFrame) and {"show", "season", "Date", "day_of_week"} <= set(data.columns)
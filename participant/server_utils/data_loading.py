@@ -1,23 +1,21 @@
 import os
-import json
 import numpy as np
+from common.vocabulary import load_vocabulary, normalize_string
 
 def load_tv_vocabulary(tv_series_path):
     """
-    Load TV series vocabulary from a JSON file.
+    Load TV series vocabulary from a JSON (or binary) file, once per process (see `load_vocabulary`).
 
     Args:
         tv_series_path (str): Path to the JSON file.
 
     Returns:
-        dict: A dictionary mapping TV series titles to item IDs.
+        Vocabulary: A read-only mapping of TV series titles to item IDs.
     """
     if not os.path.isfile(tv_series_path):
         raise FileNotFoundError(f"TV series vocabulary file not found: {tv_series_path}")
     
-    with open(tv_series_path, "r") as f:
-        tv_vocab = json.load(f)
-    return tv_vocab
+    return load_vocabulary(tv_series_path)
 
 def load_imdb_ratings(imdb_ratings_path):
     """
@@ -36,18 +34,6 @@ def load_imdb_ratings(imdb_ratings_path):
     imdb_ratings = {normalize_string(title): float(rating) for title, rating in imdb_data.items() if rating}
     return imdb_ratings
 
-def normalize_string(s):
-    """
-    Normalize a string by removing zero-width spaces and converting to lowercase.
-
-    Args:
-        s (str): The input string.
-
-    Returns:
-        str: The normalized string.
-    """
-    return s.replace('\u200b', '').lower()
-
 def load_global_item_factors(path):
     """
     Load the global item factors matrix from the given path.
@@ -0,0 +1,151 @@
+import shutil
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from pathlib import Path
+from aggregator.utils.contribution_cache import ContributionCache
+from common.mlp_params import save_mlp_params
+from aggregator.pets.fedavg_mlp import mlp_fedavg, mlp_fedavg_cached
+
+SANDBOX = Path("test_sandbox/contribution_cache")
+
+def load_vector(path):
+    return {"totals": np.load(path)}
+
+class TestContributionCache(unittest.TestCase):
+
+    def setUp(self):
+        if SANDBOX.exists():
+            shutil.rmtree(SANDBOX)
+        (SANDBOX / "peers").mkdir(parents=True)
+
+    def tearDown(self):
+        shutil.rmtree(SANDBOX)
+
+    def write_vector(self, peer, values):
+        path = SANDBOX / "peers" / f"{peer}.npy"
+        np.save(path, np.array(values, dtype=float))
+        return str(path)
+
+    def test_incremental_updates(self):
+        files = {peer: self.write_vector(peer, values) for peer, values in [("a", [1, 2]), ("b", [10, 20]), ("c", [100, 200])]}
+        cache = ContributionCache(SANDBOX / "cache", growable=["totals"])
+        report = cache.update(files, load_vector)
+        self.assertEqual(sorted(report["added"]), ["a", "b", "c"])
+        np.testing.assert_array_equal(cache.sums["totals"], [111, 222])
+
+        # Unchanged peers are not decoded again, even from a new cache instance
+        decode = MagicMock(side_effect=load_vector)
+        self.write_vector("b", [30, 40, 50])
+        del files["c"]
+        cache = ContributionCache(SANDBOX / "cache", growable=["totals"])
+        report = cache.update(files, decode)
+        self.assertEqual(report["unchanged"], ["a"])
+        self.assertEqual(report["updated"], ["b"])
+        self.assertEqual(report["removed"], ["c"])
+        decode.assert_called_once_with(files["b"])
+        np.testing.assert_array_equal(cache.sums["totals"], [31, 42, 50])
+
+    def test_sums_are_rebuilt(self):
+        files = {peer: self.write_vector(peer, [0.1, 0.2]) for peer in ["a", "b"]}
+        cache = ContributionCache(SANDBOX / "cache", rebuild_every=2)
+        cache.update(files, load_vector)
+        cache.sums["totals"] += 1e-9  # drift
+        report = cache.update(files, load_vector)
+        self.assertFalse(report["changed"])
+        self.assertEqual(cache.changes_since_rebuild, 0)
+
+        # Updated contributions are counted, and the sums recomputed from scratch past `rebuild_every`
+        for value in [0.3, 0.4]:
+            self.write_vector("a", [value, value])
+            report = cache.update(files, load_vector)
+            self.assertTrue(report["changed"])
+        self.assertEqual(cache.changes_since_rebuild, 0)
+        np.testing.assert_array_equal(cache.sums["totals"], np.array([0.4, 0.4]) + np.array([0.1, 0.2]))
+        self.assertEqual(ContributionCache(SANDBOX / "cache").changes_since_rebuild, 0)
+
+        # A peer joining is only added: no stored contribution is reloaded
+        files["c"] = self.write_vector("c", [1.0, 1.0])
+        with patch.object(cache, "load_contribution", wraps=cache.load_contribution) as load:
+            report = cache.update(files, load_vector)
+        self.assertEqual(report["added"], ["c"])
+        load.assert_not_called()
+        np.testing.assert_array_almost_equal(cache.sums["totals"], [1.5, 1.6])
+        del files["c"]
+
+        # A peer leaving triggers a rebuild
+        cache.sums["totals"] += 1e-9
+        del files["b"]
+        cache.update(files, load_vector)
+        np.testing.assert_array_equal(cache.sums["totals"], [0.4, 0.4])
+
+    def test_mismatched_contribution_is_rejected(self):
+        files = {"a": self.write_vector("a", [1, 2])}
+        cache = ContributionCache(SANDBOX / "cache")
+        cache.update(files, load_vector)
+
+        files["b"] = self.write_vector("b", [1, 2, 3])
+        report = cache.update(files, load_vector)
+        self.assertEqual([peer for peer, _ in report["failed"]], ["b"])
+        np.testing.assert_array_equal(cache.sums["totals"], [1, 2])
+        self.assertEqual(len(cache), 1)
+
+    def test_indexed_contributions(self):
+        cache = ContributionCache(SANDBOX / "cache")
+        cache.apply({"units": (np.array([[1.0, 2.0]]), np.array([0, 3]))})
+        cache.apply({"units": (np.array([[5.0]]), np.array([5]))})
+        np.testing.assert_array_equal(cache.sums["units"], [[1, 0, 0, 2, 0, 5]])
+        cache.apply({"units": (np.array([[1.0, 2.0]]), np.array([0, 3]))}, sign=-1)
+        np.testing.assert_array_equal(cache.sums["units"], [[0, 0, 0, 0, 0, 5]])
+
+    def test_cached_fedavg_matches_fedavg(self):
+        rng = np.random.default_rng(0)
+        paths = []
+        for i, (n, classes) in enumerate([(3, [0, 4]), (5, [4]), (2, [1, 2, 4])]):
+            path = SANDBOX / "peers" / f"user{i}.npz"
+            save_mlp_params(path, [rng.normal(size=(3, 6)), rng.normal(size=(6, len(classes)))], [rng.normal(size=6), rng.normal(size=len(classes))], num_samples=n, classes=classes)
+            paths.append(path)
+        previous = ([np.zeros((3, 6)), np.ones((6, 7))], [np.zeros(6), np.ones(7)])
+
+        expected = mlp_fedavg(paths, previous=previous, num_classes=7)
+        cache = ContributionCache(SANDBOX / "cache")
+        for _ in range(2):  # the second tick only reuses cached contributions
+            weights, biases = mlp_fedavg_cached(cache, paths, previous=previous, num_classes=7)
+            for actual, wanted in zip(weights + biases, expected[0] + expected[1]):
+                np.testing.assert_array_almost_equal(actual, wanted)
+
+    def test_cached_fedavg_only_if_changed(self):
+        path = SANDBOX / "peers" / "user.npz"
+        save_mlp_params(path, [np.ones((3, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=2)
+        cache = ContributionCache(SANDBOX / "cache")
+        self.assertIsNotNone(mlp_fedavg_cached(cache, [path], only_if_changed=True))
+        self.assertIsNone(mlp_fedavg_cached(cache, [path], only_if_changed=True))
+        self.assertIsNotNone(mlp_fedavg_cached(cache, [path]))
+
+    def test_cached_fedavg_without_samples(self):
+        path = SANDBOX / "peers" / "empty.npz"
+        save_mlp_params(path, [np.ones((3, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=0)
+        with self.assertRaises(ValueError):
+            mlp_fedavg_cached(ContributionCache(SANDBOX / "cache"), [path])
+
+    def test_cached_fedavg_dense_uploads(self):
+        """Dense uploads are skipped next to vocabulary-aligned ones, and must share one output width."""
+        sparse, dense, wider = (SANDBOX / "peers" / f"{name}.npz" for name in ["sparse", "dense", "wider"])
+        save_mlp_params(sparse, [np.ones((3, 4)), np.ones((4, 1))], [np.ones(4), np.ones(1)], num_samples=1, classes=[2])
+        save_mlp_params(dense, [np.full((3, 4), 5.0), np.full((4, 2), 5.0)], [np.full(4, 5.0), np.full(2, 5.0)], num_samples=3)
+        save_mlp_params(wider, [np.ones((3, 4)), np.ones((4, 3))], [np.ones(4), np.ones(3)], num_samples=1)
+
+        cache = ContributionCache(SANDBOX / "cache")
+        weights, _ = mlp_fedavg_cached(cache, [sparse, dense], num_classes=4)
+        np.testing.assert_array_almost_equal(weights[0], np.ones((3, 4)))
+        expected = mlp_fedavg([sparse, dense], num_classes=4)
+        np.testing.assert_array_almost_equal(weights[1], expected[0][1])
+
+        cache = ContributionCache(SANDBOX / "dense_cache")
+        weights, biases = mlp_fedavg_cached(cache, [dense, wider])
+        self.assertEqual(weights[1].shape, (4, 2))
+        np.testing.assert_array_almost_equal(biases[1], np.full(2, 5.0))
+        self.assertEqual(len(cache), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,8 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import json
+import shutil
+from common.vocabulary import write_binary_vocab
 from participant.federated_learning.sequence_data import match_title, create_view_counts_vector
 
 class TestDataProcessingViewCountVectors(unittest.TestCase):
@@ -71,6 +73,45 @@ class TestDataProcessingViewCountVectors(unittest.TestCase):
         expected = np.array([0, 0, 10, 18])  # Top Gear: 6 + 4, South Park: 18
         np.testing.assert_array_equal(result, expected)
 
+    def test_create_view_counts_vector_binary_vocabulary(self):
+        """
+        Test creation of view counts vector from a binary vocabulary (exact and fuzzy matches).
+        """
+        aggregated_data = pd.DataFrame({
+            "show": ["Top Gear", "South Park", "Top Gearr", "Unknown Show"],
+            "Total_Views": [6, 18, 4, 5],
+        })
+        parent_path = Path("test_sandbox")
+        datasite_path = "aggregator_datasite_binary"
+        vocabulary_dir = os.path.join(str(parent_path), datasite_path, "api_data", "netflix_data")
+        os.makedirs(vocabulary_dir, exist_ok=True)
+        write_binary_vocab(os.path.join(vocabulary_dir, "tv-series_vocabulary.bin"), ["#ABTalks", "#NoFilter", "South Park", "Top Gear"])
+        try:
+            result = create_view_counts_vector(datasite_path, aggregated_data, parent_path)
+        finally:
+            shutil.rmtree(os.path.join(str(parent_path), datasite_path))
+
+        np.testing.assert_array_equal(result, [0, 0, 18, 10])
+
+    def test_create_view_counts_vector_unreadable_vocabulary(self):
+        """
+        Test that an unreadable published vocabulary falls back to the bundled one.
+        """
+        aggregated_data = pd.DataFrame({"show": ["Unknown Show"], "Total_Views": [5]})
+        parent_path = Path("test_sandbox")
+        datasite_path = "aggregator_datasite_corrupt"
+        vocabulary_dir = os.path.join(str(parent_path), datasite_path, "api_data", "netflix_data")
+        os.makedirs(vocabulary_dir, exist_ok=True)
+        with open(os.path.join(vocabulary_dir, "tv-series_vocabulary.bin"), "wb") as f:
+            f.write(b"not a vocabulary" * 4)
+        try:
+            result = create_view_counts_vector(datasite_path, aggregated_data, parent_path)
+        finally:
+            shutil.rmtree(os.path.join(str(parent_path), datasite_path))
+
+        with open("./aggregator/data/tv-series_vocabulary.json", "r", encoding="utf-8") as f:
+            self.assertEqual(len(result), len(json.load(f)))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,74 @@
+import os
+import time
+import shutil
+import unittest
+import numpy as np
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from participant.federated_learning import mlp_recommendation
+from participant.federated_learning.mlp_recommendation import (
+    save_local_model,
+    load_model,
+    forward,
+    recommend_batch,
+)
+from common.mlp_params import save_mlp_params, FEDAVG_PARAMS_FILE
+
+class TestMLPRecommendation(unittest.TestCase):
+
+    def setUp(self):
+        self.private_folder = "test_sandbox/mlp_recommendation/private"
+        self.shared_folder = "test_sandbox/mlp_recommendation/shared"
+        os.makedirs(self.private_folder, exist_ok=True)
+        os.makedirs(self.shared_folder, exist_ok=True)
+
+        rng = np.random.default_rng(0)
+        X = np.column_stack((rng.integers(0, 4, 80), rng.integers(0, 3, 80), rng.integers(0, 7, 80))).astype(float)
+        y = rng.integers(0, 4, 80)
+        self.scaler = StandardScaler().fit(X)
+        self.le_show = LabelEncoder().fit(["Show A", "Show B", "Show C", "Show D"])
+        self.mlp = MLPClassifier(hidden_layer_sizes=(8, 4), max_iter=50, random_state=0).fit(self.scaler.transform(X), y)
+        save_local_model(self.private_folder, self.mlp, self.scaler, self.le_show)
+
+    def tearDown(self):
+        shutil.rmtree("test_sandbox/mlp_recommendation")
+
+    def test_forward_matches_sklearn(self):
+        X = self.scaler.transform(np.array([[0, 1, 2], [3, 0, 6], [1, 2, 0]], dtype=float))
+        np.testing.assert_array_almost_equal(forward(self.mlp.coefs_, self.mlp.intercepts_, X), self.mlp.predict_proba(X))
+
+    def test_recommend_batch(self):
+        titles = ["Show A: Season 1: Episode 1", "Unknown Show", "Show C"]
+        results = recommend_batch(titles, self.private_folder, k=2, day_of_week=3)
+
+        self.assertIsNone(results[1])
+        X = self.scaler.transform(np.array([[0, 1, 3], [2, 0, 3]], dtype=float))
+        expected = self.mlp.predict_proba(X)
+        for result, probabilities in zip([results[0], results[2]], expected):
+            self.assertEqual(len(result), 2)
+            self.assertEqual(result[0][0], self.le_show.classes_[np.argmax(probabilities)])
+            self.assertAlmostEqual(result[0][1], probabilities.max())
+            self.assertGreaterEqual(result[0][1], result[1][1])
+
+    def test_model_cache_follows_mtime(self):
+        coefs, _, _ = load_model(self.private_folder)
+        self.assertIs(load_model(self.private_folder)[0], coefs)
+
+        # A newer FedAvg model with the same layout takes over
+        fedavg_path = os.path.join(self.shared_folder, FEDAVG_PARAMS_FILE)
+        save_mlp_params(fedavg_path, [c * 0 for c in self.mlp.coefs_], self.mlp.intercepts_)
+        os.utime(fedavg_path, (time.time() + 10, time.time() + 10))
+        fedavg_coefs, _, _ = load_model(self.private_folder, self.shared_folder)
+        self.assertFalse(np.any(fedavg_coefs[0]))
+
+    def test_mismatched_fedavg_model_is_ignored(self):
+        save_mlp_params(os.path.join(self.shared_folder, FEDAVG_PARAMS_FILE), [c[:, :1] for c in self.mlp.coefs_], self.mlp.intercepts_)
+        coefs, _, _ = load_model(self.private_folder, self.shared_folder)
+        self.assertEqual(coefs[-1].shape[1], 4)
+
+    def test_no_model(self):
+        mlp_recommendation._cache.clear()
+        self.assertEqual(recommend_batch(["Show A"], "test_sandbox/mlp_recommendation/missing"), [None])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,8 +13,9 @@ import shutil
 import zipfile
 from unittest.mock import patch, MagicMock, mock_open
 from pathlib import Path
-from utils.syftbox import network_participants, create_shared_folder
+from utils.syftbox import network_participants, create_shared_folder, participants_datasets, DiscoveryIndex
 from utils.vocab import create_tvseries_vocab
+from common.vocabulary import load_binary_vocabulary, vocabulary_titles, VOCAB_BINARY_FILE
 
 API_NAME = "mock_api"
 PROJECT_DIR = "test_sandbox"
@@ -107,6 +108,64 @@ class TestAggregatorMain_MLP(unittest.TestCase):
         result = network_participants(self.base_path, API_NAME)
         self.assertEqual(result, ["user1", "user3"])
 
+    def write_datasets_yaml(self, user, name="Netflix Data"):
+        public = self.base_path / user / "public"
+        public.mkdir(parents=True, exist_ok=True)
+        (public / "datasets.yaml").write_text(f"datasets:\n  - name: {name}\n    format: CSV\n    path: data.csv\n")
+
+    def test_participants_datasets(self):
+        """
+        Test discovery of participants publishing the Netflix dataset in public/datasets.yaml.
+        """
+        self.write_datasets_yaml("user1")
+        self.write_datasets_yaml("user2", name="Other Data")
+        (self.base_path / "user3").mkdir()
+        self.assertEqual(participants_datasets(self.base_path), ["user1"])
+
+    def test_discovery_index_matches_full_scan(self):
+        """
+        Test that the discovery index gives the same results as a full scan, persisted across runs.
+        """
+        (self.base_path / "user1" / "api_data" / API_NAME).mkdir(parents=True)
+        (self.base_path / "user2" / "api_data").mkdir(parents=True)
+        self.write_datasets_yaml("user2")
+        index_path = Path(PROJECT_DIR) / "aggregator" / "discovery_index.json"
+
+        index = DiscoveryIndex(self.base_path, index_path)
+        self.assertEqual(sorted(index.refresh()), ["user1", "user2"])
+        self.assertEqual(network_participants(self.base_path, API_NAME, index=index), network_participants(self.base_path, API_NAME))
+        self.assertEqual(participants_datasets(self.base_path, index=index), ["user2"])
+
+        # A new run with nothing changed re-reads nothing
+        index = DiscoveryIndex(self.base_path, index_path)
+        self.assertEqual(index.refresh(), [])
+        self.assertEqual(index.network_participants(API_NAME), ["user1"])
+        index_path.unlink()
+
+    @patch("utils.syftbox.load_datasets_yaml")
+    def test_discovery_index_rereads_changed_entries_only(self, mock_load):
+        """
+        Test that only changed api_data directories and datasets.yaml files are re-read.
+        """
+        mock_load.return_value = []
+        (self.base_path / "user1" / "api_data").mkdir(parents=True)
+        (self.base_path / "user2" / "api_data").mkdir(parents=True)
+        self.write_datasets_yaml("user1")
+        self.write_datasets_yaml("user2")
+
+        index = DiscoveryIndex(self.base_path)
+        index.refresh()
+        self.assertEqual(mock_load.call_count, 2)
+
+        (self.base_path / "user2" / "api_data" / API_NAME).mkdir()
+        self.assertEqual(index.refresh(), ["user2"])
+        self.assertEqual(index.network_participants(API_NAME), ["user2"])
+        self.assertEqual(mock_load.call_count, 2)
+
+        (self.base_path / "user3" / "api_data" / API_NAME).mkdir(parents=True)
+        self.assertEqual(index.refresh(), ["user3"])
+        self.assertEqual(index.network_participants(API_NAME), ["user2", "user3"])
+
     @patch("os.getcwd")
     def test_create_tvseries_vocab(self, mock_getcwd):
         """
@@ -146,5 +205,37 @@ class TestAggregatorMain_MLP(unittest.TestCase):
         }
         self.assertEqual(vocab_mapping, expected_vocab)
 
+    @patch("os.getcwd")
+    def test_create_tvseries_vocab_skips_unchanged_source(self, mock_getcwd):
+        """
+        Test that the vocabulary is only rebuilt when the source CSV changes.
+        Expected: The CSV is not parsed again while its hash is unchanged, and the binary vocabulary
+        holds the same mapping as the JSON one.
+        """
+        mock_getcwd.return_value = PROJECT_DIR
+        Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+        Path(SHARED_FOLDER).mkdir(parents=True, exist_ok=True)
+        csv_file_path = Path(DATA_DIR) / "netflix_series_2024-12.csv"
+
+        def write_source(titles):
+            csv_file_path.write_text("\n".join(["Title"] + titles), encoding="utf-8")
+            with zipfile.ZipFile(Path(DATA_DIR) / "netflix_series_2024-12.csv.zip", 'w') as zipf:
+                zipf.write(csv_file_path, arcname=csv_file_path.name)
+
+        private_folder = Path(PROJECT_DIR) / "this_client" / "private" / "netflix_data"
+        write_source(["Dark", "Élite", "\"\"", "Arcane"])  # a row without a title
+        first = create_tvseries_vocab(SHARED_FOLDER, private_folder)
+        self.assertEqual(first, {"Arcane": 0, "Dark": 1, "Élite": 2})
+        self.assertEqual(vocabulary_titles(load_binary_vocabulary(Path(SHARED_FOLDER) / VOCAB_BINARY_FILE)), ["Arcane", "Dark", "Élite"])
+
+        with patch("utils.vocab.pd.read_csv") as mock_read_csv:
+            self.assertEqual(create_tvseries_vocab(SHARED_FOLDER, private_folder), first)
+            mock_read_csv.assert_not_called()
+        self.assertTrue((private_folder / "tv-series_vocabulary.state.json").is_file())
+        self.assertFalse((Path(SHARED_FOLDER) / "tv-series_vocabulary.state.json").exists())
+
+        write_source(["Dark", "Arcane", "Narcos"])
+        self.assertEqual(create_tvseries_vocab(SHARED_FOLDER, private_folder), {"Arcane": 0, "Dark": 1, "Narcos": 2})
+
 if __name__ == "__main__":
     unittest.main()
@@ -11,13 +11,17 @@ import unittest
 import numpy as np
 import joblib
 import shutil
+import zipfile
+from unittest.mock import patch
 from pathlib import Path
 from aggregator.pets.fedavg_mlp import (
     get_users_mlp_parameters,
     extract_number,
-    weighted_average,
     mlp_fedavg,
+    merge_output_layer,
+    load_peer_parameters,
 )
+from common.mlp_params import save_mlp_params, load_mlp_params, memmap_npz_members, MLP_PARAMS_FILE
 
 
 API_NAME = "mock_api"
@@ -94,30 +98,14 @@ class TestAggregatorMain_MLP(unittest.TestCase):
         (user2_dir / "netflix_mlp_weights_150.joblib").touch()
         (user2_dir / "netflix_mlp_bias_150.joblib").touch()
 
-        weights, biases = get_users_mlp_parameters(self.base_path, API_NAME, peers)
+        artifacts = get_users_mlp_parameters(self.base_path, API_NAME, peers)
 
-        expected_weights = [
-            user1_dir / "netflix_mlp_weights_200.joblib",
-            user2_dir / "netflix_mlp_weights_150.joblib",
+        expected_artifacts = [
+            (user1_dir / "netflix_mlp_weights_200.joblib", user1_dir / "netflix_mlp_bias_200.joblib"),
+            (user2_dir / "netflix_mlp_weights_150.joblib", user2_dir / "netflix_mlp_bias_150.joblib"),
         ]
-        expected_biases = [
-            user1_dir / "netflix_mlp_bias_200.joblib",
-            user2_dir / "netflix_mlp_bias_150.joblib",
-        ]
-
-        self.assertEqual(weights, expected_weights)
-        self.assertEqual(biases, expected_biases)
 
-    def test_weighted_average(self):
-        """
-        Test computation of weighted averages for MLP parameters.
-        Expected: Weighted average is correctly calculated.
-        """
-        parameters = [np.array([1, 2, 3]), np.array([4, 5, 6])]
-        samples = [2, 3]
-        result = weighted_average(parameters, samples)
-        expected = np.array([2.8, 3.8, 4.8])
-        np.testing.assert_array_almost_equal(result, expected)
+        self.assertEqual(artifacts, expected_artifacts)
 
     def test_mlp_fedavg(self):
         """
@@ -144,7 +132,7 @@ class TestAggregatorMain_MLP(unittest.TestCase):
         joblib.dump(bias_data_user1, biases[0])
         joblib.dump(bias_data_user2, biases[1])
 
-        fedavg_weights, fedavg_biases = mlp_fedavg(weights, biases)
+        fedavg_weights, fedavg_biases = mlp_fedavg(list(zip(weights, biases)))
 
         expected_weights = [np.array([[3, 4], [5, 6]])]
         expected_biases = [np.array([2, 3])]
@@ -152,5 +140,186 @@ class TestAggregatorMain_MLP(unittest.TestCase):
         np.testing.assert_array_equal(fedavg_weights[0], expected_weights[0])
         np.testing.assert_array_equal(fedavg_biases[0], expected_biases[0])
 
+    def test_merge_output_layer(self):
+        """
+        Test merging of sparse output-layer updates into the previous global output layer.
+        Expected: Uploaded units are averaged over their uploaders; other units keep their previous value.
+        """
+        output_weights = [np.ones((2, 2)), 3 * np.ones((2, 1))]
+        output_biases = [np.array([1.0, 1.0]), np.array([3.0])]
+        classes = [np.array([0, 2]), np.array([2])]
+        previous = (np.full((2, 4), 7.0), np.full(4, 7.0))
+
+        merged_weights, merged_biases = merge_output_layer(output_weights, output_biases, classes, [1, 3], previous, num_classes=5)
+
+        self.assertEqual(merged_weights.shape, (2, 5))
+        np.testing.assert_array_equal(merged_weights[0], [1.0, 7.0, 2.5, 7.0, 0.0])
+        np.testing.assert_array_equal(merged_biases, [1.0, 7.0, 2.5, 7.0, 0.0])
+
+    def test_mlp_fedavg_sparse_uploads(self):
+        """
+        Test FedAvg of vocabulary-aligned uploads carrying the classes of their output units.
+        Expected: Hidden layers are averaged densely; output units are merged by vocabulary ID.
+        """
+        paths = []
+        for user, n, ids in [("user1", 100, [0, 3]), ("user2", 300, [3])]:
+            path = self.base_path / user / MLP_PARAMS_FILE
+            path.parent.mkdir(parents=True, exist_ok=True)
+            save_mlp_params(path, [np.full((3, 2), n / 100), np.full((2, len(ids)), n / 100)], [np.full(2, n / 100), np.full(len(ids), n / 100)], num_samples=n, classes=ids)
+            paths.append(path)
+
+        fedavg_weights, fedavg_biases = mlp_fedavg(paths, num_classes=6)
+
+        np.testing.assert_array_almost_equal(fedavg_weights[0], np.full((3, 2), 2.5))
+        self.assertEqual(fedavg_weights[1].shape, (2, 6))
+        np.testing.assert_array_almost_equal(fedavg_biases[1], [1.0, 0, 0, 2.5, 0, 0])
+
+    def test_mlp_params_roundtrip_memmap(self):
+        """
+        Test the pickle-free parameter artifact and its memory-mapped loading.
+        Expected: Layers come back memory-mapped in float32 with the metadata.
+        """
+        path = self.base_path / MLP_PARAMS_FILE
+        coefs = [np.arange(6, dtype=np.float64).reshape(3, 2), np.ones((2, 4))]
+        intercepts = [np.array([0.5, -0.5]), np.zeros(4)]
+        save_mlp_params(path, coefs, intercepts, num_samples=42, version=7, classes=[1, 5, 8, 9])
+
+        params = load_mlp_params(path, mmap=True)
+        self.assertIsInstance(params["coefs"][0], np.memmap)
+        self.assertEqual(params["coefs"][0].dtype, np.float32)
+        np.testing.assert_array_equal(params["coefs"][0], coefs[0])
+        np.testing.assert_array_equal(params["intercepts"][0], intercepts[0])
+        self.assertEqual((params["num_samples"], params["version"]), (42, 7))
+        np.testing.assert_array_equal(params["classes"], [1, 5, 8, 9])
+
+        eager = load_mlp_params(path)
+        np.testing.assert_array_equal(eager["coefs"][1], params["coefs"][1])
+
+    def test_memmap_npz_members_fallback(self):
+        """
+        Test memory-mapping `.npz` files that `np.savez` does not write: compressed and ZIP64 members.
+        Expected: Compressed members are read with `np.load`; ZIP64 members are still memory-mapped.
+        """
+        arrays = {"coef": np.arange(12, dtype=np.float32).reshape(3, 4), "empty": np.zeros(0), "scalar": np.array(3)}
+
+        compressed = self.base_path / "compressed.npz"
+        np.savez_compressed(compressed, **arrays)
+        zip64 = self.base_path / "zip64.npz"
+        with zipfile.ZipFile(zip64, "w") as archive:
+            for name, array in arrays.items():
+                with archive.open(name + ".npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, array)
+
+        for path, mapped in [(compressed, False), (zip64, True)]:
+            members = memmap_npz_members(path)
+            self.assertEqual(isinstance(members["coef"], np.memmap), mapped)
+            for name, array in arrays.items():
+                np.testing.assert_array_equal(members[name], array)
+
+    def test_get_users_mlp_parameters_artifact(self):
+        """
+        Test that a participant's `.npz` artifact is preferred over legacy joblib files.
+        """
+        peer_dir = self.base_path / "user1" / "api_data" / API_NAME
+        peer_dir.mkdir(parents=True, exist_ok=True)
+        (peer_dir / "netflix_mlp_weights_100.joblib").touch()
+        (peer_dir / "netflix_mlp_bias_100.joblib").touch()
+        save_mlp_params(peer_dir / MLP_PARAMS_FILE, [np.ones((2, 2))], [np.ones(2)], num_samples=10)
+
+        artifacts = get_users_mlp_parameters(self.base_path, API_NAME, ["user1"])
+        self.assertEqual(artifacts, [peer_dir / MLP_PARAMS_FILE])
+
+    def test_mlp_fedavg_artifacts(self):
+        """
+        Test FedAvg over `.npz` artifacts, weighted by their recorded sample counts.
+        """
+        paths = []
+        for user, value, n in [("user1", 1.0, 1), ("user2", 5.0, 3)]:
+            path = self.base_path / f"{user}_{MLP_PARAMS_FILE}"
+            save_mlp_params(path, [np.full((2, 2), value)], [np.full(2, value)], num_samples=n)
+            paths.append(path)
+
+        fedavg_weights, fedavg_biases = mlp_fedavg(paths)
+        np.testing.assert_array_almost_equal(fedavg_weights[0], np.full((2, 2), 4.0))
+        np.testing.assert_array_almost_equal(fedavg_biases[0], np.full(2, 4.0))
+
+    def test_mlp_fedavg_streaming_matches_weighted_average(self):
+        """
+        Test that streaming FedAvg matches the weighted average of every layer.
+        """
+        rng = np.random.default_rng(0)
+        paths, models, samples = [], [], [3, 10, 7]
+        for i, n in enumerate(samples):
+            coefs = [rng.normal(size=(3, 8)), rng.normal(size=(8, 4))]
+            intercepts = [rng.normal(size=8), rng.normal(size=4)]
+            path = self.base_path / f"user{i}_{MLP_PARAMS_FILE}"
+            save_mlp_params(path, coefs, intercepts, num_samples=n, dtype="float64")
+            paths.append(path)
+            models.append((coefs, intercepts))
+
+        fedavg_weights, fedavg_biases = mlp_fedavg(paths)
+        for layer in range(2):
+            np.testing.assert_array_almost_equal(fedavg_weights[layer], np.average([m[0][layer] for m in models], axis=0, weights=samples))
+            np.testing.assert_array_almost_equal(fedavg_biases[layer], np.average([m[1][layer] for m in models], axis=0, weights=samples))
+
+    def test_mlp_fedavg_skips_mismatched_peer(self):
+        """
+        Test that a peer with different layer shapes is skipped instead of failing the round.
+        """
+        good = self.base_path / f"good_{MLP_PARAMS_FILE}"
+        other = self.base_path / f"other_{MLP_PARAMS_FILE}"
+        bad = self.base_path / f"bad_{MLP_PARAMS_FILE}"
+        save_mlp_params(good, [np.ones((3, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=1)
+        save_mlp_params(other, [np.full((3, 4), 3.0), np.full((4, 2), 3.0)], [np.full(4, 3.0), np.full(2, 3.0)], num_samples=1)
+        save_mlp_params(bad, [np.ones((5, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=100)
+
+        fedavg_weights, fedavg_biases = mlp_fedavg([good, bad, other])
+        np.testing.assert_array_almost_equal(fedavg_weights[0], np.full((3, 4), 2.0))
+        np.testing.assert_array_almost_equal(fedavg_biases[1], np.full(2, 2.0))
+
+        with self.assertRaises(ValueError):
+            mlp_fedavg([self.base_path / "missing.npz"])
+
+    def test_mlp_fedavg_skips_peers_without_samples(self):
+        """
+        Test that peers reporting no samples are skipped, and that a round where every peer
+        reports no samples fails with a ValueError instead of dividing by zero.
+        """
+        empty = self.base_path / f"empty_{MLP_PARAMS_FILE}"
+        full = self.base_path / f"full_{MLP_PARAMS_FILE}"
+        save_mlp_params(empty, [np.zeros((3, 4)), np.zeros((4, 2))], [np.zeros(4), np.zeros(2)], num_samples=0)
+        save_mlp_params(full, [np.ones((3, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=2)
+
+        fedavg_weights, _ = mlp_fedavg([empty, full])
+        np.testing.assert_array_almost_equal(fedavg_weights[0], np.ones((3, 4)))
+
+        with self.assertRaises(ValueError):
+            mlp_fedavg([empty])
+
+    def test_mlp_fedavg_skips_dense_uploads_in_sparse_round(self):
+        """
+        Test that dense uploads, whose output units follow a local label encoding, are skipped
+        once an upload of the round is vocabulary-aligned.
+        """
+        sparse = self.base_path / f"sparse_{MLP_PARAMS_FILE}"
+        dense = self.base_path / f"dense_{MLP_PARAMS_FILE}"
+        save_mlp_params(dense, [np.full((3, 4), 5.0), np.full((4, 2), 5.0)], [np.full(4, 5.0), np.full(2, 5.0)], num_samples=3)
+        save_mlp_params(sparse, [np.ones((3, 4)), np.ones((4, 1))], [np.ones(4), np.ones(1)], num_samples=1, classes=[2])
+
+        fedavg_weights, fedavg_biases = mlp_fedavg([dense, sparse], num_classes=4)
+        np.testing.assert_array_almost_equal(fedavg_weights[0], np.ones((3, 4)))
+        np.testing.assert_array_almost_equal(fedavg_biases[1], [0.0, 0.0, 1.0, 0.0])
+
+    def test_mlp_fedavg_memory_maps_with_prefetch(self):
+        """
+        Test that participants are memory-mapped whether or not they are prefetched.
+        """
+        path = self.base_path / f"mapped_{MLP_PARAMS_FILE}"
+        save_mlp_params(path, [np.ones((3, 4)), np.ones((4, 2))], [np.ones(4), np.ones(2)], num_samples=1)
+        for prefetch in [0, 2]:
+            with patch("aggregator.pets.fedavg_mlp.load_peer_parameters", wraps=load_peer_parameters) as load:
+                mlp_fedavg([path], prefetch=prefetch)
+            load.assert_called_once_with(path, mmap=True)
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,11 +2,17 @@ import os
 import shutil
 import unittest
 import numpy as np
+from unittest.mock import patch
 from participant.federated_learning.svd_participant_finetuning import (
     save_training_results,
     prepare_training_data,
-    perform_local_training
+    perform_local_training,
+    save_encoded_upload,
+    prepare_batched_training_data,
+    perform_batched_local_training,
+    participant_fine_tuning,
 )
+from participant.federated_learning.svd_als import load_item_statistics
 
 class TestParticipantFineTuning(unittest.TestCase):
 
@@ -82,4 +88,62 @@ class TestParticipantFineTuning(unittest.TestCase):
         np.testing.assert_array_equal(np.load(self.participant_V_path), self.V)
         saved_delta = np.load(self.delta_V_path, allow_pickle=True).item()
         self.assertEqual(saved_delta.keys(), self.final_ratings.keys())  # Check keys match
-        np.testing.assert_array_equal(np.load(self.user_matrix_path), self.U_u)
\ No newline at end of file
+        np.testing.assert_array_equal(np.load(self.user_matrix_path), self.U_u)
+
+    def test_save_encoded_upload_keeps_residual(self):
+        delta_V = {0: np.ones(10), 1: np.full(10, 0.5)}
+        payload = save_encoded_upload(self.user_id, self.save_path, delta_V, "float16", top_k=1)
+        self.assertEqual(list(payload["item_ids"]), [0])
+        self.assertTrue(os.path.exists(os.path.join(self.save_path, self.user_id, f"{self.user_id}_delta_V.npz")))
+
+        payload = save_encoded_upload(self.user_id, self.save_path, {}, "float16", top_k=1)
+        self.assertEqual(list(payload["item_ids"]), [1])
+    def test_fine_tuning_als(self):
+        with patch("participant.federated_learning.svd_participant_finetuning.load_tv_vocabulary", return_value=self.tv_vocab), \
+             patch("participant.federated_learning.svd_participant_finetuning.load_item_factor_rows", side_effect=lambda path, ids: self.V[ids]):
+            statistics = participant_fine_tuning(self.user_id, self.private_folder, save_path=self.save_path, method="als")
+            with self.assertRaises(ValueError):
+                participant_fine_tuning(self.user_id, self.private_folder, save_path=self.save_path, method="adam")
+
+        np.testing.assert_array_equal(statistics["item_ids"], [0, 1])
+        self.assertEqual(statistics["gram"].shape, (2, 55))
+        saved = load_item_statistics(os.path.join(self.save_path, self.user_id, f"{self.user_id}_item_statistics.npz"))
+        np.testing.assert_array_equal(saved["rhs"], statistics["rhs"])
+        self.assertEqual(np.load(self.user_matrix_path).shape, (10,))
+
+class TestBatchedFineTuning(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.tv_vocab = {f"show{i}": i for i in range(20)}
+        self.user_ids = ["alice", "bob", "carol"]
+        self.ratings_by_user = {
+            "alice": {"show1": 4.0, "show5": 2.0, "show7": 3.5},
+            "bob": {"show5": 5.0},
+            "carol": {"show2": 1.0, "show1": 4.5, "unknown": 3.0, "show19": 2.5, "show7": 4.0},
+        }
+        self.V = rng.normal(size=(20, 6))
+        self.U = rng.normal(size=(3, 6))
+
+    def test_prepare_batched_training_data(self):
+        indptr, item_ids, ratings = prepare_batched_training_data(self.user_ids, self.tv_vocab, self.ratings_by_user)
+        np.testing.assert_array_equal(indptr, [0, 3, 4, 8])
+        np.testing.assert_array_equal(item_ids, [1, 5, 7, 5, 2, 1, 19, 7])
+        np.testing.assert_array_equal(ratings, [4.0, 2.0, 3.5, 5.0, 1.0, 4.5, 2.5, 4.0])
+
+    def test_batched_matches_sequential(self):
+        indptr, item_ids, ratings = prepare_batched_training_data(self.user_ids, self.tv_vocab, self.ratings_by_user)
+        V_rows, U = perform_batched_local_training(indptr, ratings, self.V[item_ids], self.U)
+
+        for u, user_id in enumerate(self.user_ids):
+            train_data = prepare_training_data(user_id, self.tv_vocab, self.ratings_by_user[user_id])
+            _, updated_V, updated_U_u = perform_local_training(train_data, self.V, self.U[u])
+            np.testing.assert_allclose(U[u], updated_U_u)
+            np.testing.assert_allclose(V_rows[indptr[u]:indptr[u + 1]], updated_V[item_ids[indptr[u]:indptr[u + 1]]])
+
+    def test_batched_does_not_modify_inputs(self):
+        indptr, item_ids, ratings = prepare_batched_training_data(self.user_ids, self.tv_vocab, self.ratings_by_user)
+        V_rows, U = self.V[item_ids], self.U.copy()
+        perform_batched_local_training(indptr, ratings, V_rows, U)
+        np.testing.assert_array_equal(V_rows, self.V[item_ids])
+        np.testing.assert_array_equal(U, self.U)
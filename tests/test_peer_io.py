@@ -0,0 +1,109 @@
+import shutil
+import threading
+import time
+import unittest
+import numpy as np
+from pathlib import Path
+from common.peer_io import peer_artifact_paths, prefetch_peer_artifacts
+from common.mlp_params import save_mlp_params
+from aggregator.pets.fedavg_mlp import mlp_fedavg
+from participant.federated_learning.svd_delta_codec import encode_deltas, save_encoded_deltas
+from participant.federated_learning.svd_server_aggregation import aggregate_item_factors
+
+SANDBOX = Path("test_sandbox/peer_io")
+
+class TestPrefetchPeerArtifacts(unittest.TestCase):
+
+    def test_results_in_order_with_errors(self):
+        def load(item):
+            if item == 2:
+                raise IOError("unreadable")
+            time.sleep(0.01 * (5 - item))  # later items finish first
+            return item * 10
+
+        for prefetch in [0, 3]:
+            results = list(prefetch_peer_artifacts(range(5), load, prefetch))
+            self.assertEqual([item for item, _, _ in results], [0, 1, 2, 3, 4])
+            self.assertEqual([value for _, value, _ in results], [0, 10, None, 30, 40])
+            self.assertIsInstance(results[2][2], IOError)
+
+    def test_loads_in_flight_are_bounded(self):
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        def load(item):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            return item
+
+        started = []
+        for item, _, _ in prefetch_peer_artifacts(range(20), lambda i: started.append(i) or load(i), prefetch=2):
+            # The consumer never sees more than `prefetch` items requested ahead of it
+            self.assertLessEqual(len(started), item + 3)
+        self.assertLessEqual(state["peak"], 2)
+
+    def test_early_close_stops_loading(self):
+        started = []
+        iterator = prefetch_peer_artifacts(range(100), lambda i: started.append(i) or i, prefetch=2)
+        next(iterator)
+        iterator.close()
+        self.assertLessEqual(len(started), 3)
+
+
+class TestPeerIOAggregation(unittest.TestCase):
+
+    def setUp(self):
+        if SANDBOX.exists():
+            shutil.rmtree(SANDBOX)
+        SANDBOX.mkdir(parents=True)
+
+    def tearDown(self):
+        shutil.rmtree(SANDBOX)
+
+    def test_peer_artifact_paths(self):
+        for peer in ["a@x.org", "c@x.org"]:
+            folder = SANDBOX / peer / "api_data" / "netflix"
+            folder.mkdir(parents=True)
+            (folder / "top5_series_dp.npy").write_bytes(b"")
+        (SANDBOX / "b@x.org").mkdir()
+
+        paths = peer_artifact_paths(SANDBOX, ["c@x.org", "b@x.org", "a@x.org"], "netflix", "top5_series_dp.npy")
+        self.assertEqual([peer for peer, _ in paths], ["c@x.org", "a@x.org"])
+        self.assertEqual(paths[0][1], SANDBOX / "c@x.org" / "api_data" / "netflix" / "top5_series_dp.npy")
+
+    def test_prefetched_fedavg_matches_sequential(self):
+        rng = np.random.default_rng(0)
+        paths = []
+        for i, n in enumerate([3, 5, 2, 4]):
+            path = SANDBOX / f"user{i}.npz"
+            save_mlp_params(path, [rng.normal(size=(3, 6)), rng.normal(size=(6, 4))], [rng.normal(size=6), rng.normal(size=4)], num_samples=n)
+            paths.append(path)
+        paths.insert(2, SANDBOX / "missing.npz")
+
+        sequential = mlp_fedavg(paths, prefetch=0)
+        prefetched = mlp_fedavg(paths, prefetch=3)
+        for actual, wanted in zip(prefetched[0] + prefetched[1], sequential[0] + sequential[1]):
+            np.testing.assert_array_almost_equal(actual, wanted)
+
+    def test_svd_aggregation_loads_uploaded_deltas(self):
+        V = np.zeros((3, 2))
+        updates = [{0: np.array([1.0, 0.0])}, {1: np.array([0.0, 2.0]), 2: np.array([1.0, 1.0])}]
+        paths = []
+        for i, update in enumerate(updates):
+            path = str(SANDBOX / f"delta_{i}.npz")
+            save_encoded_deltas(path, encode_deltas(update, "float32")[0])
+            paths.append(path)
+
+        expected = aggregate_item_factors(V, updates, epsilon=None, clipping_threshold=None)
+        actual = aggregate_item_factors(V, paths, epsilon=None, clipping_threshold=None, prefetch=2)
+        np.testing.assert_array_almost_equal(actual, expected)
+
+        with self.assertRaises(ValueError):
+            aggregate_item_factors(V, paths + [str(SANDBOX / "missing.npz")], epsilon=None, clipping_threshold=None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import shutil
+import unittest
+import numpy as np
+from pathlib import Path
+from unittest.mock import patch
+from phe import paillier
+from common.phe_vectors import packing_layout, pack_vector, unpack_vector, save_encrypted_vector, PHE_VECTOR_FILE
+from common.vocabulary import write_binary_vocab
+from participant.federated_analytics.phe_encryption import encrypt_vector, run_top5_phe
+from aggregator.pets.phe import generate_keys, load_private_key, sum_encrypted_vectors, decrypt_packed_vector, phe_top5_series
+
+SANDBOX = Path("test_sandbox/phe")
+
+class TestPackedPaillier(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.public_key, cls.private_key = paillier.generate_paillier_keypair(n_length=512)
+
+    def setUp(self):
+        SANDBOX.mkdir(parents=True, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(SANDBOX)
+
+    def test_pack_unpack(self):
+        slot_bits, slots_per_block = packing_layout(self.public_key, max_value=1023, max_peers=16)
+        self.assertEqual(slot_bits, 14)
+        self.assertLess(slot_bits * slots_per_block, self.public_key.n.bit_length())
+
+        vector = np.random.default_rng(0).integers(0, 1024, size=100)
+        blocks = pack_vector(vector, slot_bits, slots_per_block)
+        self.assertEqual(len(blocks), -(-100 // slots_per_block))
+        np.testing.assert_array_equal(unpack_vector(blocks, 100, slot_bits, slots_per_block), vector)
+
+    def test_homomorphic_sum_of_peers(self):
+        rng = np.random.default_rng(1)
+        vectors = [rng.integers(0, 50, size=300) for _ in range(3)]
+        vectors[0][0] = 5000  # clipped to max_value
+        paths = []
+        for i, vector in enumerate(vectors):
+            paths.append(SANDBOX / f"peer{i}.npz")
+            save_encrypted_vector(paths[-1], encrypt_vector(vector, self.public_key, max_value=1023, max_peers=8, processes=2))
+
+        total = sum_encrypted_vectors(paths + [SANDBOX / "missing.npz"], self.public_key)
+        self.assertEqual(total["num_peers"], 3)
+        expected = np.sum([np.clip(vector, 0, 1023) for vector in vectors], axis=0)
+        np.testing.assert_array_equal(decrypt_packed_vector(total, self.private_key), expected)
+
+    def test_incompatible_vectors_are_skipped(self):
+        other_key, _ = paillier.generate_paillier_keypair(n_length=512)
+        vector = np.arange(10)
+        for name, key, max_peers in [("a", self.public_key, 2), ("b", self.public_key, 2), ("c", self.public_key, 2), ("d", other_key, 2), ("e", self.public_key, 4)]:
+            save_encrypted_vector(SANDBOX / f"{name}.npz", encrypt_vector(vector, key, max_value=15, max_peers=max_peers, processes=1))
+
+        total = sum_encrypted_vectors([SANDBOX / f"{name}.npz" for name in "abcde"], self.public_key)
+        self.assertEqual(total["num_peers"], 2)  # c overflows the headroom, d is for another key, e has another layout
+        np.testing.assert_array_equal(decrypt_packed_vector(total, self.private_key), 2 * vector)
+
+    def test_unclipped_counts_are_detected(self):
+        vector = np.arange(10)
+        honest = encrypt_vector(vector, self.public_key, max_value=15, max_peers=4, processes=1)
+        cheating = dict(honest, ciphertexts=[self.public_key.raw_encrypt(block) for block in pack_vector(np.full(10, 40), honest["slot_bits"], honest["slots_per_block"])])
+        save_encrypted_vector(SANDBOX / "honest.npz", honest)
+        save_encrypted_vector(SANDBOX / "cheating.npz", cheating)
+
+        total = sum_encrypted_vectors([SANDBOX / "honest.npz", SANDBOX / "cheating.npz"], self.public_key)
+        with self.assertRaises(ValueError):
+            decrypt_packed_vector(total, self.private_key)
+
+        with self.assertRaises(ValueError):
+            unpack_vector([1 << 20], 1, slot_bits=4, slots_per_block=2, max_slot_value=15)
+
+    def test_phe_top5_series(self):
+        shared, private = SANDBOX / "shared", SANDBOX / "private"
+        generate_keys(public_path=shared, private_path=private)
+        vocab = SANDBOX / "tv-series_vocabulary.bin"
+        write_binary_vocab(vocab, [f"Show {i}" for i in range(8)])
+
+        peers = ["a@x.org", "b@x.org", "c@x.org"]
+        for i, peer in enumerate(peers):
+            folder = SANDBOX / peer / "api_data" / "netflix_data"
+            folder.mkdir(parents=True)
+            np.save(SANDBOX / "views.npy", (np.arange(8) + i) % 8)
+            run_top5_phe(SANDBOX / "views.npy", folder, shared)
+
+        with patch("aggregator.pets.phe.API_NAME", "netflix_data"):
+            self.assertIsNone(phe_top5_series(SANDBOX, peers, shared, private, vocab, min_participants=4))
+            totals = phe_top5_series(SANDBOX, peers, shared, private, vocab, min_participants=3)
+
+        np.testing.assert_array_equal(totals, np.sum([(np.arange(8) + i) % 8 for i in range(3)], axis=0))
+        with open(private / "top5_series_phe.json", "r") as f:
+            self.assertEqual(json.load(f)["counts"], sorted(totals.tolist(), reverse=True)[:5])
+
+    def test_run_top5_phe_with_published_key(self):
+        shared, private = SANDBOX / "shared", SANDBOX / "private"
+        generate_keys(public_path=shared, private_path=private)
+        np.save(SANDBOX / "views.npy", np.arange(2000) % 7)
+
+        run_top5_phe(SANDBOX / "views.npy", SANDBOX, shared)
+
+        private_key = load_private_key(shared, private)
+        total = sum_encrypted_vectors([SANDBOX / PHE_VECTOR_FILE], private_key.public_key)
+        np.testing.assert_array_equal(decrypt_packed_vector(total, private_key), np.arange(2000) % 7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,9 @@ import unittest
 import numpy as np
 from unittest.mock import patch, mock_open, MagicMock
 from participant.federated_learning.mock_svd import server_aggregate
+from participant.federated_learning.svd_item_patches import publish_global_V_version, sync_global_item_factors
+from participant.federated_learning.svd_als import item_sufficient_statistics, aggregate_item_statistics, save_item_statistics
+from participant.federated_learning.svd_item_store import STORE_DIR, ItemFactorStore
 from participant.federated_learning.svd_server_aggregation import validate_weights, normalize_weights, clip_updates, add_differential_privacy_noise, aggregate_item_factors, calculate_aggregated_delta
 
 class TestServerAggregate(unittest.TestCase):
@@ -35,6 +38,35 @@ class TestServerAggregate(unittest.TestCase):
         updated_V = np.load(self.global_V_path)
         self.assertEqual(updated_V.shape, self.V.shape)
 
+    def test_store_rounds_are_synced_through_patches(self):
+        """With a store, only the changed rows are published; participants catch up through the patches."""
+        os.remove(self.global_V_path)
+        ItemFactorStore.create(os.path.join(self.save_path, STORE_DIR), self.V, {"a": 0, "b": 1, "c": 2})
+        publish_global_V_version(self.V, self.save_path)
+        local_dir = os.path.join(self.save_path, "user")
+        sync_global_item_factors(self.save_path, local_dir)
+
+        server_aggregate(self.updates, epsilon=None, clipping_threshold=None, save_to=self.save_path)
+        self.assertFalse(os.path.exists(self.global_V_path))
+
+        synced, stats = sync_global_item_factors(self.save_path, local_dir)
+        expected = aggregate_item_factors(self.V, self.updates, epsilon=None, clipping_threshold=None)
+        np.testing.assert_array_almost_equal(ItemFactorStore.open(os.path.join(self.save_path, STORE_DIR)).factors, expected)
+        np.testing.assert_array_almost_equal(synced, expected)
+        self.assertFalse(stats["snapshot"])
+
+    def test_server_aggregate_als(self):
+        """With method "als", the rated rows are solved from the uploaded item statistics."""
+        U = np.random.rand(2, 4)
+        statistics = [item_sufficient_statistics([0, 1], [4.0, 2.0], U[0]), item_sufficient_statistics([1], [5.0], U[1])]
+        path = os.path.join(self.sandbox_dir, "user_item_statistics.npz")
+        save_item_statistics(path, statistics[1])
+
+        server_aggregate([statistics[0], path], save_to=self.save_path, method="als")
+        np.testing.assert_array_almost_equal(np.load(self.global_V_path), aggregate_item_statistics(self.V, statistics))
+        with self.assertRaises(ValueError):
+            server_aggregate(self.updates, save_to=self.save_path, method="adam")
+
 class TestAggregateItemFactors(unittest.TestCase):
 
     def setUp(self):
@@ -8,7 +8,7 @@ import json
 # Assume the code provided earlier is in a module named `federated_learning`
 from participant.federated_learning.mock_svd import normalize_string, server_initialization, server_aggregate
 
-from participant.federated_learning.svd_server_initialisation import initialize_item_factors, get_rating_with_fallback, generate_item_vector, normalize_vectors
+from participant.federated_learning.svd_server_initialisation import initialize_item_factors, normalize_vectors
 
 
 class TestNormalizeString(unittest.TestCase):
@@ -81,31 +81,34 @@ class TestInitializeItemFactors(unittest.TestCase):
         self.assertEqual(V.shape, (1000, self.latent_dim))
         np.testing.assert_allclose(np.linalg.norm(V, axis=1), 1, err_msg="Vectors are not normalized for large vocab")
 
-    def test_get_rating_with_fallback_found(self):
-        """Test retrieving a rating when the title exists."""
-        rating = get_rating_with_fallback("breaking bad", self.imdb_ratings, default_rating=7.0)
-        self.assertEqual(rating, 9.5)
-
-    def test_get_rating_with_fallback_missing(self):
-        """Test using the default rating when the title is missing."""
-        rating = get_rating_with_fallback("unknown show", self.imdb_ratings, default_rating=7.0)
-        self.assertEqual(rating, 7.0)
-
-    def test_generate_item_vector(self):
-        """Test generating an item vector with noise."""
-        rating = 9.0
-        vector = generate_item_vector(rating, self.latent_dim)
-
-        # Ensure vector has correct shape
-        self.assertEqual(vector.shape, (self.latent_dim,))
-
-        # Check that the vector values are within a reasonable range
-        expected_min = rating - 0.2 * rating  # Minimum with added noise
-        expected_max = rating + 0.2 * rating  # Maximum with added noise
-        self.assertTrue(
-            np.all((vector >= expected_min) & (vector <= expected_max)),
-            f"Vector values are out of expected range: {vector}"
-        )
+    def test_float32_output(self):
+        """Test that float32 factors are emitted when requested."""
+        V64 = initialize_item_factors(self.tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=self.random_seed)
+        V32 = initialize_item_factors(self.tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=self.random_seed, dtype=np.float32)
+
+        self.assertEqual(V32.dtype, np.float32)
+        self.assertEqual(V32.nbytes * 2, V64.nbytes)
+        np.testing.assert_allclose(np.linalg.norm(V32, axis=1), 1, rtol=1e-5)
+
+    def test_independent_of_global_random_state(self):
+        """Test that the global NumPy random state does not affect the initialization."""
+        np.random.seed(0)
+        V1 = initialize_item_factors(self.tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=7)
+        np.random.seed(1)
+        V2 = initialize_item_factors(self.tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=7)
+        V3 = initialize_item_factors(self.tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=8)
+
+        np.testing.assert_array_equal(V1, V2)
+        self.assertFalse(np.allclose(V1, V3))
+
+    def test_rows_follow_vocabulary_ids(self):
+        """Test that rows are placed at the vocabulary IDs and that gaps stay empty."""
+        tv_vocab = {"breaking bad": 2, "game of thrones": 0}
+        V = initialize_item_factors(tv_vocab, self.imdb_ratings, latent_dim=self.latent_dim, random_seed=self.random_seed)
+
+        self.assertEqual(V.shape, (3, self.latent_dim))
+        np.testing.assert_array_equal(V[1], np.zeros(self.latent_dim))
+        np.testing.assert_allclose(np.linalg.norm(V[[0, 2]], axis=1), 1)
 
     def test_normalize_vectors(self):
         """Test normalizing vectors to unit length."""
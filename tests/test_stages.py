@@ -0,0 +1,49 @@
+import time
+import unittest
+from aggregator.utils.stages import Stage, check_stages, run_stages
+
+class TestStages(unittest.TestCase):
+
+    def test_dependencies_pass_results(self):
+        report = run_stages([
+            Stage("sum", lambda a, b: a + b, requires=("a", "b")),
+            Stage("a", lambda: 2),
+            Stage("b", lambda: 3),
+        ])
+        self.assertEqual(list(report), ["sum", "a", "b"])
+        self.assertEqual(report["sum"]["result"], 5)
+        self.assertTrue(all(outcome["status"] == "ok" for outcome in report.values()))
+
+    def test_independent_stages_run_concurrently(self):
+        start = time.perf_counter()
+        report = run_stages([Stage(f"s{i}", lambda: time.sleep(0.2)) for i in range(4)])
+        self.assertLess(time.perf_counter() - start, 0.6)
+        for outcome in report.values():
+            self.assertGreaterEqual(outcome["seconds"], 0.2)
+
+    def test_failure_only_skips_dependents(self):
+        def fail():
+            raise RuntimeError("no peers")
+
+        report = run_stages([
+            Stage("fails", fail),
+            Stage("child", lambda x: x, requires=("fails",)),
+            Stage("grandchild", lambda x: x, requires=("child",)),
+            Stage("independent", lambda: "done"),
+        ])
+        self.assertEqual(report["fails"]["status"], "failed")
+        self.assertIsInstance(report["fails"]["error"], RuntimeError)
+        self.assertEqual(report["child"]["status"], "skipped")
+        self.assertEqual(report["grandchild"]["status"], "skipped")
+        self.assertEqual(report["independent"]["result"], "done")
+
+    def test_invalid_graphs(self):
+        with self.assertRaises(ValueError):
+            check_stages([Stage("a", int, requires=("missing",))])
+        with self.assertRaises(ValueError):
+            check_stages([Stage("a", int, requires=("b",)), Stage("b", int, requires=("a",))])
+        with self.assertRaises(ValueError):
+            check_stages([Stage("a", int), Stage("a", int)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from participant.federated_learning.svd_als import (
+    solve_user_vectors,
+    item_sufficient_statistics,
+    perform_local_als,
+    aggregate_item_statistics,
+    pack_gram,
+    unpack_gram,
+)
+from participant.federated_learning.svd_simulation import compare_training_methods
+
+class TestALS(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.V = rng.normal(size=(30, 4))
+        self.U = rng.normal(size=(3, 4))
+        self.indptr = np.array([0, 5, 5, 12])
+        self.item_ids = rng.choice(30, size=12)
+        self.ratings = rng.uniform(1, 5, size=12)
+
+    def test_user_vectors_solve_normal_equations(self):
+        U = solve_user_vectors(self.indptr, self.V[self.item_ids], self.ratings, lambda_reg=0.1)
+        for u in [0, 2]:
+            rows = slice(self.indptr[u], self.indptr[u + 1])
+            V_u, n_u = self.V[self.item_ids[rows]], self.indptr[u + 1] - self.indptr[u]
+            expected = np.linalg.solve(V_u.T @ V_u + 0.1 * n_u * np.eye(4), V_u.T @ self.ratings[rows])
+            np.testing.assert_allclose(U[u], expected)
+        np.testing.assert_array_equal(U[1], np.zeros(4))
+
+    def test_server_solve_matches_centralized(self):
+        statistics = [
+            item_sufficient_statistics([0, 1], [4.0, 2.0], self.U[0]),
+            item_sufficient_statistics([1], [5.0], self.U[1]),
+        ]
+        V = aggregate_item_statistics(self.V, statistics, lambda_reg=0.1)
+
+        U_1 = self.U[:2]
+        expected = np.linalg.solve(U_1.T @ U_1 + 0.2 * np.eye(4), U_1.T @ np.array([2.0, 5.0]))
+        np.testing.assert_allclose(V[1], expected)
+        np.testing.assert_array_equal(V[2:], self.V[2:])
+        self.assertEqual(aggregate_item_statistics(self.V, []).shape, self.V.shape)
+
+    def test_local_als_with_noise(self):
+        train_data = [("user", 3, 4.0), ("user", 7, 1.5)]
+        U_u, statistics = perform_local_als(train_data, self.V, epsilon=1.0)
+        self.assertEqual(U_u.shape, (4,))
+        np.testing.assert_array_equal(statistics["item_ids"], [3, 7])
+        self.assertEqual(statistics["gram"].shape, (2, 10))  # packed upper triangles
+
+    def test_packed_gram_roundtrip(self):
+        gram = np.einsum("ni,nj->nij", self.U, self.U)
+        packed = pack_gram(gram)
+        self.assertEqual(packed.shape, (3, 10))
+        np.testing.assert_array_equal(unpack_gram(packed, 4), gram)
+
+    def test_als_converges_in_fewer_rounds(self):
+        comparison = compare_training_methods(rounds=6, num_users=300, num_items=60, ratings_per_user=30, max_workers=0, k=5)
+        self.assertIsNotNone(comparison["als"]["rounds_to_target"])
+        self.assertLess(comparison["als"]["rounds_to_target"], comparison["sgd"]["rounds_to_target"])
+        self.assertLess(comparison["als"]["reports"][-1]["rmse"], comparison["sgd"]["reports"][-1]["rmse"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_delta_codec import (
+    encode_deltas,
+    decode_deltas,
+    is_encoded,
+    payload_nbytes,
+    save_encoded_deltas,
+    load_deltas
+)
+from participant.federated_learning.svd_server_aggregation import aggregate_item_factors
+from participant.federated_learning.svd_simulation import compare_delta_encodings
+
+class TestDeltaCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/delta_codec"
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        rng = np.random.default_rng(0)
+        self.delta_V = {int(i): rng.normal(scale=0.01, size=10) for i in rng.choice(100, size=30, replace=False)}
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def test_float_encodings_round_trip(self):
+        for encoding, rtol in [("float64", 0), ("float32", 1e-6), ("float16", 1e-3)]:
+            payload, _ = encode_deltas(self.delta_V, encoding)
+            decoded = decode_deltas(payload)
+            self.assertEqual(set(decoded), set(self.delta_V))
+            for item_id, delta in self.delta_V.items():
+                np.testing.assert_allclose(decoded[item_id], delta, rtol=rtol, atol=1e-7)
+
+    def test_int8_is_unbiased_and_smaller(self):
+        payload, _ = encode_deltas(self.delta_V, "int8", random_seed=0)
+        self.assertLess(payload_nbytes(payload) * 4, sum(d.nbytes for d in self.delta_V.values()))
+
+        item_id = next(iter(self.delta_V))
+        mean = np.mean([decode_deltas(encode_deltas(self.delta_V, "int8", random_seed=s)[0])[item_id] for s in range(300)], axis=0)
+        scale = np.abs(self.delta_V[item_id]).max() / 127
+        np.testing.assert_allclose(mean, self.delta_V[item_id], atol=0.2 * scale)
+
+    def test_top_k_error_feedback(self):
+        payload, residual = encode_deltas(self.delta_V, "float64", top_k=5)
+        self.assertEqual(len(payload["item_ids"]), 5)
+        self.assertEqual(len(residual), 25)
+
+        # Whatever was not sent is sent later: sent + residual always adds up to the inputs
+        total_sent = {i: d.copy() for i, d in decode_deltas(payload).items()}
+        for _ in range(10):
+            payload, residual = encode_deltas({}, "float64", top_k=5, residual=residual)
+            for i, d in decode_deltas(payload).items():
+                total_sent[i] = total_sent.get(i, 0) + d
+        self.assertEqual(residual, {})
+        for item_id, delta in self.delta_V.items():
+            np.testing.assert_allclose(total_sent[item_id], delta)
+
+    def test_aggregator_decodes_transparently(self):
+        V = np.zeros((100, 10))
+        payload, _ = encode_deltas(self.delta_V, "float32")
+        self.assertTrue(is_encoded(payload))
+        self.assertFalse(is_encoded(self.delta_V))
+        np.testing.assert_allclose(
+            aggregate_item_factors(V, [payload], epsilon=None, clipping_threshold=None),
+            aggregate_item_factors(V, [self.delta_V], epsilon=None, clipping_threshold=None),
+            atol=1e-8,
+        )
+
+    def test_save_and_load(self):
+        payload, _ = encode_deltas(self.delta_V, "int8", random_seed=0)
+        path = os.path.join(self.sandbox_dir, "user_delta_V.npz")
+        save_encoded_deltas(path, payload)
+        loaded = load_deltas(path)
+        for item_id, delta in decode_deltas(payload).items():
+            np.testing.assert_array_equal(loaded[item_id], delta)
+
+        legacy_path = os.path.join(self.sandbox_dir, "user_delta_V.npy")
+        np.save(legacy_path, self.delta_V)
+        self.assertEqual(set(load_deltas(legacy_path)), set(self.delta_V))
+
+    def test_invalid_encoding(self):
+        with self.assertRaises(ValueError):
+            encode_deltas(self.delta_V, "int4")
+
+    def test_benchmark_reports_compression(self):
+        results = compare_delta_encodings([("int8", None), ("int8", 5)], rounds=2, num_users=60, num_items=50, ratings_per_user=20, max_workers=0)
+        self.assertGreater(results["int8"]["compression"], 4)
+        self.assertGreater(results["int8+top5"]["compression"], 10)
+        self.assertLess(abs(results["int8"]["rmse_change"]), 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_item_neighbours import (
+    NEIGHBOURS_DTYPE,
+    build_item_neighbours,
+    build_item_neighbours_approx,
+    publish_item_neighbours,
+    load_item_neighbours,
+    similar_items
+)
+
+def brute_force_neighbours(V, top_n):
+    Vn = V / np.linalg.norm(V, axis=1, keepdims=True)
+    scores = Vn @ Vn.T
+    np.fill_diagonal(scores, -np.inf)
+    return np.argsort(-scores, axis=1)[:, :top_n]
+
+class TestItemNeighbours(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/item_neighbours"
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        self.V = np.random.default_rng(0).normal(size=(300, 10))
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def test_exact_matches_brute_force(self):
+        """Blocked search gives the same neighbours as the full similarity matrix."""
+        table = build_item_neighbours(self.V, top_n=5, block_size=64)
+        self.assertEqual(table.dtype, NEIGHBOURS_DTYPE)
+        self.assertEqual(table.shape, (300, 5))
+        np.testing.assert_array_equal(table["id"], brute_force_neighbours(self.V, 5))
+        self.assertTrue(np.all(np.diff(table["score"].astype(np.float32), axis=1) <= 0))
+
+    def test_padding_and_zero_rows(self):
+        """Items without factors are never neighbours and have no neighbours."""
+        V = np.array([[1.0, 0.0], [0.0, 0.0], [0.9, 0.1]])
+        table = build_item_neighbours(V, top_n=3)
+        self.assertEqual(list(table["id"][0]), [2, -1, -1])
+        self.assertEqual(list(table["id"][1]), [-1, -1, -1])
+
+    def test_approx_recall(self):
+        """The IVF index finds most of the exact neighbours."""
+        exact = brute_force_neighbours(self.V, 10)
+        table = build_item_neighbours_approx(self.V, top_n=10, n_lists=10, n_probe=6)
+        recall = np.mean([len(set(exact[i]) & set(table["id"][i])) / 10 for i in range(len(self.V))])
+        self.assertGreater(recall, 0.75)
+        self.assertFalse(np.any(table["id"] == np.arange(len(self.V))[:, np.newaxis]))
+
+    def test_publish_and_lookup(self):
+        """The published table is memory-mapped and served row by row."""
+        publish_item_neighbours(self.V, self.sandbox_dir, top_n=5)
+        neighbours = load_item_neighbours(self.sandbox_dir)
+        self.assertIsInstance(neighbours, np.memmap)
+
+        result = similar_items(neighbours, 7, k=3)
+        self.assertEqual([i for i, _ in result], list(brute_force_neighbours(self.V, 3)[7]))
+
+    def test_publish_uses_approx_above_threshold(self):
+        """Catalogs above the threshold are indexed approximately."""
+        path = publish_item_neighbours(self.V, self.sandbox_dir, top_n=5, approx_threshold=100)
+        self.assertEqual(np.load(path).shape, (300, 5))
+
+    def test_publish_skips_unchanged_factors(self):
+        """The table is only rebuilt when the factors or top_n changed."""
+        path = publish_item_neighbours(self.V, self.sandbox_dir, top_n=5)
+        mtime = os.stat(path).st_mtime_ns
+        publish_item_neighbours(self.V.copy(), self.sandbox_dir, top_n=5)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+        publish_item_neighbours(self.V, self.sandbox_dir, top_n=4)
+        self.assertEqual(np.load(path).shape, (300, 4))
+        V = self.V.copy()
+        V[7] = V[3]
+        publish_item_neighbours(V, self.sandbox_dir, top_n=4)
+        self.assertEqual(similar_items(load_item_neighbours(self.sandbox_dir), 7, k=1)[0][0], 3)
+
+    def test_non_positive_top_n(self):
+        with self.assertRaises(ValueError):
+            build_item_neighbours(self.V, top_n=0)
+        with self.assertRaises(ValueError):
+            build_item_neighbours_approx(self.V, top_n=-1)
+        with self.assertRaises(ValueError):
+            publish_item_neighbours(self.V, self.sandbox_dir, top_n=0)
+        table = build_item_neighbours(self.V, top_n=3)
+        self.assertEqual(similar_items(table, 0, k=0), [])
+        self.assertEqual(similar_items(table, 300), [])
+
+if __name__ == "__main__":
+    unittest.main()
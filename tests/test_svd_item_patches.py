@@ -0,0 +1,159 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from unittest import mock
+from participant.federated_learning.svd_item_patches import (
+    PATCHES_DIR,
+    load_versions,
+    changed_rows,
+    publish_global_V_version,
+    sync_global_item_factors
+)
+
+class TestItemPatches(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/item_patches"
+        self.publish_dir = os.path.join(self.sandbox_dir, "server")
+        self.local_dir = os.path.join(self.sandbox_dir, "participant")
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        self.rng = np.random.default_rng(0)
+        self.V = self.rng.normal(size=(1000, 8))
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def publish_round(self, V, rows, **kwargs):
+        V_new = V.copy()
+        V_new[rows] += self.rng.normal(size=(len(rows), V.shape[1]))
+        publish_global_V_version(V_new, self.publish_dir, V_previous=V, **kwargs)
+        return V_new
+
+    def test_changed_rows_includes_new_items(self):
+        V_new = np.vstack([self.V, np.ones((2, 8))])
+        V_new[[3, 10]] += 1
+        np.testing.assert_array_equal(changed_rows(self.V, V_new), [3, 10, 1000, 1001])
+
+    def test_patches_scale_with_changed_rows(self):
+        publish_global_V_version(self.V, self.publish_dir)
+        sync_global_item_factors(self.publish_dir, self.local_dir)
+
+        V = self.publish_round(self.V, [1, 2, 3])
+        synced, stats = sync_global_item_factors(self.publish_dir, self.local_dir)
+        np.testing.assert_array_equal(synced, V)
+        self.assertFalse(stats["snapshot"])
+        self.assertLess(stats["bytes_read"], self.V.nbytes / 20)
+
+    def test_sync_applies_growth_and_is_idempotent(self):
+        publish_global_V_version(self.V, self.publish_dir)
+        sync_global_item_factors(self.publish_dir, self.local_dir)
+
+        V = self.publish_round(self.V, [5])
+        V_grown = np.vstack([V, np.ones((3, 8))])
+        publish_global_V_version(V_grown, self.publish_dir, V_previous=V)
+
+        synced, stats = sync_global_item_factors(self.publish_dir, self.local_dir)
+        np.testing.assert_array_equal(synced, V_grown)
+        self.assertEqual(stats["from_version"], 1)
+
+        _, stats = sync_global_item_factors(self.publish_dir, self.local_dir)
+        self.assertEqual(stats["bytes_read"], 0)
+
+    def test_known_changed_rows(self):
+        publish_global_V_version(self.V, self.publish_dir)
+        sync_global_item_factors(self.publish_dir, self.local_dir)
+
+        V = np.vstack([self.V, np.ones((1, 8))])
+        V[7] += 1.0
+        versions = publish_global_V_version(V, self.publish_dir, item_ids=[1000, 7])
+        self.assertEqual(versions["patches"][-1]["num_rows"], 2)
+        synced, _ = sync_global_item_factors(self.publish_dir, self.local_dir)
+        np.testing.assert_array_equal(synced, V)
+
+    def test_snapshots_and_compaction(self):
+        V = self.V
+        publish_global_V_version(V, self.publish_dir)
+        for _ in range(9):
+            V = self.publish_round(V, [0], snapshot_every=4, retain_patches=4)
+
+        versions = load_versions(self.publish_dir)
+        self.assertEqual(versions["version"], 10)
+        self.assertEqual(versions["snapshot_version"], 9)
+        self.assertEqual([p["version"] for p in versions["patches"]], [7, 8, 9, 10])
+        files = sorted(os.listdir(os.path.join(self.publish_dir, PATCHES_DIR)))
+        self.assertEqual(files, ["patch_000007.npz", "patch_000008.npz", "patch_000009.npz", "patch_000010.npz", "snapshot_000009.npy", "versions.json"])
+
+    def test_far_behind_participant_falls_back_to_snapshot(self):
+        V = self.V
+        publish_global_V_version(V, self.publish_dir)
+        sync_global_item_factors(self.publish_dir, self.local_dir)
+        for _ in range(9):
+            V = self.publish_round(V, [0, 1], snapshot_every=4, retain_patches=4)
+
+        synced, stats = sync_global_item_factors(self.publish_dir, self.local_dir)
+        np.testing.assert_array_equal(synced, V)
+        self.assertTrue(stats["snapshot"])
+
+    def test_retention_must_cover_snapshots(self):
+        with self.assertRaises(ValueError):
+            publish_global_V_version(self.V, self.publish_dir, snapshot_every=4, retain_patches=3)
+
+    def test_missing_patch_falls_back_to_snapshot(self):
+        V = self.V
+        publish_global_V_version(V, self.publish_dir)
+        for _ in range(2):
+            V = self.publish_round(V, [0], snapshot_every=2, retain_patches=2)
+        sync_global_item_factors(self.publish_dir, self.local_dir)
+        for _ in range(2):
+            V = self.publish_round(V, [1], snapshot_every=2, retain_patches=2)
+
+        # A patch the participant needs vanishes from disk although the index still lists it
+        os.remove(os.path.join(self.publish_dir, PATCHES_DIR, "patch_000004.npz"))
+        synced, stats = sync_global_item_factors(self.publish_dir, self.local_dir, attempts=1)
+        self.assertTrue(stats["snapshot"])
+        np.testing.assert_array_equal(synced, V)
+
+    def test_index_is_replaced_before_old_files_are_removed(self):
+        V = self.V
+        publish_global_V_version(V, self.publish_dir)
+        removed = []
+        remove = os.remove
+
+        def record_remove(path):
+            # The published index no longer references a file when it is removed
+            versions = load_versions(self.publish_dir)
+            referenced = [versions["snapshot_file"]] + [p["file"] for p in versions["patches"]]
+            self.assertNotIn(os.path.basename(path), referenced)
+            removed.append(os.path.basename(path))
+            remove(path)
+
+        with mock.patch("participant.federated_learning.svd_item_patches.os.remove", side_effect=record_remove):
+            for _ in range(5):
+                V = self.publish_round(V, [0], snapshot_every=2, retain_patches=2)
+        self.assertIn("snapshot_000001.npy", removed)
+        self.assertIn("patch_000002.npz", removed)
+
+    def test_sync_restarts_when_files_are_compacted_away(self):
+        publish_global_V_version(self.V, self.publish_dir)
+        V = self.publish_round(self.V, [2])
+        load = np.load
+        calls = []
+
+        def vanishing_load(path, *args, **kwargs):
+            if not calls:
+                calls.append(path)
+                raise FileNotFoundError(path)
+            return load(path, *args, **kwargs)
+
+        with mock.patch("participant.federated_learning.svd_item_patches.np.load", side_effect=vanishing_load):
+            synced, _ = sync_global_item_factors(self.publish_dir, self.local_dir)
+        np.testing.assert_array_equal(synced, V)
+
+    def test_missing_publication(self):
+        with self.assertRaises(FileNotFoundError):
+            sync_global_item_factors(self.publish_dir, self.local_dir)
+
+if __name__ == "__main__":
+    unittest.main()
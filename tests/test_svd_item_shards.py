@@ -0,0 +1,94 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_item_shards import (
+    SHARDS_DIR,
+    publish_item_factor_shards,
+    load_shard_manifest,
+    shards_for_items,
+    load_item_factor_rows
+)
+
+class TestItemFactorShards(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/item_shards"
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        self.V = np.random.default_rng(0).normal(size=(25, 4))
+        np.save(os.path.join(self.sandbox_dir, "global_V.npy"), self.V)
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def shard_files(self):
+        return sorted(f for f in os.listdir(os.path.join(self.sandbox_dir, SHARDS_DIR)) if f.startswith("shard_"))
+
+    def shard_mtimes(self, manifest):
+        shards_path = os.path.join(self.sandbox_dir, SHARDS_DIR)
+        return [os.stat(os.path.join(shards_path, s["file"])).st_mtime_ns for s in manifest["shards"]]
+
+    def test_publish_manifest(self):
+        manifest = publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        self.assertEqual(manifest["num_items"], 25)
+        self.assertEqual([(s["start"], s["stop"]) for s in manifest["shards"]], [(0, 10), (10, 20), (20, 25)])
+        self.assertEqual(load_shard_manifest(self.sandbox_dir), manifest)
+
+    def test_load_rows_in_request_order(self):
+        publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        item_ids = [24, 3, 11, 3]
+        np.testing.assert_array_equal(load_item_factor_rows(self.sandbox_dir, item_ids), self.V[item_ids])
+
+    def test_only_needed_shards(self):
+        manifest = publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        self.assertEqual([s["start"] for s in shards_for_items(manifest, [1, 4, 21])], [0, 20])
+
+    def test_unchanged_shards_not_rewritten(self):
+        before = publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        before_mtimes = self.shard_mtimes(before)
+        V = self.V.copy()
+        V[12] += 1.0
+        after = publish_item_factor_shards(V, self.sandbox_dir, shard_size=10)
+        after_mtimes = self.shard_mtimes(after)
+
+        self.assertEqual([s["file"] for s in before["shards"]][::2], [s["file"] for s in after["shards"]][::2])
+        self.assertEqual(before_mtimes[::2], after_mtimes[::2])
+        self.assertNotEqual(before["shards"][1]["file"], after["shards"][1]["file"])
+        np.testing.assert_array_equal(load_item_factor_rows(self.sandbox_dir, [12]), V[[12]])
+
+    def test_shards_of_previous_manifest_stay_readable(self):
+        first = publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        V = self.V + 1.0
+        second = publish_item_factor_shards(V, self.sandbox_dir, shard_size=10)
+
+        # A participant that read the first manifest still opens its (unmodified) shards
+        for shard in first["shards"]:
+            rows = np.load(os.path.join(self.sandbox_dir, SHARDS_DIR, shard["file"]))
+            np.testing.assert_array_equal(rows, self.V[shard["start"]:shard["stop"]])
+
+        publish_item_factor_shards(V + 1.0, self.sandbox_dir, shard_size=10)
+        self.assertFalse(set(s["file"] for s in first["shards"]) & set(self.shard_files()))
+        self.assertTrue(set(s["file"] for s in second["shards"]) <= set(self.shard_files()))
+
+    def test_shrinking_catalog_removes_shards(self):
+        publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        publish_item_factor_shards(self.V[:15], self.sandbox_dir, shard_size=10)
+        manifest = publish_item_factor_shards(self.V[:15], self.sandbox_dir, shard_size=10)
+        self.assertEqual(self.shard_files(), sorted(s["file"] for s in manifest["shards"]))
+        self.assertEqual(len(self.shard_files()), 2)
+
+    def test_fallback_without_shards(self):
+        np.testing.assert_array_equal(load_item_factor_rows(self.sandbox_dir, [2, 7]), self.V[[2, 7]])
+
+    def test_empty_request(self):
+        publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        self.assertEqual(load_item_factor_rows(self.sandbox_dir, []).shape, (0, 4))
+
+    def test_out_of_range(self):
+        publish_item_factor_shards(self.V, self.sandbox_dir, shard_size=10)
+        with self.assertRaises(IndexError):
+            load_item_factor_rows(self.sandbox_dir, [25])
+
+if __name__ == "__main__":
+    unittest.main()
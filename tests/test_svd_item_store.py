@@ -0,0 +1,66 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_item_store import ItemFactorStore
+
+class TestItemFactorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/item_store"
+        self.V = np.random.default_rng(0).normal(size=(5, 3))
+        self.tv_vocab = {f"Show {i}": i for i in range(5)}
+        self.store = ItemFactorStore.create(self.sandbox_dir, self.V, self.tv_vocab)
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def test_create_preallocates_capacity(self):
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.capacity, 8)
+        np.testing.assert_array_equal(self.store.factors, self.V)
+        self.assertEqual(self.store.row_of("show\u200b 3"), 3)
+        self.assertIsNone(self.store.row_of("Unknown"))
+
+    def test_append_grows_geometrically(self):
+        capacities = set()
+        for i in range(100):
+            self.store.append([f"New {i}"], np.full((1, 3), i))
+            capacities.add(self.store.capacity)
+        self.assertEqual(len(self.store), 105)
+        self.assertEqual(sorted(capacities), [8, 16, 32, 64, 128])
+        np.testing.assert_array_equal(self.store.factors[:5], self.V)
+        np.testing.assert_array_equal(self.store.factors[104], [99, 99, 99])
+
+    def test_append_existing_title_keeps_row(self):
+        rows = self.store.append(["Show 2", "Brand New"], np.ones((2, 3)))
+        self.assertEqual(rows, [2, 5])
+        np.testing.assert_array_equal(self.store.factors[2], self.V[2])
+
+    def test_merge_proposals_in_one_batch(self):
+        proposals = [
+            {"Fresh Show": np.array([1.0, 0.0, 0.0]), "Show 1": None},
+            {"fresh show": np.array([0.0, 1.0, 0.0]), "Other": None},
+        ]
+        rows = self.store.merge_proposals(proposals, random_seed=0)
+        self.assertEqual(len(self.store), 7)
+        self.assertEqual(rows["Fresh Show"], rows["fresh show"])
+        self.assertEqual(rows["Show 1"], 1)
+        np.testing.assert_allclose(self.store.factors[rows["Fresh Show"]], [0.5, 0.5, 0.0])
+        self.assertLess(np.abs(self.store.factors[rows["Other"]]).max(), 0.1)
+
+    def test_persisted_and_reopened(self):
+        self.store.merge_proposals([{"A": None, "B": None, "C": None, "D": None}], random_seed=0)
+        self.store.factors[0] = 42.0
+        self.store.flush()
+
+        reopened = ItemFactorStore.open(self.sandbox_dir)
+        self.assertEqual(len(reopened), 9)
+        self.assertEqual(reopened.capacity, 16)
+        self.assertEqual(reopened.row_of("d"), 8)
+        np.testing.assert_array_equal(reopened.factors[0], [42.0, 42.0, 42.0])
+        self.assertIsInstance(reopened.factors, np.memmap)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import os
+import time
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_recommendation import (
+    build_exclusion_mask,
+    score_items,
+    top_k_items,
+    recommend_top_k,
+    item_titles,
+    model_version,
+    published_version,
+    array_hash,
+    titles_hash,
+    RecommendationCache
+)
+from common.vocabulary import Vocabulary
+from participant.federated_learning.svd_item_patches import publish_global_V_version, sync_global_item_factors
+
+class TestExclusionMask(unittest.TestCase):
+
+    def setUp(self):
+        self.tv_vocab = {"Show A": 0, "Show\u200bB": 1, "Show C": 3}
+
+    def test_untitled_rows_excluded(self):
+        mask = build_exclusion_mask(self.tv_vocab, num_items=5)
+        np.testing.assert_array_equal(mask, [False, False, True, False, True])
+
+    def test_watched_titles_matched_normalized(self):
+        mask = build_exclusion_mask(self.tv_vocab, num_items=4, watched_titles=["showb", "Show C"])
+        np.testing.assert_array_equal(mask, [False, True, True, True])
+
+    def test_vocabulary_ids_beyond_matrix_ignored(self):
+        mask = build_exclusion_mask({"Show A": 0, "New Show": 9}, num_items=2, watched_titles=["New Show"])
+        np.testing.assert_array_equal(mask, [False, True])
+
+    def test_vocabulary_indexes_are_reused(self):
+        vocabulary = Vocabulary(self.tv_vocab)
+        first = build_exclusion_mask(vocabulary, num_items=4, watched_titles=["showb"])
+        normalized = vocabulary.normalized
+        second = build_exclusion_mask(vocabulary, num_items=4, watched_titles=["showb"])
+        np.testing.assert_array_equal(first, second)
+        self.assertIs(vocabulary.normalized, normalized)
+        self.assertTrue(np.shares_memory(item_titles(vocabulary, 2), vocabulary.titles))
+
+class TestTopK(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.V = rng.normal(size=(50, 8))
+        self.U = rng.normal(size=8)
+
+    def test_matches_full_sort(self):
+        ids, scores = recommend_top_k(self.U, self.V, k=6)
+        expected = np.argsort(-(self.V @ self.U))[:6]
+        np.testing.assert_array_equal(ids, expected)
+        np.testing.assert_allclose(scores, (self.V @ self.U)[expected])
+
+    def test_exclusion_applied(self):
+        mask = np.zeros(50, dtype=bool)
+        best = np.argsort(-(self.V @ self.U))[:3]
+        mask[best] = True
+        ids, _ = recommend_top_k(self.U, self.V, k=6, exclude_mask=mask)
+        self.assertFalse(set(ids) & set(best))
+
+    def test_fewer_candidates_than_k(self):
+        mask = np.ones(50, dtype=bool)
+        mask[[4, 7]] = False
+        ids, scores = recommend_top_k(self.U, self.V, k=6, exclude_mask=mask)
+        self.assertEqual(sorted(ids), [4, 7])
+        self.assertEqual(len(scores), 2)
+
+    def test_batched_users_match_single_user(self):
+        U = np.random.default_rng(1).normal(size=(4, 8))
+        ids, scores = recommend_top_k(U, self.V, k=5)
+        self.assertEqual(ids.shape, (4, 5))
+        for row in range(4):
+            single_ids, single_scores = recommend_top_k(U[row], self.V, k=5)
+            np.testing.assert_array_equal(ids[row], single_ids)
+            np.testing.assert_allclose(scores[row], single_scores)
+
+    def test_batched_padding(self):
+        scores = np.array([[1.0, 2.0, 3.0], [3.0, 2.0, 1.0]])
+        mask = np.array([[False, True, True], [False, False, False]])
+        ids, top_scores = top_k_items(scores, 2, mask)
+        np.testing.assert_array_equal(ids, [[0, -1], [0, 1]])
+        self.assertTrue(np.isneginf(top_scores[0, 1]))
+
+    def test_score_items_shapes(self):
+        self.assertEqual(score_items(self.U, self.V).shape, (50,))
+        self.assertEqual(score_items(np.ones((3, 8)), self.V).shape, (3, 50))
+
+    def test_large_catalog_latency(self):
+        V = np.random.default_rng(2).normal(size=(100_000, 8)).astype(np.float32)
+        mask = np.zeros(len(V), dtype=bool)
+        recommend_top_k(self.U.astype(np.float32), V, k=6, exclude_mask=mask)  # warm-up
+        start = time.perf_counter()
+        ids, _ = recommend_top_k(self.U.astype(np.float32), V, k=6, exclude_mask=mask)
+        self.assertEqual(len(ids), 6)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+    def test_item_titles(self):
+        titles = item_titles({"Show A": 0, "Show C": 2}, 3)
+        self.assertEqual(list(titles), ["Show A", None, "Show C"])
+        self.assertEqual(list(item_titles({"Show A": 0}, 2)), ["Show A", None])
+
+class TestRecommendationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/recommendation_cache"
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        self.key = {"model_version": "1-128", "user_hash": "u", "exclusion_hash": "e", "recent_hash": "r"}
+        self.items = [("Show A", 0.9), ("Show B", 0.8), ("Show C", 0.7)]
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def test_miss_then_hit(self):
+        cache = RecommendationCache(self.sandbox_dir)
+        self.assertIsNone(cache.get("user", self.key, 2))
+        cache.put("user", self.key, self.items, top_n=3)
+        self.assertEqual(cache.get("user", self.key, 2), self.items[:2])
+
+    def test_stale_key_is_a_miss(self):
+        cache = RecommendationCache(self.sandbox_dir)
+        cache.put("user", self.key, self.items, top_n=3)
+        self.assertIsNone(cache.get("user", dict(self.key, model_version="2-128"), 2))
+        self.assertIsNone(cache.get("user", dict(self.key, user_hash="v"), 2))
+
+    def test_persisted_between_instances(self):
+        RecommendationCache(self.sandbox_dir).put("user", self.key, self.items, top_n=3)
+        self.assertEqual(RecommendationCache(self.sandbox_dir).get("user", self.key, 3), self.items)
+
+    def test_k_beyond_cached_top_n(self):
+        cache = RecommendationCache(self.sandbox_dir)
+        cache.put("user", self.key, self.items, top_n=3)
+        self.assertIsNone(cache.get("user", self.key, 5))
+        cache.put("user", self.key, self.items, top_n=10)  # fewer candidates than top_n
+        self.assertEqual(cache.get("user", self.key, 5), self.items)
+
+    def test_invalidate(self):
+        cache = RecommendationCache(self.sandbox_dir)
+        cache.put("user", self.key, self.items, top_n=3)
+        cache.invalidate("user")
+        self.assertIsNone(cache.get("user", self.key, 2))
+
+    def test_model_version_changes_on_publish(self):
+        # Same size and (on a coarse-mtime filesystem) possibly the same mtime: only the contents differ
+        path = os.path.join(self.sandbox_dir, "global_V.npy")
+        np.save(path, np.zeros((2, 3)))
+        before = model_version(path)
+        np.save(path, np.ones((2, 3)))
+        self.assertNotEqual(before, model_version(path))
+
+    def test_model_version_follows_synced_version(self):
+        publish_dir = os.path.join(self.sandbox_dir, "server")
+        local_dir = os.path.join(self.sandbox_dir, "user")
+        V = np.zeros((2, 3))
+        publish_global_V_version(V, publish_dir)
+        sync_global_item_factors(publish_dir, local_dir)
+        path = os.path.join(local_dir, "global_V.npy")
+        self.assertEqual(model_version(path), "v1")
+
+        publish_global_V_version(V + 1, publish_dir, V_previous=V)
+        self.assertEqual(published_version(publish_dir), "v2")  # known before syncing
+        sync_global_item_factors(publish_dir, local_dir)
+        self.assertEqual(model_version(path), published_version(publish_dir))
+        self.assertIsNone(published_version(self.sandbox_dir))
+
+    def test_hashes(self):
+        self.assertEqual(array_hash(np.arange(3.0)), array_hash(np.arange(3.0)))
+        self.assertNotEqual(array_hash(np.arange(3.0)), array_hash(np.arange(3.0) + 1e-9))
+        self.assertEqual(titles_hash(["B", "a\u200b"]), titles_hash(["A", "b", "b"]))
+
+if __name__ == "__main__":
+    unittest.main()
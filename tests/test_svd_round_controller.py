@@ -0,0 +1,86 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from participant.federated_learning.svd_round_controller import (
+    RoundController,
+    aggregated_delta_norm,
+    count_new_ratings,
+    noisy_validation_error
+)
+from participant.federated_learning.svd_simulation import run_simulation
+
+class TestRoundController(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox_dir = "test_sandbox/round_controller"
+        os.makedirs(self.sandbox_dir, exist_ok=True)
+        self.state_path = os.path.join(self.sandbox_dir, "round_controller.json")
+
+    def tearDown(self):
+        if os.path.exists(self.sandbox_dir):
+            shutil.rmtree(self.sandbox_dir)
+
+    def test_worse_validation_error_decays_learning_rate(self):
+        controller = RoundController(self.state_path, patience=5)
+        controller.record_round(0.5, [1.0, 1.2])
+        controller.record_round(0.4, [1.3])
+        self.assertEqual(controller.learning_rate, 0.5)
+        self.assertFalse(controller.paused)
+
+    def test_pauses_after_stale_rounds_and_resumes_on_new_ratings(self):
+        controller = RoundController(self.state_path, patience=2, tolerance=0.01, resume_ratings=10)
+        for error in [1.0, 0.8, 0.799, 0.7985]:
+            self.assertTrue(controller.should_run_round())
+            controller.record_round(0.1, [error])
+        self.assertTrue(controller.paused)
+
+        self.assertFalse(controller.should_run_round(new_ratings=6))
+        self.assertTrue(controller.should_run_round(new_ratings=4))
+        self.assertEqual(controller.learning_rate, 1.0)
+
+    def test_delta_norm_signal(self):
+        controller = RoundController(self.state_path, patience=1, delta_tolerance=0.01)
+        controller.record_round(0.2)
+        controller.record_round(0.3)
+        self.assertEqual(controller.learning_rate, 0.5)
+        controller.record_round(0.005)
+        self.assertTrue(controller.paused)
+
+    def test_state_persisted(self):
+        controller = RoundController(self.state_path)
+        controller.record_round(0.2, [0.9])
+        reloaded = RoundController(self.state_path)
+        self.assertEqual(reloaded.state["round"], 1)
+        self.assertEqual(reloaded.state["best_validation_error"], 0.9)
+        reloaded.reset()
+        self.assertEqual(RoundController(self.state_path).state["round"], 0)
+
+    def test_history_is_capped(self):
+        controller = RoundController(self.state_path, patience=100, min_learning_rate=0.0, max_history=3)
+        for delta_norm in np.linspace(1.0, 0.5, 6):
+            controller.record_round(float(delta_norm))
+        history = RoundController(self.state_path, max_history=3).state["history"]
+        self.assertEqual([entry["round"] for entry in history], [4, 5, 6])
+
+    def test_count_new_ratings(self):
+        path = os.path.join(self.sandbox_dir, "user", "ratings_count.json")
+        self.assertEqual(count_new_ratings(5, path), 5)
+        self.assertEqual(count_new_ratings(5, path), 0)
+        self.assertEqual(count_new_ratings(8, path), 3)
+        self.assertEqual(count_new_ratings(2, path), 0)
+
+    def test_signals(self):
+        V = np.ones((4, 2))
+        self.assertAlmostEqual(aggregated_delta_norm(V, V * 1.1), 0.1)
+        self.assertIsNone(noisy_validation_error(np.ones(2), V[:0], []))
+        self.assertIsInstance(noisy_validation_error(np.ones(2), V, np.full(4, 2.0), epsilon=10.0), float)
+
+    def test_simulation_stops_when_paused(self):
+        controller = RoundController(self.state_path, delta_tolerance=0.5, patience=1)
+        reports = run_simulation(num_users=50, num_items=40, rounds=5, max_workers=0, controller=controller)
+        self.assertEqual(len(reports), 2)
+        self.assertTrue(controller.paused)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from participant.federated_learning.svd_simulation import (
+    generate_synthetic_population,
+    make_tasks,
+    train_participants,
+    evaluate,
+    run_simulation
+)
+
+class TestSVDSimulation(unittest.TestCase):
+
+    def test_synthetic_population_layout(self):
+        population = generate_synthetic_population(num_users=30, num_items=50, ratings_per_user=10)
+        self.assertEqual(len(population["indptr"]), 31)
+        self.assertEqual(len(population["item_ids"]), 30 * 8)
+        self.assertEqual(len(population["test_items"]), 30 * 2)
+        self.assertTrue(np.all((population["ratings"] >= 1) & (population["ratings"] <= 5)))
+        self.assertEqual(population["true_scores"](np.arange(5)).shape, (5, 50))
+
+    def test_chunks_cover_every_participant(self):
+        population = generate_synthetic_population(num_users=25, num_items=40, ratings_per_user=5)
+        V, U = np.ones((40, 10)), np.zeros((25, 10))
+        tasks = make_tasks(population, V, U, chunk_size=10, round_seed=1, method="sgd", epsilon=None, noise_type="gaussian", alpha=0.01, lambda_reg=0.1, iterations=1)
+        self.assertEqual([task["users"] for task in tasks], [(0, 10), (10, 20), (20, 25)])
+
+        result = train_participants(tasks[-1])
+        self.assertEqual(len(result["updates"]), 5)
+        self.assertEqual(result["U"].shape, (5, 10))
+        self.assertEqual(result["bytes_down"], 5 * 4 * 10 * 8)
+
+    def test_rounds_improve_rmse(self):
+        reports = run_simulation(num_users=200, num_items=100, rounds=3, max_workers=0, k=5)
+        self.assertEqual([report["round"] for report in reports], [0, 1, 2, 3])
+        self.assertLess(reports[-1]["rmse"], reports[0]["rmse"])
+        for key in ["training_time", "aggregation_time", "peak_memory_mb", "bytes_down", "bytes_up", "precision_at_k"]:
+            self.assertIn(key, reports[1])
+
+    def test_evaluate_blocks_do_not_change_quality(self):
+        population = generate_synthetic_population(num_users=40, num_items=60, ratings_per_user=10)
+        rng = np.random.default_rng(0)
+        U, V = rng.normal(size=(40, 10)), rng.normal(size=(60, 10))
+        single_block = evaluate(population, U, V, k=5)
+        # At most 2 users per block: 60 items, 120 scores
+        small_blocks = evaluate(population, U, V, k=5, max_block_scores=120)
+        self.assertEqual(single_block, small_blocks)
+
+        # Rated items are masked out of the block's scores
+        blocks = []
+        def true_scores(users):
+            scores = np.zeros((len(users), 60))
+            blocks.append(scores)
+            return scores
+        evaluate(dict(population, true_scores=true_scores), U, V, k=5, max_block_scores=60)
+        first_user = population["item_ids"][population["indptr"][0]:population["indptr"][1]]
+        self.assertTrue(np.all(np.isneginf(blocks[0][0, first_user])))
+
+    def test_process_pool_matches_inline(self):
+        inline = run_simulation(num_users=60, num_items=50, rounds=1, max_workers=0, chunk_size=20, epsilon=1.0)
+        pooled = run_simulation(num_users=60, num_items=50, rounds=1, max_workers=2, chunk_size=20, epsilon=1.0)
+        self.assertAlmostEqual(inline[-1]["rmse"], pooled[-1]["rmse"])
+        self.assertEqual(inline[-1]["bytes_up"], pooled[-1]["bytes_up"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,12 +2,15 @@ import unittest
 import pandas as pd
 import numpy as np
 import os
+import json
+import shutil
 from unittest.mock import patch
 from pathlib import Path
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from datetime import datetime
-from participant.federated_learning.mlp_model import extract_features, prepare_data, train_model, get_recommendation
+from common.mlp_params import save_mlp_params, load_mlp_params, MLP_PARAMS_FILE, FEDAVG_PARAMS_FILE
+from participant.federated_learning.mlp_model import extract_features, prepare_data, train_model, get_recommendation, load_global_mlp_parameters, train_and_save_mlp, fixed_scaler
 from participant.federated_learning.sequence_data import SequenceData
 
 class TestMLRoutines(unittest.TestCase):
@@ -188,6 +191,114 @@ class TestMLRoutines(unittest.TestCase):
         self.assertIsInstance(le_show, LabelEncoder)
         self.assertEqual(num_samples, len(self.dataset) - 1)
 
+    def test_prepare_data_with_vocabulary(self):
+        """
+        Test that shows are encoded with their shared vocabulary IDs rather than local labels.
+        """
+        vocabulary = {"Other": 0, "Show A": 1, "Show B": 2, "Show C": 3, "Zeta": 4}
+        X, y, le_show = prepare_data(self.file_path, vocabulary)
+
+        np.testing.assert_array_equal(X[:, 0], [1, 1, 2, 1, 3])
+        np.testing.assert_array_equal(y, [1, 2, 1, 3, 2])
+        self.assertEqual(list(le_show.inverse_transform([0, 4])), ["Other", "Zeta"])
+        self.assertEqual(le_show.transform(["Show B"])[0], 2)
+
+    def test_train_and_save_mlp_sparse_output_layer(self):
+        """
+        Test that a vocabulary-aligned model uploads only the output units of the shows it was trained on.
+        """
+        shared_folder = self.sandbox_path / "shared"
+        upload_folder = self.sandbox_path / "upload"
+        shared_folder.mkdir(exist_ok=True)
+        upload_folder.mkdir(exist_ok=True)
+        vocabulary = {f"Show {c}": i for i, c in enumerate("ABCDEFGHIJ")}
+        with open(shared_folder / "tv-series_vocabulary.json", "w") as f:
+            json.dump(vocabulary, f)
+
+        mlp, _, le_show, _ = train_model(self.file_path, vocabulary=vocabulary)
+        self.assertEqual(mlp.coefs_[-1].shape, (32, 10))
+        self.assertEqual(len(le_show.classes_), 10)
+
+        try:
+            train_and_save_mlp(self.file_path, upload_folder, shared_folder=shared_folder)
+            params = load_mlp_params(upload_folder / MLP_PARAMS_FILE)
+            classes = params["classes"]
+            self.assertEqual(params["num_samples"], 5)
+            self.assertTrue(set(classes) <= {0, 1, 2})
+            self.assertEqual(params["coefs"][-1].shape, (32, len(classes)))
+            self.assertEqual(params["coefs"][0].shape, (3, 64))
+            self.assertEqual(params["coefs"][0].dtype, np.float32)
+            self.assertEqual(params["intercepts"][-1].shape, (len(classes),))
+        finally:
+            shutil.rmtree(shared_folder)
+            shutil.rmtree(upload_folder)
+
+    def test_train_model_warm_start(self):
+        """
+        Test that training starts from published global coefficients and respects the epoch budget.
+        """
+        global_mlp, _, _, _ = train_model(self.file_path)
+        save_mlp_params(self.sandbox_path / FEDAVG_PARAMS_FILE, global_mlp.coefs_, global_mlp.intercepts_, num_samples=5, version=3)
+
+        global_model = load_global_mlp_parameters(self.sandbox_path)
+        self.assertEqual(global_model["version"], 3)
+
+        mlp, _, _, num_samples = train_model(self.file_path, (global_model["coefs"], global_model["intercepts"]), max_epochs=3)
+        self.assertLessEqual(mlp.t_ / (num_samples - 1), 4)  # initialization step + 3 epochs
+        self.assertEqual([c.shape for c in mlp.coefs_], [c.shape for c in global_mlp.coefs_])
+
+    def test_train_model_warm_start_shape_mismatch(self):
+        """
+        Test that a global model with different layer shapes falls back to a fresh fit.
+        """
+        global_parameters = ([np.zeros((5, 64)), np.zeros((64, 32)), np.zeros((32, 7))], [np.zeros(64), np.zeros(32), np.zeros(7)])
+        mlp, _, le_show, _ = train_model(self.file_path, global_parameters)
+        self.assertEqual(mlp.coefs_[0].shape, (3, 64))
+        self.assertEqual(mlp.coefs_[-1].shape[1], len(le_show.classes_))
+
+    def test_fixed_scaler_is_shared(self):
+        """
+        Test that features are scaled the same way whatever the local data, from their known ranges.
+        """
+        vocabulary = {f"Show {c}": i for i, c in enumerate("ABCDEFGHIJ")}
+        _, scaler, _, _ = train_model(self.file_path, vocabulary=vocabulary)
+        np.testing.assert_array_almost_equal(scaler.transform([[0, 0, 0], [9, 20, 6]]), [[-1, -1, -1], [1, 1, 1]])
+        np.testing.assert_array_equal(scaler.transform([[4, 2, 3]]), fixed_scaler(10).transform([[4, 2, 3]]))
+
+    def test_cold_start_respects_time_budget(self):
+        """
+        Test that a vocabulary-aligned model trained from scratch stops at the time budget.
+        """
+        vocabulary = {f"Show {c}": i for i, c in enumerate("ABCDEFGHIJ")}
+        mlp, _, _, num_samples = train_model(self.file_path, vocabulary=vocabulary, time_budget=0.0)
+        self.assertLessEqual(mlp.t_ / (num_samples - 1), 2)  # initialization step + 1 epoch
+
+    def test_no_trainable_rows(self):
+        """
+        Test that a history without any show of the vocabulary skips training instead of crashing.
+        """
+        vocabulary = {"Other": 0, "Zeta": 1}
+        mlp, scaler, _, num_samples = train_model(self.file_path, vocabulary=vocabulary)
+        self.assertIsNone(mlp)
+        self.assertIsNone(scaler)
+        self.assertEqual(num_samples, 0)
+
+        shared_folder = self.sandbox_path / "shared"
+        upload_folder = self.sandbox_path / "upload"
+        shared_folder.mkdir(exist_ok=True)
+        upload_folder.mkdir(exist_ok=True)
+        with open(shared_folder / "tv-series_vocabulary.json", "w") as f:
+            json.dump(vocabulary, f)
+        try:
+            train_and_save_mlp(self.file_path, upload_folder, shared_folder=shared_folder)
+            self.assertFalse((upload_folder / MLP_PARAMS_FILE).exists())
+        finally:
+            shutil.rmtree(shared_folder)
+            shutil.rmtree(upload_folder)
+
+    def test_load_global_mlp_parameters_missing(self):
+        self.assertIsNone(load_global_mlp_parameters(self.sandbox_path / "missing"))
+
     @patch("participant.federated_learning.mlp_model.get_current_day_of_week")
     def test_get_recommendation(self, mock_get_current_day_of_week):
         """
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+import pandas as pd
+from participant.participant_utils.viewing_history import parse_titles, parse_dates, parse_viewing_history
+from participant.federated_analytics.data_processing import extract_titles, convert_dates_to_weeks, orchestrate_reduction
+
+class TestViewingHistoryParsing(unittest.TestCase):
+
+    def setUp(self):
+        self.history = np.array([
+            ["The Blacklist: Season 1: Episode 2", "01/01/2023"],
+            ["Movie Title", "13/01/2023"],
+            ["Another Movie: Season 12", "21/10/2023"],
+            ["Dark: Limited Series: Chapter 1", "22/10/2023"],
+        ])
+
+    def test_parse_titles(self):
+        parsed = parse_titles(self.history[:, 0])
+        self.assertEqual(list(parsed["show"]), ["The Blacklist", "Movie Title", "Another Movie", "Dark"])
+        self.assertEqual(list(parsed["season"]), [1, 0, 12, 0])
+        self.assertEqual(list(parsed["episode"]), [True, False, True, True])
+
+    def test_parse_dates(self):
+        parsed = parse_dates(self.history[:, 1])
+        self.assertEqual(list(parsed["day_of_week"]), [6, 4, 5, 6])
+        self.assertEqual(list(parsed["week"]), [52, 2, 42, 42])
+        self.assertEqual(parsed["Date"].iloc[1], pd.Timestamp("2023-01-13"))
+
+    def test_matches_legacy_reduction(self):
+        parsed = parse_viewing_history(self.history)
+        np.testing.assert_array_equal(parsed["show"].to_numpy(dtype=str), extract_titles(self.history))
+        np.testing.assert_array_equal(parsed["week"].to_numpy(), convert_dates_to_weeks(self.history))
+        np.testing.assert_array_equal(orchestrate_reduction(self.history, parsed), orchestrate_reduction(self.history))
+
+    def test_accepts_dataframe(self):
+        df = pd.DataFrame(self.history, columns=["Title", "Date"], index=[10, 11, 12, 13])
+        parsed = parse_viewing_history(df)
+        self.assertEqual(list(parsed["Title"]), list(self.history[:, 0]))
+        self.assertEqual(list(parsed["season"]), [1, 0, 12, 0])
+
+if __name__ == "__main__":
+    unittest.main()
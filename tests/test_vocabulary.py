@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import unittest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from aggregator.pets.dp_top5 import write_top5
+from common import vocabulary as vocabulary_module
+from common.vocabulary import write_binary_vocab, load_binary_vocabulary, find_title, title_at, vocabulary_titles, load_vocabulary, Vocabulary
+from participant.participant_utils.data_loading import load_tv_vocabulary
+from participant.server_utils.data_loading import load_tv_vocabulary as server_load_tv_vocabulary
+
+SANDBOX = Path("test_sandbox/vocabulary")
+
+class TestBinaryVocabulary(unittest.TestCase):
+
+    def setUp(self):
+        SANDBOX.mkdir(parents=True, exist_ok=True)
+        self.titles = sorted(["Arcane", "Dark", "Élite", "Money Heist", "Narcos", "Ozark", "The Crown", "Squid Game"])
+        self.path = SANDBOX / "tv-series_vocabulary.bin"
+        self.version = write_binary_vocab(self.path, self.titles)
+
+    def tearDown(self):
+        shutil.rmtree(SANDBOX)
+
+    def test_roundtrip(self):
+        vocabulary = load_binary_vocabulary(self.path)
+        self.assertEqual(vocabulary["size"], len(self.titles))
+        self.assertEqual(vocabulary["version"], self.version)
+        self.assertEqual(vocabulary_titles(vocabulary), self.titles)
+        self.assertEqual(title_at(vocabulary, 3), self.titles[3])
+
+    def test_find_title(self):
+        vocabulary = load_binary_vocabulary(self.path)
+        for idx, title in enumerate(self.titles):
+            self.assertEqual(find_title(vocabulary, title), idx)
+        for missing in ["", "Aaa", "Dar", "Darker", "Zzz", "élite"]:
+            self.assertEqual(find_title(vocabulary, missing), -1)
+
+    def test_version_tracks_content(self):
+        other = SANDBOX / "other.bin"
+        self.assertEqual(write_binary_vocab(other, self.titles), self.version)
+        self.assertNotEqual(write_binary_vocab(other, self.titles[:-1]), self.version)
+
+    def test_rejects_unsorted_titles(self):
+        with self.assertRaises(ValueError):
+            write_binary_vocab(SANDBOX / "bad.bin", ["Dark", "Arcane"])
+
+    def test_binary_backed_lookups(self):
+        vocabulary = load_vocabulary(self.path)
+        self.assertEqual(vocabulary.version, self.version)
+        self.assertEqual(len(vocabulary), len(self.titles))
+        self.assertEqual(vocabulary["Ozark"], self.titles.index("Ozark"))
+        self.assertNotIn("Ozarks", vocabulary)
+        self.assertEqual(vocabulary.get("Ozarks", -1), -1)
+        self.assertEqual(vocabulary.title(0), "Arcane")
+        self.assertIsNone(vocabulary.title(len(self.titles)))
+        self.assertIsNone(vocabulary._index)  # exact lookups did not decode the titles
+
+        self.assertEqual(vocabulary.find_normalized("the crown"), self.titles.index("The Crown"))
+        self.assertEqual(dict(vocabulary), {title: idx for idx, title in enumerate(self.titles)})
+
+class TestVocabulary(unittest.TestCase):
+
+    def setUp(self):
+        SANDBOX.mkdir(parents=True, exist_ok=True)
+        self.mapping = {"Top Gear": 2, "South\u200b Park": 0, "Dark": 5}
+        self.path = SANDBOX / "tv-series_vocabulary.json"
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.mapping, f)
+
+    def tearDown(self):
+        shutil.rmtree(SANDBOX)
+
+    def test_lookups(self):
+        vocabulary = Vocabulary(self.mapping)
+        self.assertEqual(dict(vocabulary), self.mapping)
+        self.assertEqual(vocabulary["Dark"], 5)
+        self.assertNotIn("Ozark", vocabulary)
+        self.assertEqual(list(vocabulary.titles), ["South\u200b Park", None, "Top Gear", None, None, "Dark"])
+        self.assertIsNone(vocabulary.title(3))
+        self.assertIsNone(vocabulary.title(6))
+        self.assertEqual(vocabulary.find_normalized("south park"), 0)
+        self.assertIsNone(vocabulary.find_normalized("Ozark"))
+
+    def test_loaded_once_until_changed(self):
+        first = load_vocabulary(self.path)
+        self.assertIs(load_vocabulary(self.path), first)
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"Ozark": 0}, f)
+        os.utime(self.path, ns=(0, 0))  # a different signature, even on coarse mtime filesystems
+        self.assertEqual(dict(load_vocabulary(self.path)), {"Ozark": 0})
+
+    def test_one_vocabulary_whatever_the_caller(self):
+        vocabulary = load_tv_vocabulary(self.path)
+        self.assertIs(server_load_tv_vocabulary(self.path), vocabulary)
+        self.assertIsInstance(vocabulary, Vocabulary)
+
+    def test_cache_is_bounded(self):
+        paths = []
+        for i in range(vocabulary_module.MAX_CACHED_VOCABULARIES + 2):
+            paths.append(SANDBOX / f"vocabulary_{i}.json")
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                json.dump({f"Show {i}": 0}, f)
+        first = load_vocabulary(paths[0])
+        for path in paths[1:]:
+            load_vocabulary(path)
+        self.assertLessEqual(len(vocabulary_module._vocabularies), vocabulary_module.MAX_CACHED_VOCABULARIES)
+        self.assertIsNot(load_vocabulary(paths[0]), first)  # evicted, then loaded again
+        self.assertIs(load_vocabulary(paths[0]), load_vocabulary(paths[0]))
+
+    def test_concurrent_loads_share_one_vocabulary(self):
+        paths = []
+        for i in range(vocabulary_module.MAX_CACHED_VOCABULARIES + 2):
+            paths.append(SANDBOX / f"vocabulary_{i}.json")
+            with open(paths[-1], "w", encoding="utf-8") as f:
+                json.dump({f"Show {i}": 0}, f)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            loaded = list(pool.map(load_vocabulary, [self.path] * 16))
+            list(pool.map(load_vocabulary, paths * 4))
+        self.assertTrue(all(vocabulary is loaded[0] for vocabulary in loaded))
+        self.assertLessEqual(len(vocabulary_module._vocabularies), vocabulary_module.MAX_CACHED_VOCABULARIES)
+
+    def test_binary_and_json_forms_agree(self):
+        titles = ["Arcane", "Dark", "Narcos"]
+        write_binary_vocab(SANDBOX / "tv-series_vocabulary.bin", titles)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({title: idx for idx, title in enumerate(titles)}, f)
+        self.assertEqual(dict(load_vocabulary(SANDBOX / "tv-series_vocabulary.bin")), dict(load_vocabulary(self.path)))
+
+    def test_write_top5_reverse_lookup(self):
+        mapping = {f"Show {i}": i for i in range(7)}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(mapping, f)
+        write_top5(np.array([5, 1, 7, 3, 9, 0, 2]), SANDBOX / "out", self.path)
+        with open(SANDBOX / "out" / "top5_series.json", "r") as f:
+            top5 = json.load(f)
+        self.assertEqual(top5["names"], ["Show 4", "Show 2", "Show 0", "Show 3", "Show 6"])
+
+if __name__ == "__main__":
+    unittest.main()